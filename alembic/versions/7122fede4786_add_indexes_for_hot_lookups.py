@@ -0,0 +1,107 @@
+"""add indexes for hot lookups
+
+Revision ID: 7122fede4786
+Revises: 93b70987baf6
+Create Date: 2026-10-19 10:12:44.381205
+
+On Postgres every index is built with CREATE INDEX CONCURRENTLY outside the migration
+transaction, so writes keep flowing while it runs. The two unique indexes are then attached as
+constraints (ADD CONSTRAINT ... USING INDEX), which only needs a short lock.
+
+Duplicate ratings and reaction rows have to go before the unique indexes can be built: the newest
+rating of each (picture, user) pair is kept and duplicate reaction rows are merged into one.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7122fede4786'
+down_revision: Union[str, None] = '93b70987baf6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ('ix_comment_picture_id_created_at', 'comment', ['picture_id', 'created_at']),
+    ('ix_comment_user_id', 'comment', ['user_id']),
+    ('ix_picture_user_id', 'picture', ['user_id']),
+    ('ix_picture_created_at', 'picture', ['created_at']),
+    ('ix_message_sender_id_timestamp', 'message', ['sender_id', 'timestamp']),
+    ('ix_message_receiver_id_timestamp', 'message', ['receiver_id', 'timestamp']),
+    ('ix_user_username', 'user', ['username']),
+]
+
+UNIQUE_CONSTRAINTS = [
+    ('uq_rating_picture_id_user_id', 'rating', ['picture_id', 'user_id']),
+    ('reactions_comment_id_key', 'reactions', ['comment_id']),
+]
+
+
+def _remove_duplicates() -> None:
+    bind = op.get_bind()
+    bind.execute(sa.text(
+        'DELETE FROM rating WHERE EXISTS ('
+        'SELECT 1 FROM rating AS newer WHERE newer.picture_id = rating.picture_id '
+        'AND newer.user_id = rating.user_id AND newer.id > rating.id)'
+    ))
+
+    reactions = sa.table('reactions', sa.column('id', sa.Integer), sa.column('comment_id', sa.Integer),
+                         sa.column('data', sa.JSON))
+    duplicated = bind.execute(
+        sa.select(reactions.c.comment_id).group_by(reactions.c.comment_id).having(sa.func.count() > 1)
+    ).scalars().all()
+    for comment_id in duplicated:
+        rows = bind.execute(
+            sa.select(reactions.c.id, reactions.c.data).where(reactions.c.comment_id == comment_id)
+            .order_by(reactions.c.id)
+        ).all()
+        merged = {}
+        for _, data in rows:
+            for reaction, user_ids in (data or {}).items():
+                merged.setdefault(reaction, [])
+                merged[reaction] += [user_id for user_id in user_ids if user_id not in merged[reaction]]
+        bind.execute(reactions.update().where(reactions.c.id == rows[0].id).values(data=merged))
+        bind.execute(reactions.delete().where(reactions.c.id.in_([row.id for row in rows[1:]])))
+
+
+def upgrade() -> None:
+    _remove_duplicates()
+    postgres = op.get_bind().dialect.name == 'postgresql'
+
+    if not postgres:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns)
+        for name, table, columns in UNIQUE_CONSTRAINTS:
+            op.create_index(name, table, columns, unique=True)
+        return
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+        for name, table, columns in UNIQUE_CONSTRAINTS:
+            op.create_index(name, table, columns, unique=True, postgresql_concurrently=True, if_not_exists=True)
+    for name, table, _ in UNIQUE_CONSTRAINTS:
+        op.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT {name} UNIQUE USING INDEX {name}')
+
+
+def downgrade() -> None:
+    postgres = op.get_bind().dialect.name == 'postgresql'
+
+    for name, table, _ in UNIQUE_CONSTRAINTS:
+        if postgres:
+            op.drop_constraint(name, table, type_='unique')
+        else:
+            op.drop_index(name, table_name=table)
+    if not postgres:
+        for name, table, _ in INDEXES:
+            op.drop_index(name, table_name=table)
+        return
+
+    with op.get_context().autocommit_block():
+        for name, table, _ in INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
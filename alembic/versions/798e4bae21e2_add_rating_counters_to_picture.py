@@ -0,0 +1,34 @@
+"""add rating counters to picture
+
+Revision ID: 798e4bae21e2
+Revises: 7122fede4786
+Create Date: 2026-10-19 11:02:17.530914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '798e4bae21e2'
+down_revision: Union[str, None] = '7122fede4786'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('picture', sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('picture', sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        'UPDATE picture SET '
+        'rating_count = (SELECT count(rat) FROM rating WHERE rating.picture_id = picture.id), '
+        'rating_sum = (SELECT coalesce(sum(rat), 0) FROM rating WHERE rating.picture_id = picture.id) '
+        'WHERE EXISTS (SELECT 1 FROM rating WHERE rating.picture_id = picture.id)'
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('picture', 'rating_sum')
+    op.drop_column('picture', 'rating_count')
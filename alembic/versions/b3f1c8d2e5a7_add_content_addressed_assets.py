@@ -0,0 +1,44 @@
+"""add content addressed assets
+
+Revision ID: b3f1c8d2e5a7
+Revises: 798e4bae21e2
+Create Date: 2026-10-19 13:24:51.208113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f1c8d2e5a7'
+down_revision: Union[str, None] = '798e4bae21e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('asset',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('sha256', sa.String(length=64), nullable=False),
+                    sa.Column('picture_json', sa.JSON(), nullable=True),
+                    sa.Column('picture_url', sa.String(length=255), nullable=False),
+                    sa.Column('qr_code_picture', sa.String(length=255), nullable=True),
+                    sa.Column('size', sa.Integer(), nullable=False),
+                    sa.Column('ref_count', sa.Integer(), server_default='0', nullable=False),
+                    sa.Column('created_at', sa.DateTime(), nullable=True),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('sha256'))
+    with op.batch_alter_table('picture') as batch_op:
+        batch_op.add_column(sa.Column('asset_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('picture_asset_id_fkey', 'asset', ['asset_id'], ['id'], ondelete='SET NULL')
+    op.create_index(op.f('ix_picture_asset_id'), 'picture', ['asset_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_picture_asset_id'), table_name='picture')
+    with op.batch_alter_table('picture') as batch_op:
+        batch_op.drop_constraint('picture_asset_id_fkey', type_='foreignkey')
+        batch_op.drop_column('asset_id')
+    op.drop_table('asset')
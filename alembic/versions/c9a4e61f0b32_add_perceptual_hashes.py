@@ -0,0 +1,30 @@
+"""add perceptual hashes
+
+Revision ID: c9a4e61f0b32
+Revises: b3f1c8d2e5a7
+Create Date: 2026-10-19 14:37:05.661420
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9a4e61f0b32'
+down_revision: Union[str, None] = 'b3f1c8d2e5a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('picture', sa.Column('phash', sa.BigInteger(), nullable=True))
+    op.add_column('asset', sa.Column('phash', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('asset') as batch_op:
+        batch_op.drop_column('phash')
+    with op.batch_alter_table('picture') as batch_op:
+        batch_op.drop_column('phash')
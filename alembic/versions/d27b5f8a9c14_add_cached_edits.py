@@ -0,0 +1,45 @@
+"""add cached edits
+
+Revision ID: d27b5f8a9c14
+Revises: c9a4e61f0b32
+Create Date: 2026-10-19 15:52:40.118734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd27b5f8a9c14'
+down_revision: Union[str, None] = 'c9a4e61f0b32'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('cached_edit',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('source_public_id', sa.String(length=255), nullable=False),
+                    sa.Column('source_version', sa.String(length=32), nullable=False),
+                    sa.Column('transformation_key', sa.String(length=64), nullable=False),
+                    sa.Column('transformation', sa.JSON(), nullable=False),
+                    sa.Column('picture_edited_json', sa.JSON(), nullable=False),
+                    sa.Column('picture_edited_url', sa.String(length=255), nullable=False),
+                    sa.Column('qr_code_picture_edited', sa.String(length=255), nullable=True),
+                    sa.Column('render_ms', sa.Float(), nullable=False),
+                    sa.Column('hits', sa.Integer(), server_default='0', nullable=False),
+                    sa.Column('created_at', sa.DateTime(), nullable=True),
+                    sa.Column('last_used_at', sa.DateTime(), nullable=True),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('source_public_id', 'source_version', 'transformation_key',
+                                        name='uq_cached_edit_source_transformation'))
+    op.create_index(op.f('ix_cached_edit_last_used_at'), 'cached_edit', ['last_used_at'], unique=False)
+    op.create_index(op.f('ix_picture_picture_edited_url'), 'picture', ['picture_edited_url'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_picture_picture_edited_url'), table_name='picture')
+    op.drop_index(op.f('ix_cached_edit_last_used_at'), table_name='cached_edit')
+    op.drop_table('cached_edit')
@@ -0,0 +1,30 @@
+"""add picture derivatives
+
+Revision ID: e5b8d03f7a61
+Revises: d27b5f8a9c14
+Create Date: 2026-10-19 17:12:44.208113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b8d03f7a61'
+down_revision: Union[str, None] = 'd27b5f8a9c14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('picture', sa.Column('derivatives', sa.JSON(), nullable=True))
+    op.add_column('asset', sa.Column('derivatives', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('asset') as batch_op:
+        batch_op.drop_column('derivatives')
+    with op.batch_alter_table('picture') as batch_op:
+        batch_op.drop_column('derivatives')
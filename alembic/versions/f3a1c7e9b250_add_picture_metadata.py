@@ -0,0 +1,50 @@
+"""add picture metadata
+
+Revision ID: f3a1c7e9b250
+Revises: e5b8d03f7a61
+Create Date: 2026-10-19 18:03:27.915342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a1c7e9b250'
+down_revision: Union[str, None] = 'e5b8d03f7a61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('picture', sa.Column('width', sa.Integer(), nullable=True))
+    op.add_column('picture', sa.Column('height', sa.Integer(), nullable=True))
+    op.add_column('picture', sa.Column('taken_at', sa.DateTime(), nullable=True))
+    op.add_column('picture', sa.Column('camera_make', sa.String(length=64), nullable=True))
+    op.add_column('picture', sa.Column('camera_model', sa.String(length=64), nullable=True))
+    op.add_column('picture', sa.Column('lens_model', sa.String(length=128), nullable=True))
+    op.add_column('picture', sa.Column('orientation', sa.SmallInteger(), nullable=True))
+    op.add_column('picture', sa.Column('gps_latitude', sa.Float(), nullable=True))
+    op.add_column('picture', sa.Column('gps_longitude', sa.Float(), nullable=True))
+    op.create_index(op.f('ix_picture_taken_at'), 'picture', ['taken_at'], unique=False)
+    for column in ('camera_make', 'camera_model', 'lens_model'):
+        # prefix matches on the lowercased column (text_pattern_ops so LIKE can use it under any collation)
+        op.create_index(f'ix_picture_{column}_lower', 'picture',
+                        [sa.func.lower(sa.column(column)).label(f'{column}_lower')],
+                        unique=False, postgresql_ops={f'{column}_lower': 'text_pattern_ops'})
+    op.create_index('ix_picture_dimensions', 'picture', ['width', 'height'], unique=False)
+    op.create_index('ix_picture_gps', 'picture', ['gps_latitude', 'gps_longitude'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_picture_gps', table_name='picture')
+    op.drop_index('ix_picture_dimensions', table_name='picture')
+    for column in ('lens_model', 'camera_model', 'camera_make'):
+        op.drop_index(f'ix_picture_{column}_lower', table_name='picture')
+    op.drop_index(op.f('ix_picture_taken_at'), table_name='picture')
+    with op.batch_alter_table('picture') as batch_op:
+        for column in ('gps_longitude', 'gps_latitude', 'orientation', 'lens_model', 'camera_model',
+                       'camera_make', 'taken_at', 'height', 'width'):
+            batch_op.drop_column(column)
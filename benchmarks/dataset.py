@@ -0,0 +1,244 @@
+"""
+Synthetic dataset generator for benchmarks.
+
+Creates users, tags, pictures, comments, reactions, ratings and messages with a
+Zipf-like skew: a few users upload most pictures, a few pictures get most comments and
+ratings, and the hottest comments collect thousands of reactions.
+
+Usage:
+    python -m benchmarks.dataset --db-url sqlite:///./bench.db --scale small
+    python -m benchmarks.dataset --db-url postgresql://... --scale large --seed 7
+"""
+import argparse
+import itertools
+import random
+import time
+from bisect import bisect
+from datetime import datetime, timedelta
+
+from faker import Faker
+from passlib.context import CryptContext
+from sqlalchemy import create_engine, func, insert, select, text, update
+from sqlalchemy.orm import Session
+
+from src.database.models import (Base, Comment, Message, Picture, PictureTagsAssociation, Rating, Reaction, Tag,
+                                 User)
+
+BENCHMARK_PASSWORD = "benchmark"
+REACTIONS = ["like", "love", "wow", "haha", "dislike"]
+
+SCALES = {
+    "tiny": dict(users=50, tags=30, pictures=500, comments=1_000, ratings=2_000, messages=500,
+                 hot_comments=2, hot_comment_reactions=40),
+    "small": dict(users=1_000, tags=500, pictures=20_000, comments=50_000, ratings=100_000, messages=20_000,
+                  hot_comments=10, hot_comment_reactions=800),
+    "medium": dict(users=10_000, tags=2_000, pictures=200_000, comments=500_000, ratings=1_000_000,
+                   messages=200_000, hot_comments=50, hot_comment_reactions=3_000),
+    "large": dict(users=100_000, tags=10_000, pictures=1_000_000, comments=3_000_000, ratings=5_000_000,
+                  messages=1_000_000, hot_comments=200, hot_comment_reactions=5_000),
+}
+
+
+class ZipfSampler:
+    """
+    Draw ids in ``[first_id, first_id + n)`` with probability proportional to ``1 / rank ** s``.
+    """
+
+    def __init__(self, rng: random.Random, n: int, first_id: int = 1, s: float = 1.1):
+        self.rng = rng
+        self.first_id = first_id
+        self.cum_weights = list(itertools.accumulate(1 / rank ** s for rank in range(1, n + 1)))
+        self.total = self.cum_weights[-1]
+
+    def __call__(self) -> int:
+        return self.first_id + bisect(self.cum_weights, self.rng.random() * self.total)
+
+    def distinct(self, k: int) -> set[int]:
+        k = min(k, len(self.cum_weights))
+        chosen = set()
+        while len(chosen) < k:
+            chosen.add(self())
+        return chosen
+
+
+class DatasetGenerator:
+    """
+    Bulk-insert a synthetic dataset in batches through SQLAlchemy ``insert()`` executemany.
+
+    All users share the password ``benchmark`` so load scenarios can log in; user 1 is an admin.
+    """
+
+    def __init__(self, engine, seed: int = 0, batch_size: int = 10_000, **counts):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.counts = counts
+        self.rng = random.Random(seed)
+        self.fake = Faker("pl_PL")
+        Faker.seed(seed)
+        self.sentences = [self.fake.sentence() for _ in range(2_000)]
+        self.now = datetime.now()
+
+    def run(self) -> dict:
+        Base.metadata.create_all(self.engine)
+        timings = {}
+        with Session(self.engine) as db:
+            for name in ("users", "tags", "pictures", "picture_tags", "comments", "reactions", "ratings",
+                         "messages"):
+                start = time.perf_counter()
+                getattr(self, f"_insert_{name}")(db)
+                db.commit()
+                timings[name] = round(time.perf_counter() - start, 2)
+                print(f"{name:>12}: {timings[name]}s")
+            self._reset_sequences(db)
+        return timings
+
+    def _insert(self, db: Session, model, rows) -> None:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                db.execute(insert(model), batch)
+                batch = []
+        if batch:
+            db.execute(insert(model), batch)
+
+    def _first_id(self, db: Session, model) -> int:
+        return (db.query(func.max(model.id)).scalar() or 0) + 1
+
+    def _timestamp(self, max_days: int = 730) -> datetime:
+        return self.now - timedelta(seconds=self.rng.randrange(max_days * 86_400))
+
+    def _insert_users(self, db: Session) -> None:
+        password = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(BENCHMARK_PASSWORD)
+        self.user_first = self._first_id(db, User)
+        self.users = ZipfSampler(self.rng, self.counts["users"], self.user_first)
+        self._insert(db, User, (
+            {"id": self.user_first + i,
+             "username": f"{self.fake.user_name()[:40]}{i}",
+             "email": f"user{self.user_first + i}@bench.local",
+             "password": password,
+             "created_at": self._timestamp(),
+             "confirmed": True,
+             "admin": i == 0,
+             "moderator": i == 1,
+             "ban_status": False}
+            for i in range(self.counts["users"])))
+
+    def _insert_tags(self, db: Session) -> None:
+        tag_first = self._first_id(db, Tag)
+        self.tags = ZipfSampler(self.rng, self.counts["tags"], tag_first)
+        self._insert(db, Tag, ({"id": tag_first + i, "name": f"{self.fake.word()}{tag_first + i}"}
+                               for i in range(self.counts["tags"])))
+
+    def _insert_pictures(self, db: Session) -> None:
+        self.picture_first = self._first_id(db, Picture)
+        self.pictures = ZipfSampler(self.rng, self.counts["pictures"], self.picture_first)
+
+        def rows():
+            for i in range(self.counts["pictures"]):
+                picture_id = self.picture_first + i
+                public_id = f"picture/bench{picture_id}"
+                yield {"id": picture_id,
+                       "picture_json": {"public_id": public_id, "version": 1, "folder": "picture"},
+                       "picture_url": f"https://res.cloudinary.com/bench/image/upload/v1/{public_id}",
+                       "qr_code_picture": f"https://res.cloudinary.com/bench/image/upload/v1/qr_code/bench{picture_id}",
+                       "description": self.rng.choice(self.sentences),
+                       "created_at": self._timestamp(),
+                       "user_id": self.users()}
+
+        self._insert(db, Picture, rows())
+
+    def _insert_picture_tags(self, db: Session) -> None:
+        def rows():
+            for i in range(self.counts["pictures"]):
+                for tag_id in self.tags.distinct(self.rng.randrange(6)):
+                    yield {"picture_id": self.picture_first + i, "tag_id": tag_id}
+
+        self._insert(db, PictureTagsAssociation, rows())
+
+    def _insert_comments(self, db: Session) -> None:
+        self.comment_first = self._first_id(db, Comment)
+        self._insert(db, Comment, (
+            {"id": self.comment_first + i,
+             "user_id": self.users(),
+             "picture_id": self.pictures(),
+             "content": self.rng.choice(self.sentences)[:255],
+             "created_at": self._timestamp()}
+            for i in range(self.counts["comments"])))
+
+    def _insert_reactions(self, db: Session) -> None:
+        def rows():
+            for i in range(self.counts["comments"]):
+                if i < self.counts["hot_comments"]:
+                    reacting_users = range(self.user_first,
+                                           self.user_first + min(self.counts["hot_comment_reactions"],
+                                                                 self.counts["users"]))
+                elif self.rng.random() < 0.3:
+                    reacting_users = self.users.distinct(self.rng.randrange(1, 6))
+                else:
+                    continue
+                data = {}
+                for user_id in reacting_users:
+                    data.setdefault(self.rng.choice(REACTIONS), []).append(user_id)
+                yield {"comment_id": self.comment_first + i, "data": data}
+
+        self._insert(db, Reaction, rows())
+
+    def _insert_ratings(self, db: Session) -> None:
+        def rows():
+            seen = set()
+            attempts = 0
+            while len(seen) < self.counts["ratings"] and attempts < self.counts["ratings"] * 3:
+                attempts += 1
+                key = (self.pictures(), self.users())
+                if key in seen:
+                    continue
+                seen.add(key)
+                yield {"picture_id": key[0], "user_id": key[1], "rat": self.rng.randint(1, 5)}
+
+        self._insert(db, Rating, rows())
+        db.execute(update(Picture).where(Picture.id >= self.picture_first).values(
+            rating_count=select(func.count(Rating.rat)).where(Rating.picture_id == Picture.id).scalar_subquery(),
+            rating_sum=select(func.coalesce(func.sum(Rating.rat), 0))
+            .where(Rating.picture_id == Picture.id).scalar_subquery()))
+
+    def _insert_messages(self, db: Session) -> None:
+        self._insert(db, Message, (
+            {"sender_id": self.users(),
+             "receiver_id": self.users(),
+             "content": self.rng.choice(self.sentences)[:255],
+             "timestamp": self._timestamp()}
+            for _ in range(self.counts["messages"])))
+
+    def _reset_sequences(self, db: Session) -> None:
+        if self.engine.dialect.name != "postgresql":
+            return
+        for table in ("user", "tag", "picture", "comment", "reactions", "rating", "message"):
+            db.execute(text(f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                            f"(SELECT COALESCE(MAX(id), 1) FROM \"{table}\"))"))
+        db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic PhotoShare dataset.")
+    parser.add_argument("--db-url", required=True, help="SQLAlchemy URL of the database to fill.")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    for name in SCALES["small"]:
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, help=f"Override the number of {name}.")
+    args = parser.parse_args()
+
+    counts = dict(SCALES[args.scale])
+    for name in counts:
+        if getattr(args, name) is not None:
+            counts[name] = getattr(args, name)
+
+    engine = create_engine(args.db_url)
+    start = time.perf_counter()
+    DatasetGenerator(engine, seed=args.seed, batch_size=args.batch_size, **counts).run()
+    print(f"Dataset generated in {time.perf_counter() - start:.1f}s: {counts}")
+
+
+if __name__ == "__main__":
+    main()
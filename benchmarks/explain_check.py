@@ -0,0 +1,87 @@
+"""
+Check with EXPLAIN that the hot lookups are served by their indexes.
+
+Run it against a database filled by ``benchmarks.dataset`` (tables need enough rows for the
+planner to prefer an index). Statistics are refreshed with ANALYZE first, then every hot query is
+explained and the plan is searched for the expected index name. Exits with status 1 if any query
+does not use its index.
+
+Usage:
+    python -m benchmarks.dataset --db-url postgresql://... --scale small
+    python -m benchmarks.explain_check --db-url postgresql://...
+"""
+import argparse
+import json
+import sys
+
+from sqlalchemy import create_engine, or_, select, text
+
+from src.database.models import Comment, Message, Picture, Rating, Reaction, User
+
+
+def hot_queries(conn) -> list[tuple[str, str | tuple[str, ...], object]]:
+    """
+    Build ``(name, expected index, statement)`` for each hot lookup, using ids present in the data.
+
+    Unique constraints created by ``create_all`` on SQLite show up as ``sqlite_autoindex_<table>_N``
+    rather than under their constraint name, so those are accepted too.
+    """
+    picture_id, user_id = conn.execute(select(Rating.picture_id, Rating.user_id).limit(1)).one()
+    comment_id = conn.execute(select(Reaction.comment_id).limit(1)).scalar()
+    username = conn.execute(select(User.username).limit(1)).scalar()
+    return [
+        ("comments of a picture", "ix_comment_picture_id_created_at",
+         select(Comment).where(Comment.picture_id == picture_id).order_by(Comment.created_at.desc()).limit(20)),
+        ("comments of a user", "ix_comment_user_id",
+         select(Comment).where(Comment.user_id == user_id)),
+        ("rating of a user for a picture", ("uq_rating_picture_id_user_id", "sqlite_autoindex_rating"),
+         select(Rating).where(Rating.picture_id == picture_id, Rating.user_id == user_id)),
+        ("pictures of a user", "ix_picture_user_id",
+         select(Picture).where(Picture.user_id == user_id)),
+        ("latest pictures", "ix_picture_created_at",
+         select(Picture).order_by(Picture.created_at.desc()).limit(20)),
+        ("sent messages", "ix_message_sender_id_timestamp",
+         select(Message).where(Message.sender_id == user_id).order_by(Message.timestamp)),
+        ("received messages", "ix_message_receiver_id_timestamp",
+         select(Message).where(Message.receiver_id == user_id).order_by(Message.timestamp)),
+        ("all messages of a user", "ix_message_receiver_id_timestamp",
+         select(Message).where(or_(Message.sender_id == user_id, Message.receiver_id == user_id))),
+        ("reactions of a comment", ("reactions_comment_id_key", "sqlite_autoindex_reactions"),
+         select(Reaction).where(Reaction.comment_id == comment_id)),
+        ("user by username", "ix_user_username",
+         select(User).where(User.username == username)),
+    ]
+
+
+def explain(conn, statement) -> str:
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "postgresql":
+        plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        return json.dumps(plan)
+    return "\n".join(str(row[-1]) for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify that hot lookups use their indexes.")
+    parser.add_argument("--db-url", required=True)
+    parser.add_argument("--verbose", action="store_true", help="Print every plan.")
+    args = parser.parse_args()
+
+    engine = create_engine(args.db_url)
+    missing = []
+    with engine.connect() as conn:
+        conn.execute(text("ANALYZE"))
+        for name, indexes, statement in hot_queries(conn):
+            indexes = (indexes,) if isinstance(indexes, str) else indexes
+            plan = explain(conn, statement)
+            used = any(index in plan for index in indexes)
+            print(f"{'ok  ' if used else 'MISS'} {name:<32} {indexes[0]}")
+            if args.verbose or not used:
+                print(plan)
+            if not used:
+                missing.append(name)
+    sys.exit(1 if missing else 0)
+
+
+if __name__ == "__main__":
+    main()
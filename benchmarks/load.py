@@ -0,0 +1,187 @@
+"""
+Scripted load scenarios against a seeded database.
+
+The app runs in-process (through ``httpx.ASGITransport``) with the local storage backend, or a running
+server is targeted with ``--base-url``. Either way ``--db-url`` must point at the database the
+app uses, because id ranges and search keywords are read from it.
+
+Usage:
+    python -m benchmarks.dataset --db-url sqlite:///./bench.db --scale small
+    python -m benchmarks.load --db-url sqlite:///./bench.db --duration 30 --concurrency 16
+    python -m benchmarks.load --db-url postgresql://... --base-url http://localhost:8000 \
+        --mix feed=60,search=20,rating=10,comment=8,login=2
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import defaultdict
+
+import httpx
+from sqlalchemy import create_engine, func, select
+
+from benchmarks.dataset import BENCHMARK_PASSWORD
+from benchmarks.report import format_table, save, summarize
+from src.database.models import Picture, Tag, User
+
+DEFAULT_MIX = "feed=50,search=20,rating=12,comment=12,login=6"
+
+
+class LoadContext:
+    """
+    Data shared by all virtual users: id ranges, search keywords and access tokens.
+    """
+
+    def __init__(self, db_url: str, seed: int):
+        self.rng = random.Random(seed)
+        engine = create_engine(db_url)
+        with engine.connect() as conn:
+            self.picture_min, self.picture_max = conn.execute(select(func.min(Picture.id),
+                                                                     func.max(Picture.id))).one()
+            self.user_emails = list(conn.execute(select(User.email).where(User.confirmed.is_(True))
+                                                 .order_by(User.id).limit(1_000)).scalars())
+            self.keywords = list(conn.execute(select(Tag.name).order_by(Tag.id).limit(200)).scalars())
+        engine.dispose()
+        if self.picture_min is None or not self.user_emails:
+            raise SystemExit("The database is empty, run `python -m benchmarks.dataset` first.")
+        self.tokens: list[str] = []
+
+    def picture_id(self) -> int:
+        return self.rng.randint(self.picture_min, self.picture_max)
+
+    def auth_headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.rng.choice(self.tokens)}"}
+
+
+async def login(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    return await client.post("/api/auth/login",
+                             data={"username": ctx.rng.choice(ctx.user_emails), "password": BENCHMARK_PASSWORD})
+
+
+async def feed(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    skip = ctx.rng.randrange(0, max(1, ctx.picture_max - ctx.picture_min))
+    return await client.get("/api/pictures/", params={"skip": skip, "limit": 20})
+
+
+async def search(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    keyword = ctx.rng.choice(ctx.keywords) if ctx.keywords else "a"
+    return await client.post("/api/search/pictures", params={"keyword": keyword[:4]})
+
+
+async def rating(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    return await client.post("/api/rating/", headers=ctx.auth_headers(),
+                             json={"picture_id": ctx.picture_id(), "rating": ctx.rng.randint(1, 5)})
+
+
+async def comment(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    return await client.post("/api/comments/", headers=ctx.auth_headers(),
+                             params={"picture_id": ctx.picture_id()},
+                             json={"content": f"benchmark comment {ctx.rng.random()}"})
+
+
+SCENARIOS = {"login": login, "feed": feed, "search": search, "rating": rating, "comment": comment}
+
+# Shed by rate limiting (429) or admission control (503); counted apart from errors.
+REJECTED_STATUS_CODES = {429, 503}
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        name, weight = part.split("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario '{name}', choose from {', '.join(SCENARIOS)}.")
+        weights[name] = int(weight)
+    return weights
+
+
+async def virtual_user(client, ctx, weights, warmup_until, deadline, latencies, errors, rejected):
+    names, values = list(weights), list(weights.values())
+    while (now := time.perf_counter()) < deadline:
+        name = ctx.rng.choices(names, values)[0]
+        try:
+            status_code = (await SCENARIOS[name](client, ctx)).status_code
+        except httpx.HTTPError:
+            status_code = None
+        elapsed_ms = (time.perf_counter() - now) * 1000
+        if now < warmup_until:
+            continue
+        if status_code in REJECTED_STATUS_CODES:
+            rejected[name] += 1
+        elif status_code is not None and status_code < 400:
+            latencies[name].append(elapsed_ms)
+        else:
+            errors[name] += 1
+
+
+async def run(args) -> dict:
+    ctx = LoadContext(args.db_url, args.seed)
+    weights = parse_mix(args.mix)
+
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+    else:
+        os.environ.setdefault("SQLALCHEMY_DATABASE_URL", args.db_url)
+        os.environ.setdefault("STORAGE_BACKEND", "local")
+        os.environ.setdefault("STORAGE_LOCAL_ROOT", os.path.join(args.output_dir, "media"))
+        os.environ.setdefault("CACHE_BACKEND", "memory")
+        if not args.with_limits:
+            # Every in-process virtual user shares one client address, so a single bucket would throttle them all.
+            os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+            os.environ.setdefault("ADMISSION_ENABLED", "false")
+        from main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False),
+                                   base_url="http://bench",
+                                   timeout=args.timeout)
+
+    async with client:
+        for email in ctx.user_emails[:args.auth_users]:
+            response = await client.post("/api/auth/login", data={"username": email, "password": BENCHMARK_PASSWORD})
+            if response.status_code == 200:
+                ctx.tokens.append(response.json()["access_token"])
+        if not ctx.tokens:
+            raise SystemExit("Could not log in any benchmark user.")
+
+        latencies, errors, rejected = defaultdict(list), defaultdict(int), defaultdict(int)
+        start = time.perf_counter()
+        warmup_until = start + args.warmup
+        deadline = warmup_until + args.duration
+        await asyncio.gather(*(virtual_user(client, ctx, weights, warmup_until, deadline, latencies, errors, rejected)
+                               for _ in range(args.concurrency)))
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "config": {"mix": weights, "duration_s": args.duration, "concurrency": args.concurrency,
+                   "target": args.base_url or "in-process", "database": create_engine(args.db_url).dialect.name},
+        "scenarios": {name: summarize(latencies[name], errors[name], args.duration, rejected[name])
+                      for name in weights},
+        "total": summarize(all_latencies, sum(errors.values()), args.duration, sum(rejected.values())),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run load scenarios against PhotoShare.")
+    parser.add_argument("--db-url", required=True)
+    parser.add_argument("--base-url", help="Target a running server instead of the in-process app.")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted scenarios, e.g. feed=50,search=20.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds.")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Unmeasured seconds before measuring.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Number of virtual users.")
+    parser.add_argument("--auth-users", type=int, default=20, help="Users logged in up front for write scenarios.")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--with-limits", action="store_true",
+                        help="Keep rate limiting and admission control on for the in-process app.")
+    parser.add_argument("--output-dir", default="bench_results")
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    report = asyncio.run(run(args))
+    print(format_table(report))
+    print(f"Report written to {save(report, args.output_dir)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Micro-benchmarks for repository functions called directly against a seeded database.
+
+Each case reports per-call latency, the number of SQL statements per call and the memory
+allocated per call. Results can be saved as a JSON baseline and later runs checked against it,
+so a change to a hot path can be judged on its own.
+
+Every call runs in a transaction that is rolled back afterwards (the commits of the repository
+functions become savepoints), so the writing cases leave the seeded data unchanged.
+
+Usage:
+    python -m benchmarks.micro --db-url sqlite:///./bench.db --seed-scale tiny
+    python -m benchmarks.micro --db-url sqlite:///./bench.db --save-baseline
+    python -m benchmarks.micro --db-url sqlite:///./bench.db --check --threshold 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import Session
+
+from benchmarks.dataset import SCALES, DatasetGenerator
+from benchmarks.report import git_commit, percentile
+from src.database.models import Comment, Picture, Reaction, Tag, User
+from src.database.sqlite import install_sqlite_mode
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+
+class MicroContext:
+    """
+    Ids sampled from the seeded database, so cases hit realistic rows (including the hot ones).
+    """
+
+    def __init__(self, db, seed: int):
+        self.rng = random.Random(seed)
+        self.picture_min, self.picture_max = db.execute(select(func.min(Picture.id), func.max(Picture.id))).one()
+        self.user = db.query(User).order_by(User.id).first()
+        self.user_ids = list(db.execute(select(User.id).order_by(User.id).limit(1_000)).scalars())
+        self.tag_names = list(db.execute(select(Tag.name).order_by(Tag.id).limit(200)).scalars())
+        # the generator gives the first comments the largest reaction lists
+        self.hot_comment_ids = list(db.execute(select(Reaction.comment_id).order_by(Reaction.comment_id)
+                                               .limit(10)).scalars())
+        self.hot_picture_ids = list(db.execute(
+            select(Comment.picture_id).group_by(Comment.picture_id).order_by(func.count().desc()).limit(10)).scalars())
+
+    def picture_id(self) -> int:
+        return self.rng.randint(self.picture_min, self.picture_max)
+
+
+def import_repositories():
+    """
+    Import the repository modules the cases call.
+
+    Importing them imports ``src.database.db``, which reads ``SQLALCHEMY_DATABASE_URL`` at import
+    time, so this runs once ``--db-url`` has been put in the environment.
+    """
+    global repository_comments, repository_messages, repository_pictures, repository_rating, \
+        repository_reactions, repository_search, repository_tags
+    from src.repository import comments as repository_comments
+    from src.repository import messages as repository_messages
+    from src.repository import pictures as repository_pictures
+    from src.repository import rating as repository_rating
+    from src.repository import reactions as repository_reactions
+    from src.repository import search as repository_search
+    from src.repository import tags as repository_tags
+
+
+async def case_add_tags_to_db(db, ctx):
+    await repository_tags.add_tags_to_db(ctx.picture_id(), ctx.rng.sample(ctx.tag_names, 3) + ["micro"], db)
+
+
+async def case_add_rating_to_picture(db, ctx):
+    await repository_rating.add_rating_to_picture(ctx.picture_id(), ctx.rng.randint(1, 5), ctx.user, db)
+
+
+async def case_get_average_of_rating(db, ctx):
+    await repository_rating.get_average_of_rating(ctx.rng.choice(ctx.hot_picture_ids), db)
+
+
+async def case_get_reactions(db, ctx):
+    await repository_reactions.get_reactions(ctx.rng.choice(ctx.hot_comment_ids), db)
+
+
+async def case_search_pictures(db, ctx):
+    try:
+        await repository_search.search_pictures(keyword=ctx.rng.choice(ctx.tag_names)[:4], db=db)
+    except HTTPException:
+        pass
+
+
+async def case_get_comments(db, ctx):
+    await repository_comments.get_comments(ctx.rng.choice(ctx.hot_picture_ids), 0, 20, db)
+
+
+async def case_get_messages_for_user(db, ctx):
+    await repository_messages.get_messages_for_user(ctx.rng.choice(ctx.user_ids[:10]), db)
+
+
+async def case_get_all_pictures(db, ctx):
+    await repository_pictures.get_all_pictures(ctx.rng.randrange(ctx.picture_max - ctx.picture_min), 20, db)
+
+
+CASES = {name[len("case_"):]: case for name, case in globals().items() if name.startswith("case_")}
+
+
+class QueryCounter:
+    """
+    Count the statements sent to the database, leaving out the savepoints that isolate the calls.
+    """
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, conn, cursor, statement, *args):
+        if not statement.lstrip().upper().startswith(("SAVEPOINT", "RELEASE", "ROLLBACK")):
+            self.count += 1
+
+
+async def measure(case, engine, ctx, counter: QueryCounter, iterations: int, warmup: int,
+                  memory_iterations: int) -> dict:
+    """
+    Run one case with a fresh session per call and collect latency, query and memory figures.
+
+    Runs on the caller's event loop, so the timings do not include creating one.
+    """
+    async def call():
+        with engine.connect() as connection:
+            transaction = connection.begin()
+            db = Session(bind=connection, autoflush=False, join_transaction_mode="create_savepoint")
+            try:
+                await case(db, ctx)
+            finally:
+                db.close()
+                transaction.rollback()
+
+    for _ in range(warmup):
+        await call()
+
+    latencies = []
+    queries_before = counter.count
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await call()
+        latencies.append((time.perf_counter() - start) * 1000)
+    queries_per_call = (counter.count - queries_before) / iterations
+
+    allocated, peaks = [], []
+    tracemalloc.start()
+    for _ in range(memory_iterations):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        await call()
+        after, peak = tracemalloc.get_traced_memory()
+        allocated.append(max(0, after - before))
+        peaks.append(peak - before)
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "mean_ms": round(statistics.fmean(latencies), 4),
+        "p50_ms": round(percentile(latencies, 50), 4),
+        "p95_ms": round(percentile(latencies, 95), 4),
+        "queries_per_call": round(queries_per_call, 2),
+        "retained_bytes_per_call": int(statistics.fmean(allocated)) if allocated else 0,
+        "peak_bytes_per_call": int(statistics.fmean(peaks)) if peaks else 0,
+    }
+
+
+def compare_to_baseline(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    List regressions: latency or peak memory worse than ``threshold`` (relative) or more queries per call.
+
+    Cases that pick random ids issue a slightly different number of statements from run to run, so
+    half a query per call of slack is allowed before a query-count change is reported.
+    """
+    regressions = []
+    for name, current in results["cases"].items():
+        previous = baseline["cases"].get(name)
+        if previous is None:
+            continue
+        for key in ("p50_ms", "peak_bytes_per_call"):
+            if previous[key] and current[key] > previous[key] * (1 + threshold):
+                regressions.append(f"{name}: {key} {previous[key]} -> {current[key]}")
+        if current["queries_per_call"] > previous["queries_per_call"] + 0.5:
+            regressions.append(f"{name}: queries_per_call {previous['queries_per_call']} -> "
+                               f"{current['queries_per_call']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark repository functions.")
+    parser.add_argument("--db-url", required=True)
+    parser.add_argument("--seed-scale", choices=SCALES, help="Generate a dataset of this scale first.")
+    parser.add_argument("--cases", default=",".join(CASES), help="Comma-separated cases to run.")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--memory-iterations", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", help="Baseline file (defaults to benchmarks/baselines/micro-<dialect>.json).")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 on regression.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative slowdown.")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SQLALCHEMY_DATABASE_URL", args.db_url)
+    import_repositories()
+    engine = create_engine(args.db_url)
+    if args.seed_scale:
+        DatasetGenerator(engine, seed=args.seed, **SCALES[args.seed_scale]).run()
+    if engine.dialect.name == "sqlite":
+        # explicit BEGIN, so the savepoints of a call nest inside the transaction rolled back after it
+        install_sqlite_mode(engine)
+    counter = QueryCounter(engine)
+    with Session(engine) as db:
+        ctx = MicroContext(db, args.seed)
+
+    results = {"commit": git_commit(), "database": engine.dialect.name, "cases": {}}
+    loop = asyncio.new_event_loop()
+    try:
+        for name in args.cases.split(","):
+            results["cases"][name] = loop.run_until_complete(
+                measure(CASES[name], engine, ctx, counter, args.iterations, args.warmup, args.memory_iterations))
+            stats = results["cases"][name]
+            print(f"{name:<26} p50 {stats['p50_ms']:>9.3f} ms  p95 {stats['p95_ms']:>9.3f} ms  "
+                  f"{stats['queries_per_call']:>7} queries  {stats['peak_bytes_per_call']:>10} B peak")
+    finally:
+        loop.close()
+
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f"micro-{engine.dialect.name}.json")
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {baseline_path}")
+
+    if args.check:
+        with open(baseline_path) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Load test of the database connection pool settings for a number of worker processes.
+
+Every gunicorn worker has its own pool, so ``workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)`` must fit
+in the database's ``max_connections`` minus the connections kept for migrations, replication and
+admin sessions. This starts ``--workers`` processes, each with ``--threads`` concurrent requests
+holding a connection for about ``--hold-ms`` (the time a request keeps its session), using the
+application's pool (``src.database.pool``) with the recommended settings or the ones given. It
+reports the checkout waits and timeouts and the connections opened, and fails when a checkout
+times out or the connections exceed the budget.
+
+Usage:
+    python -m benchmarks.pool --db-url sqlite:///./bench.db --workers 4 --max-connections 100
+    python -m benchmarks.pool --db-url postgresql://... --workers 8 --threads 40 --hold-ms 20
+    python -m benchmarks.pool --db-url postgresql://... --workers 8 --pool-size 20 --max-overflow 20
+"""
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import create_engine, exc, text
+
+from benchmarks.report import format_table, save, summarize
+from src.conf.config import settings
+from src.database.pool import engine_options, install_pool_metrics
+from src.services.metrics import metrics
+
+
+def recommend(workers: int, max_connections: int, reserved: int) -> dict:
+    """
+    Split the connections available to the app between the workers: two thirds of each worker's
+    share stay open in its pool and the rest is overflow for bursts.
+    """
+    per_worker = (max_connections - reserved) // workers
+    if per_worker < 2:
+        raise SystemExit(f"{max_connections - reserved} connections cannot serve {workers} workers.")
+    pool_size = max(1, per_worker * 2 // 3)
+    return {"db_pool_size": pool_size, "db_max_overflow": per_worker - pool_size}
+
+
+def server_max_connections(db_url: str):
+    engine = create_engine(db_url)
+    try:
+        if engine.dialect.name != "postgresql":
+            return None
+        with engine.connect() as connection:
+            return int(connection.execute(text("SHOW max_connections")).scalar())
+    finally:
+        engine.dispose()
+
+
+def run_worker(db_url: str, options: dict, threads: int, duration: float, hold_ms: float, seed: int) -> dict:
+    """
+    Run the requests of one worker process and return its checkout latencies and pool metrics.
+    """
+    for name, value in options.items():
+        setattr(settings, name, value)
+    metrics.reset()
+    engine = create_engine(db_url, **engine_options(db_url, "bench"))
+    install_pool_metrics(engine, "bench")
+    deadline = time.perf_counter() + duration
+    checkouts, lock = [], threading.Lock()
+
+    def requests(rng: random.Random):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                with engine.connect() as connection:
+                    waited = (time.perf_counter() - started) * 1000
+                    connection.execute(text("SELECT 1"))
+                    time.sleep(rng.expovariate(1000 / hold_ms))
+            except exc.TimeoutError:
+                continue
+            with lock:
+                checkouts.append(waited)
+
+    pool = [threading.Thread(target=requests, args=(random.Random(seed * 1000 + i),)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    engine.dispose()
+    return {"checkout_ms": checkouts, "timeouts": int(metrics.get("db.pool.bench.timeouts") or 0),
+            "waits": int(metrics.get("db.pool.bench.waits") or 0),
+            "connections": int(metrics.get("db.pool.bench.connects") or 0)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate the connection pool settings for N workers.")
+    parser.add_argument("--db-url", required=True)
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes, as in gunicorn -w.")
+    parser.add_argument("--threads", type=int, default=40, help="Concurrent requests per worker.")
+    parser.add_argument("--hold-ms", type=float, default=20.0, help="Mean time a request holds its connection.")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--max-connections", type=int, help="Server connection limit (read from Postgres if unset).")
+    parser.add_argument("--reserved", type=int, default=10, help="Connections kept for admin and replication.")
+    parser.add_argument("--pool-size", type=int, help="Test this DB_POOL_SIZE instead of the recommended one.")
+    parser.add_argument("--max-overflow", type=int, help="Test this DB_MAX_OVERFLOW instead of the recommended one.")
+    parser.add_argument("--pool-timeout", type=float, default=settings.db_pool_timeout)
+    parser.add_argument("--output-dir", default="bench_results")
+    args = parser.parse_args()
+
+    max_connections = args.max_connections or server_max_connections(args.db_url) or 100
+    options = recommend(args.workers, max_connections, args.reserved)
+    if args.pool_size is not None:
+        options["db_pool_size"] = args.pool_size
+    if args.max_overflow is not None:
+        options["db_max_overflow"] = args.max_overflow
+    options["db_pool_timeout"] = args.pool_timeout
+    budget = max_connections - args.reserved
+    print(f"{args.workers} workers, DB_POOL_SIZE={options['db_pool_size']} DB_MAX_OVERFLOW={options['db_max_overflow']}"
+          f" DB_POOL_TIMEOUT={options['db_pool_timeout']}: up to "
+          f"{args.workers * (options['db_pool_size'] + options['db_max_overflow'])} of {budget} connections")
+
+    with ProcessPoolExecutor(args.workers) as executor:
+        results = list(executor.map(run_worker, *zip(*[
+            (args.db_url, options, args.threads, args.duration, args.hold_ms, seed) for seed in range(args.workers)])))
+
+    checkouts = [latency for result in results for latency in result["checkout_ms"]]
+    timeouts = sum(result["timeouts"] for result in results)
+    connections = sum(result["connections"] for result in results)
+    report = {
+        "workers": args.workers, "threads": args.threads, "hold_ms": args.hold_ms, "max_connections": max_connections,
+        "reserved": args.reserved, "settings": options, "connections": connections,
+        "waits": sum(result["waits"] for result in results), "timeouts": timeouts,
+        "scenarios": {"checkout": summarize(checkouts, timeouts, args.duration)},
+    }
+    print(format_table(report))
+    print(f"waits={report['waits']} timeouts={timeouts} connections opened={connections}/{budget}")
+    print(f"Report written to {save(report, args.output_dir, 'pool')}")
+    if timeouts or connections > budget:
+        raise SystemExit("The pool settings do not fit this load.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Latency/throughput reports for benchmark runs.
+
+Usage:
+    python -m benchmarks.report show bench_results/<run>.json
+    python -m benchmarks.report compare bench_results/<before>.json bench_results/<after>.json
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+from datetime import datetime
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies_ms: list[float], errors: int, elapsed_s: float, rejected: int = 0) -> dict:
+    """
+    Summarize one scenario's latencies (in milliseconds) into the numbers compared across commits.
+
+    ``rejected`` counts requests shed by rate limiting or admission control (429/503), kept apart from errors.
+    """
+    values = sorted(latencies_ms)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rejected": rejected,
+        "throughput_rps": round(len(values) / elapsed_s, 2) if elapsed_s else 0.0,
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "max_ms": round(values[-1], 3) if values else 0.0,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save(report: dict, output_dir: str = "bench_results", name: str = "load") -> str:
+    """
+    Write a report as JSON, tagged with the current commit, and return its path.
+    """
+    report = {"commit": git_commit(), "created_at": datetime.now().isoformat(), **report}
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{name}-{report['commit']}-{datetime.now():%Y%m%d%H%M%S}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def format_table(report: dict) -> str:
+    lines = [f"{'scenario':<12}{'requests':>10}{'errors':>8}{'rejected':>10}{'rps':>10}{'p50':>10}{'p95':>10}"
+             f"{'p99':>10}"]
+    for name, stats in report["scenarios"].items():
+        lines.append(f"{name:<12}{stats['requests']:>10}{stats['errors']:>8}{stats.get('rejected', 0):>10}"
+                     f"{stats['throughput_rps']:>10}"
+                     f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+    return "\n".join(lines)
+
+
+def compare(before: dict, after: dict) -> str:
+    """
+    Format the relative change of throughput and percentiles between two reports.
+    """
+    def change(old, new):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    lines = [f"{before['commit']} -> {after['commit']}",
+             f"{'scenario':<12}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}"]
+    for name, new in after["scenarios"].items():
+        old = before["scenarios"].get(name)
+        if old is None:
+            continue
+        lines.append(f"{name:<12}{change(old['throughput_rps'], new['throughput_rps']):>10}"
+                     f"{change(old['p50_ms'], new['p50_ms']):>10}{change(old['p95_ms'], new['p95_ms']):>10}"
+                     f"{change(old['p99_ms'], new['p99_ms']):>10}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or compare benchmark reports.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    show_parser = subparsers.add_parser("show")
+    show_parser.add_argument("report")
+    compare_parser = subparsers.add_parser("compare")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        with open(args.report) as f:
+            print(format_table(json.load(f)))
+    else:
+        with open(args.before) as f_before, open(args.after) as f_after:
+            print(compare(json.load(f_before), json.load(f_after)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Throughput of the local picture transform engine (``src.services.transform``) on large images.
+
+For each effect chain the benchmark reports the time of a full ``render`` (decode, effects,
+encode) and of the effects alone on an already decoded image, in ms and megapixels per second.
+The default image is 12 MP (4000x3000), a typical phone photo.
+
+Usage:
+    python -m benchmarks.transform
+    python -m benchmarks.transform --size 4000x3000 --iterations 5 --format jpeg --json bench_results/transform.json
+"""
+import argparse
+import io
+import json
+import statistics
+import time
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.report import git_commit
+from src.services.transform import _Pipeline, _effect, render
+
+CHAINS = {
+    "tones": [{"effect": "contrast:20"}, {"effect": "brightness:10"}, {"effect": "gamma:30"}],
+    "improve": [{"effect": "improve:outdoor:50"}],
+    "grayscale": [{"effect": "grayscale"}, {"effect": "contrast:15"}],
+    "unsharp_mask": [{"effect": "unsharp_mask:200"}],
+    "all": [{"effect": "improve:outdoor:50"}, {"effect": "contrast:20"}, {"effect": "unsharp_mask:100"},
+            {"effect": "brightness:10"}, {"effect": "gamma:30"}, {"effect": "grayscale"}],
+}
+
+
+def photo_like(width: int, height: int, seed: int = 0) -> Image.Image:
+    """
+    A smooth random image with some noise, which compresses roughly like a photo.
+    """
+    rng = np.random.default_rng(seed)
+    base = Image.fromarray(rng.integers(0, 256, (height // 250 + 2, width // 250 + 2, 3), dtype=np.uint8))
+    pixels = np.asarray(base.resize((width, height), Image.BICUBIC), dtype=np.int16)
+    pixels += rng.integers(-12, 13, pixels.shape, dtype=np.int16)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def effects_only(image: Image.Image, transformation: list[dict]) -> Image.Image:
+    pipeline = _Pipeline(image)
+    for effect in transformation:
+        pipeline.apply(*_effect(effect))
+    return pipeline.flush()
+
+
+def timed(function, iterations: int) -> list[float]:
+    function()
+    times = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="4000x3000", help="Image size, WIDTHxHEIGHT.")
+    parser.add_argument("--format", default="jpeg", choices=["jpeg", "png", "webp"])
+    parser.add_argument("--chains", default=",".join(CHAINS), help="Comma-separated effect chains to run.")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    width, height = (int(value) for value in args.size.lower().split("x"))
+    megapixels = width * height / 1e6
+    image = photo_like(width, height)
+    encoded = io.BytesIO()
+    image.save(encoded, format=args.format.upper(), quality=90)
+    data = encoded.getvalue()
+    print(f"{width}x{height} ({megapixels:.1f} MP) {args.format}, {len(data) / 1e6:.1f} MB")
+
+    results = {"commit": git_commit(), "size": [width, height], "format": args.format, "chains": {}}
+    for name in args.chains.split(","):
+        transformation = CHAINS[name]
+        full = statistics.median(timed(lambda: render(data, transformation), args.iterations))
+        effects = statistics.median(timed(lambda: effects_only(image, transformation), args.iterations))
+        results["chains"][name] = {"render_ms": round(full * 1000, 1), "effects_ms": round(effects * 1000, 1),
+                                   "render_mp_per_s": round(megapixels / full, 1),
+                                   "effects_mp_per_s": round(megapixels / effects, 1)}
+        print(f"{name:<14} render {full * 1000:>8.1f} ms ({megapixels / full:>6.1f} MP/s)   "
+              f"effects {effects * 1000:>8.1f} ms ({megapixels / effects:>7.1f} MP/s)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Throughput of concurrent reads and writes on SQLite (in the application's SQLite mode) or Postgres.
+
+Worker processes, each with concurrent threads, run the transactions of the app against a
+database seeded by ``benchmarks.dataset``: reading the latest pictures, and commenting a picture (read
+the picture, insert the comment, commit). Failed transactions, such as
+``database is locked``, are counted as errors. Reports are saved as ``writes-<dialect>`` so the
+databases can be compared with ``benchmarks.report compare``.
+
+Usage:
+    python -m benchmarks.dataset --db-url sqlite:///./bench.db --scale small
+    python -m benchmarks.writes --db-url sqlite:///./bench.db --workers 4 --threads 8
+    python -m benchmarks.writes --db-url sqlite:///./bench.db --workers 4 --threads 8 --no-sqlite-mode
+    python -m benchmarks.writes --db-url postgresql://... --workers 4 --threads 8
+    python -m benchmarks.report compare bench_results/writes-sqlite-<...>.json bench_results/writes-postgresql-<...>.json
+"""
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import create_engine, exc, func, select
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.report import format_table, save, summarize
+from src.database.models import Comment, Picture, User
+from src.database.pool import engine_options
+from src.database.sqlite import install_sqlite_mode
+
+
+def latest_pictures(db, rng, ids):
+    db.execute(select(Picture).order_by(Picture.created_at.desc()).limit(20)).scalars().all()
+
+
+def comment_picture(db, rng, ids):
+    picture = db.get(Picture, rng.randint(*ids["pictures"]))
+    if picture is None:
+        return
+    db.add(Comment(picture_id=picture.id, user_id=rng.randint(*ids["users"]), content="benchmark comment"))
+    db.commit()
+
+
+SCENARIOS = {"read": latest_pictures, "write": comment_picture}
+
+
+def run_worker(db_url: str, sqlite_mode: bool, threads: int, duration: float, write_ratio: float, seed: int) -> dict:
+    """
+    Run the transactions of one worker process and return their latencies and errors per scenario.
+    """
+    engine = create_engine(db_url, **engine_options(db_url, "bench"))
+    if sqlite_mode and engine.dialect.name == "sqlite":
+        install_sqlite_mode(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        ids = {"pictures": db.execute(select(func.min(Picture.id), func.max(Picture.id))).one(),
+               "users": db.execute(select(func.min(User.id), func.max(User.id))).one()}
+    deadline = time.perf_counter() + duration
+    latencies = {name: [] for name in SCENARIOS}
+    errors = {name: 0 for name in SCENARIOS}
+    lock = threading.Lock()
+
+    def transactions(rng: random.Random):
+        while time.perf_counter() < deadline:
+            name = "write" if rng.random() < write_ratio else "read"
+            started = time.perf_counter()
+            try:
+                with Session() as db:
+                    SCENARIOS[name](db, rng, ids)
+            except exc.OperationalError:
+                with lock:
+                    errors[name] += 1
+                continue
+            with lock:
+                latencies[name].append((time.perf_counter() - started) * 1000)
+
+    pool = [threading.Thread(target=transactions, args=(random.Random(seed * 1000 + i),)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    engine.dispose()
+    return {"latencies": latencies, "errors": errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare concurrent read/write throughput of SQLite and Postgres.")
+    parser.add_argument("--db-url", required=True)
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes, as in gunicorn -w.")
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent transactions per worker.")
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="Fraction of transactions that write.")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--no-sqlite-mode", dest="sqlite_mode", action="store_false",
+                        help="Use SQLite with the driver's defaults instead of the tuned mode.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default="bench_results")
+    args = parser.parse_args()
+
+    with ProcessPoolExecutor(args.workers) as executor:
+        results = list(executor.map(run_worker, *zip(*[
+            (args.db_url, args.sqlite_mode, args.threads, args.duration, args.write_ratio, args.seed + worker)
+            for worker in range(args.workers)])))
+
+    dialect = create_engine(args.db_url).dialect.name
+    report = {"dialect": dialect, "sqlite_mode": args.sqlite_mode and dialect == "sqlite", "workers": args.workers,
+              "threads": args.threads, "write_ratio": args.write_ratio, "scenarios": {}}
+    for name in SCENARIOS:
+        report["scenarios"][name] = summarize([value for result in results for value in result["latencies"][name]],
+                                              sum(result["errors"][name] for result in results), args.duration)
+    print(format_table(report))
+    print(f"Report written to {save(report, args.output_dir, f'writes-{dialect}')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,18 @@
-import redis.asyncio as redis
 import uvicorn
 from fastapi import FastAPI
-from fastapi_limiter import FastAPILimiter
 from starlette.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from src.routes import (users, auth, messages, tags, search, comments, pictures, descriptions, reactions,
-                        rating, main_router)
-from src.services.secrets_manager import SecretsManager
+                        rating, main_router, admin, media, derivatives, images)
+from src.database.db import ReadSessionLocal
+from src.services import derivatives as derivatives_service
+from src.services.phash import similarity_index
+from src.services.slow_query import RequestContextMiddleware
+from src.services.profiler import ProfilerMiddleware
+from src.services.admission import AdmissionMiddleware, parse_limits
+from src.services.cache import get_cache
+from src.services.rate_limit import RateLimitMiddleware, TokenBucketLimiter, parse_costs
+from src.conf.config import settings
 
 app = FastAPI()
 
@@ -16,6 +22,21 @@ origins = [
     "http://localhost:8000"
     ]
 
+app.add_middleware(RequestContextMiddleware)
+
+if settings.admission_enabled:
+    app.add_middleware(AdmissionMiddleware,
+                       limits=parse_limits(settings.admission_limits),
+                       queue_size=settings.admission_queue_size,
+                       timeout=settings.admission_queue_timeout)
+
+if settings.rate_limit_enabled:
+    app.add_middleware(RateLimitMiddleware,
+                       limiter=TokenBucketLimiter(get_cache(), settings.rate_limit_rate, settings.rate_limit_burst,
+                                                  settings.cache_max_entries),
+                       costs=parse_costs(settings.rate_limit_costs))
+
+# Added after the rate limiter and admission control so their 429/503 responses carry CORS headers.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -24,6 +45,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.profiling_enabled:
+    app.add_middleware(ProfilerMiddleware,
+                       allowlist=[email.strip() for email in settings.profiling_allowlist.split(",") if email.strip()],
+                       output_dir=settings.profiling_output_dir,
+                       interval=settings.profiling_interval)
+
 app.include_router(main_router.router, tags=["Main"])
 app.include_router(auth.router, prefix='/api')
 app.include_router(users.router, prefix='/api')
@@ -35,25 +62,27 @@ app.include_router(descriptions.router, prefix='/api')
 app.include_router(tags.router, prefix='/api')
 app.include_router(comments.router, prefix='/api')
 app.include_router(reactions.router, prefix='/api')
-
-REDIS_HOST = SecretsManager.get_secret("REDIS_HOST")
-REDIS_PORT = SecretsManager.get_secret("REDIS_PORT")
-REDIS_PASSWORD = SecretsManager.get_secret("REDIS_PASSWORD")
+app.include_router(admin.router, prefix='/api')
+app.include_router(media.router)
+app.include_router(derivatives.router)
+app.include_router(images.router)
 
 
 @app.on_event("startup")
-async def startup():
+def startup():
+    """
+    Function to start building the similarity index of picture hashes on application startup.
+    """
+    similarity_index.start(ReadSessionLocal)
+
+
+@app.on_event("shutdown")
+def shutdown():
     """
-    Function to initialize FastAPILimiter on application startup.
+    Function to stop the derivative worker processes and the similarity index rebuilds on application shutdown.
     """
-    r = await redis.Redis(
-        host=REDIS_HOST,
-        port=REDIS_PORT,
-        password=REDIS_PASSWORD,
-        encoding="utf-8",
-        decode_responses=True
-    )
-    await FastAPILimiter.init(r)
+    derivatives_service.shutdown()
+    similarity_index.stop()
 
 if __name__ == "__main__":
     uvicorn.run("main:app", reload=True)
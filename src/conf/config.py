@@ -1,3 +1,5 @@
+from typing import Optional
+
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 
@@ -13,15 +15,122 @@ class Settings(BaseSettings):
         region_name (str): The AWS region name.
         aws_access_key_id (str): The AWS access key ID.
         aws_secret_access_key (str): The AWS secret access key.
+        db_pool_size (int): Connections each worker process keeps open to a database.
+        db_max_overflow (int): Extra connections a worker opens under load beyond ``db_pool_size``.
+        db_pool_timeout (float): Seconds a request waits for a free connection before failing.
+        db_pool_recycle (int): Seconds after which a connection is replaced (-1 keeps them open).
+        db_pool_pre_ping (bool): Test each connection when it is checked out and replace it if it is dead.
+        db_statement_timeout_ms (int): Server-side statement timeout on Postgres in milliseconds (0 disables).
+        sqlite_busy_timeout_ms (int): Milliseconds a SQLite connection waits for the write lock before failing.
+        sqlite_cache_size_kb (int): Page cache of each SQLite connection in KiB.
+        sqlite_mmap_bytes (int): Bytes of a SQLite database file read through memory mapping.
+        database_replica_url (str): Database URL of a read replica used by ``get_read_db`` (unset reads from the primary).
+        replica_max_lag_seconds (float): Replication lag above which reads go to the primary.
+        replica_lag_check_interval (float): Seconds between two measurements of the replica lag.
+        slow_query_threshold_ms (float): Statements slower than this are recorded in the slow-query log.
+        slow_query_log_size (int): Number of slow-query records kept in memory.
+        slow_query_explain_sample_rate (float): Fraction of slow SELECTs re-run with EXPLAIN on Postgres (0 disables).
+        profiling_enabled (bool): Install the on-demand request profiler.
+        profiling_allowlist (str): Comma-separated emails allowed to request a profile.
+        profiling_output_dir (str): Directory where request profiles are written.
+        profiling_interval (float): Sampling interval of the profiler in seconds.
+        storage_backend (str): Where image files are stored: "cloudinary" or "local".
+        storage_local_root (str): Directory of the local storage backend.
+        storage_local_url (str): URL prefix under which local files are served.
+        storage_local_accel_redirect (str): Internal location prefix for X-Accel-Redirect (empty serves files from the app).
+        upload_max_bytes (int): Largest accepted image upload in bytes.
+        upload_allowed_formats (str): Comma-separated image formats accepted for upload (detected from the file content).
+        upload_batch_max_files (int): Files accepted by one batch upload.
+        upload_batch_concurrency (int): Files of a batch upload stored in parallel.
+        edit_cache_max_entries (int): Number of stored picture edits kept for reuse before the least recently used are deleted (in batches of a tenth of it).
+        derivatives_workers (int): Processes generating the resized copies of pictures (0 renders them in a thread).
+        image_cache_dir (str): Directory of the images resized on demand by ``/img``.
+        image_cache_max_bytes (int): Size of the resized images kept before the least recently used are deleted.
+        image_sizes (str): Comma-separated widths and heights ``/img`` renders; other sizes are refused.
+        cache_backend (str): Store of the user cache and rate limits: "redis", "memory" (per process) or "two-tier" (memory in front of Redis).
+        cache_max_entries (int): Keys kept by the in-memory cache before the least recently used are evicted.
+        cache_local_ttl (float): Seconds a value read from Redis is served from memory by the two-tier cache.
+        rate_limit_enabled (bool): Rate-limit every request per user (or IP) with token buckets.
+        rate_limit_rate (float): Tokens added to a client's bucket per second.
+        rate_limit_burst (float): Tokens a client's bucket holds at most.
+        rate_limit_costs (str): Comma-separated ``METHOD /path=tokens`` costs of the expensive routes (``*`` matches anything, other routes cost 1).
+        admission_enabled (bool): Limit the requests of the heavy endpoint classes running at once.
+        admission_limits (str): Comma-separated ``class=concurrency`` limits of the upload, edit, export and search endpoints, per worker.
+        admission_queue_size (int): Requests of a class that may wait for a slot before the next ones get 503.
+        admission_queue_timeout (float): Seconds a queued request waits for a slot before getting 503.
+        export_chunk_size (int): Rows fetched per round-trip when streaming data exports.
 
     Config:
         env_file (str): The path to the environment file.
         env_file_encoding (str): The encoding of the environment file.
     """
-    secret_name: str
-    region_name: str
-    aws_access_key_id: str
-    aws_secret_access_key: str
+    secret_name: Optional[str] = None
+    region_name: Optional[str] = None
+    aws_access_key_id: Optional[str] = None
+    aws_secret_access_key: Optional[str] = None
+
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_statement_timeout_ms: int = 0
+
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_cache_size_kb: int = 64 * 1024
+    sqlite_mmap_bytes: int = 256 * 1024 * 1024
+
+    database_replica_url: Optional[str] = None
+    replica_max_lag_seconds: float = 5.0
+    replica_lag_check_interval: float = 1.0
+
+    slow_query_threshold_ms: float = 200.0
+    slow_query_log_size: int = 500
+    slow_query_explain_sample_rate: float = 0.0
+
+    profiling_enabled: bool = False
+    profiling_allowlist: str = ""
+    profiling_output_dir: str = "profiles"
+    profiling_interval: float = 0.001
+
+    storage_backend: str = "cloudinary"
+    storage_local_root: str = "media"
+    storage_local_url: str = "/media"
+    storage_local_accel_redirect: str = ""
+
+    upload_max_bytes: int = 20 * 1024 * 1024
+    upload_allowed_formats: str = "jpg,png,gif,webp"
+    upload_batch_max_files: int = 50
+    upload_batch_concurrency: int = 4
+
+    edit_cache_max_entries: int = 10000
+
+    derivatives_workers: int = 2
+
+    image_cache_dir: str = "cache/img"
+    image_cache_max_bytes: int = 512 * 1024 * 1024
+    image_sizes: str = "32,48,64,100,128,160,200,250,320,400,480,640,800,1080,1280,1600,1920,2560"
+
+    export_chunk_size: int = 1000
+
+    cache_backend: str = "redis"
+    cache_max_entries: int = 10000
+    cache_local_ttl: float = 5.0
+
+    admission_enabled: bool = True
+    admission_limits: str = "upload=8,edit=4,export=2,search=16"
+    admission_queue_size: int = 16
+    admission_queue_timeout: float = 10.0
+
+    rate_limit_enabled: bool = True
+    rate_limit_rate: float = 2.0
+    rate_limit_burst: float = 120
+    rate_limit_costs: str = ("GET /static/*=0,GET /media/*=0,HEAD /media/*=0,GET /derivatives/*=0,"
+                             "POST /api/pictures/upload/batch=40,POST /api/pictures/upload=10,"
+                             "POST /picture/upload=10,PUT /api/pictures/*=10,POST /api/pictures/edit/*=20,"
+                             "POST /api/search/*=3,"
+                             "POST /api/auth/login=5,POST /login=5,POST /api/auth/signup=5,POST /register=5,"
+                             "POST /api/auth/request_email=5,POST /api/auth/reset_password/*=5")
 
     class Config:
         env_file = ".env"
@@ -1,14 +1,39 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from src.conf.config import settings
+from src.database.pool import engine_options, install_pool_metrics
+from src.database.replica import ReplicaMonitor, RoutingSession
+from src.database.sqlite import install_sqlite_mode
 from src.services.secrets_manager import SecretsManager
+from src.services.slow_query import slow_query_log
 
 SQLALCHEMY_DATABASE_URL = SecretsManager.get_secret("SQLALCHEMY_DATABASE_URL")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
+slow_query_log.install(engine)
+if engine.dialect.name == "sqlite":
+    install_sqlite_mode(engine)
+install_pool_metrics(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+replica_engine = None
+replica_monitor = None
+if settings.database_replica_url:
+    replica_engine = create_engine(settings.database_replica_url,
+                                   **engine_options(settings.database_replica_url, "replica"))
+    slow_query_log.install(replica_engine)
+    if replica_engine.dialect.name == "sqlite":
+        install_sqlite_mode(replica_engine)
+    install_pool_metrics(replica_engine, "replica")
+    replica_monitor = ReplicaMonitor(replica_engine, settings.replica_max_lag_seconds,
+                                     settings.replica_lag_check_interval)
+
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine,
+                                replica=replica_engine, monitor=replica_monitor)
+
 def get_db():
     """
     Function to obtain a database session.
@@ -24,3 +49,21 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """
+    Function to obtain a database session for read-only endpoints.
+
+    Its reads go to the read replica (``DATABASE_REPLICA_URL``) while the replica answers and lags
+    less than ``REPLICA_MAX_LAG_SECONDS``, otherwise to the primary. Anything it writes goes to the
+    primary, and so do its reads from then on. Without a replica it is the same as ``get_db``.
+
+    Yields:
+        RoutingSession: A SQLAlchemy database session.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
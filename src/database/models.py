@@ -1,6 +1,6 @@
 import datetime
 
-from sqlalchemy import Column, Integer, String, func, ForeignKey
+from sqlalchemy import BigInteger, Column, Float, Integer, SmallInteger, String, func, ForeignKey, Index, UniqueConstraint, case
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql.sqltypes import DateTime, Boolean, JSON
@@ -38,6 +38,38 @@ class Tag(Base):
     pictures = relationship('Picture', secondary='picture_tags_association', back_populates='tags')
 
 
+class Asset(Base):
+    """
+    SQLAlchemy model representing a stored picture file, shared by all pictures with the same content.
+
+    Attributes:
+        id (int): Primary key for the asset.
+        sha256 (str): Hex SHA-256 of the file content (unique).
+        picture_json (dict): Storage response of the file upload.
+        picture_url (str): URL of the file.
+        qr_code_picture (str): URL of the QR code of the file (nullable).
+        size (int): Size of the file in bytes.
+        phash (int): 64-bit perceptual hash (dHash) of the image, stored signed (nullable).
+        derivatives (dict): URLs of the resized copies of the file, by format and width (nullable).
+        ref_count (int): Number of pictures using the asset; the files are deleted when it drops to 0.
+        created_at (DateTime): Timestamp indicating when the asset was stored.
+    """
+    __tablename__ = "asset"
+
+    id = Column(Integer, primary_key=True)
+    sha256 = Column(String(64), nullable=False, unique=True)
+    picture_json = Column(JSON, nullable=True)
+    picture_url = Column(String(255), nullable=False)
+    qr_code_picture = Column(String(255), nullable=True)
+    size = Column(Integer, nullable=False, default=0)
+    phash = Column(BigInteger, nullable=True)
+    derivatives = Column(JSON, nullable=True)
+    ref_count = Column(Integer, nullable=False, default=0, server_default='0')
+    created_at = Column(DateTime, default=func.now())
+
+    pictures = relationship('Picture', back_populates='asset')
+
+
 class Picture(Base):
     """
     SQLAlchemy model representing a picture.
@@ -54,31 +86,138 @@ class Picture(Base):
         qr_code_picture_edited (str): URL of the QR code associated with the edited picture (nullable).
         description (str): Description of the picture (nullable).
         created_at (DateTime): Timestamp indicating when the picture was created.
+        rating_count (int): Number of ratings of the picture, kept up to date by the rating repository.
+        rating_sum (int): Sum of the ratings of the picture, kept up to date by the rating repository.
+        asset_id (int): Foreign key referencing the stored file of the picture (nullable for pictures
+            uploaded before deduplication).
+        asset (Asset): Relationship with the Asset model holding the stored file.
+        phash (int): 64-bit perceptual hash (dHash) of the picture, stored signed, used to find similar
+            pictures (nullable until computed).
+        derivatives (dict): URLs of the resized copies of the picture by format and width, e.g.
+            ``{"webp": {"160": url, ...}, "jpeg": {...}}`` (nullable until generated).
+        srcset (str): ``srcset`` of the JPEG copies; before they exist it points to the route that
+            generates them on first request.
+        srcset_webp (str): ``srcset`` of the WebP copies, likewise.
+        width (int): Displayed width of the image in pixels, after EXIF orientation (nullable until
+            the metadata is extracted).
+        height (int): Displayed height of the image in pixels (nullable).
+        taken_at (DateTime): Capture time from EXIF ``DateTimeOriginal`` (nullable).
+        camera_make (str): Camera manufacturer from EXIF (nullable).
+        camera_model (str): Camera model from EXIF (nullable).
+        lens_model (str): Lens model from EXIF (nullable).
+        orientation (int): EXIF orientation, 1-8 (nullable).
+        gps_latitude (float): Latitude in decimal degrees from EXIF GPS (nullable).
+        gps_longitude (float): Longitude in decimal degrees from EXIF GPS (nullable).
     """
     __tablename__ = "picture"
+    __table_args__ = (
+        Index('ix_picture_dimensions', 'width', 'height'),
+        Index('ix_picture_gps', 'gps_latitude', 'gps_longitude'),
+    )
+
+    DERIVATIVE_WIDTHS = (160, 480, 1080)
 
     id = Column(Integer, primary_key=True, index=True)
     picture_json = Column(JSON, nullable=True)
     picture_url = Column(String(255), nullable=False)
     picture_edited_json = Column(JSON, nullable=True)
-    picture_edited_url = Column(String(255), nullable=True)
+    picture_edited_url = Column(String(255), nullable=True, index=True)
     qr_code_picture = Column(String(255), nullable=True)
     qr_code_picture_edited = Column(String(255), nullable=True)
     description = Column(String, nullable=True)
-    created_at = Column('created_at', DateTime, default=func.now())
-    user_id = Column('user_id', ForeignKey('user.id', ondelete='CASCADE'), default=None)
+    created_at = Column('created_at', DateTime, default=func.now(), index=True)
+    user_id = Column('user_id', ForeignKey('user.id', ondelete='CASCADE'), default=None, index=True)
+    rating_count = Column(Integer, nullable=False, default=0, server_default='0')
+    rating_sum = Column(Integer, nullable=False, default=0, server_default='0')
+    asset_id = Column(Integer, ForeignKey('asset.id', ondelete='SET NULL'), nullable=True, index=True)
+    phash = Column(BigInteger, nullable=True)
+    derivatives = Column(JSON, nullable=True)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    taken_at = Column(DateTime, nullable=True, index=True)
+    camera_make = Column(String(64), nullable=True)
+    camera_model = Column(String(64), nullable=True)
+    lens_model = Column(String(128), nullable=True)
+    orientation = Column(SmallInteger, nullable=True)
+    gps_latitude = Column(Float, nullable=True)
+    gps_longitude = Column(Float, nullable=True)
 
     user = relationship('User', back_populates='pictures')
+    asset = relationship('Asset', back_populates='pictures')
     tags = relationship('Tag', secondary='picture_tags_association', back_populates='pictures')
     comments = relationship('Comment', back_populates='picture')
     ratings = relationship('Rating', back_populates='picture')
 
     @hybrid_property
     def average_rating(self):
-        if self.ratings:
-            return sum(rat.rat for rat in self.ratings) / len(self.ratings)
+        if self.rating_count:
+            return self.rating_sum / self.rating_count
         return None
 
+    @average_rating.expression
+    def average_rating(cls):
+        return case((cls.rating_count > 0, cls.rating_sum * 1.0 / cls.rating_count), else_=None)
+
+    def _srcset(self, image_format: str) -> str:
+        if self.derivatives:
+            urls = self.derivatives.get(image_format, {})
+            return ", ".join(f"{urls[width]} {width}w" for width in sorted(urls, key=int))
+        return ", ".join(f"/derivatives/{self.id}/{width}.{image_format} {width}w"
+                         for width in self.DERIVATIVE_WIDTHS)
+
+    @property
+    def srcset(self) -> str:
+        return self._srcset("jpeg")
+
+    @property
+    def srcset_webp(self) -> str:
+        return self._srcset("webp")
+
+
+# the camera and lens filters match a prefix of the lowercased column
+Index('ix_picture_camera_make_lower', func.lower(Picture.camera_make).label('camera_make_lower'),
+      postgresql_ops={'camera_make_lower': 'text_pattern_ops'})
+Index('ix_picture_camera_model_lower', func.lower(Picture.camera_model).label('camera_model_lower'),
+      postgresql_ops={'camera_model_lower': 'text_pattern_ops'})
+Index('ix_picture_lens_model_lower', func.lower(Picture.lens_model).label('lens_model_lower'),
+      postgresql_ops={'lens_model_lower': 'text_pattern_ops'})
+
+
+class CachedEdit(Base):
+    """
+    SQLAlchemy model representing a stored result of a picture edit, reused for identical edits.
+
+    Attributes:
+        id (int): Primary key for the cached edit.
+        source_public_id (str): Public id of the edited picture file.
+        source_version (str): Version of the edited picture file.
+        transformation_key (str): SHA-256 of the canonical transformation.
+        transformation (list): The canonical transformation.
+        picture_edited_json (dict): Storage response of the edited file.
+        picture_edited_url (str): URL of the edited file.
+        qr_code_picture_edited (str): URL of the QR code of the edited file (nullable).
+        render_ms (float): Time the transformation, upload and QR code took, saved by each hit.
+        hits (int): Number of edits answered from this entry.
+        created_at (DateTime): Timestamp indicating when the edit was stored.
+        last_used_at (DateTime): Timestamp of the last hit, used for LRU eviction.
+    """
+    __tablename__ = "cached_edit"
+    __table_args__ = (UniqueConstraint('source_public_id', 'source_version', 'transformation_key',
+                                       name='uq_cached_edit_source_transformation'),)
+
+    id = Column(Integer, primary_key=True)
+    source_public_id = Column(String(255), nullable=False)
+    source_version = Column(String(32), nullable=False)
+    transformation_key = Column(String(64), nullable=False)
+    transformation = Column(JSON, nullable=False)
+    picture_edited_json = Column(JSON, nullable=False)
+    picture_edited_url = Column(String(255), nullable=False)
+    qr_code_picture_edited = Column(String(255), nullable=True)
+    render_ms = Column(Float, nullable=False, default=0)
+    hits = Column(Integer, nullable=False, default=0, server_default='0')
+    created_at = Column(DateTime, default=func.now())
+    last_used_at = Column(DateTime, default=func.now(), index=True)
+
 
 class Rating(Base):
     """
@@ -95,6 +234,7 @@ class Rating(Base):
     The `picture` and `user` relationships create a direct link between the Rating instance and the associated Picture and User instances, respectively. This setup facilitates easy navigation and manipulation of related data within the application's ORM layer.
     """
     __tablename__ = "rating"
+    __table_args__ = (UniqueConstraint('picture_id', 'user_id', name='uq_rating_picture_id_user_id'),)
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     picture_id = Column(Integer, ForeignKey('picture.id', ondelete='CASCADE'))
@@ -118,9 +258,10 @@ class Comment(Base):
         user (User): Relationship with the User model representing the user who posted the comment.
     """
     __tablename__ = "comment"
+    __table_args__ = (Index('ix_comment_picture_id_created_at', 'picture_id', 'created_at'),)
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey('user.id', ondelete='CASCADE'))
+    user_id = Column(Integer, ForeignKey('user.id', ondelete='CASCADE'), index=True)
     picture_id = Column(Integer, ForeignKey('picture.id', ondelete='CASCADE'))
     content = Column(String(255), nullable=False)
     created_at = Column(DateTime)
@@ -144,7 +285,7 @@ class Reaction(Base):
     __tablename__ = "reactions"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    comment_id = Column(Integer, ForeignKey('comment.id', ondelete='CASCADE'))
+    comment_id = Column(Integer, ForeignKey('comment.id', ondelete='CASCADE'), unique=True)
     data = Column(JSON)
 
     comment = relationship('Comment', back_populates='reactions')
@@ -173,7 +314,7 @@ class User(Base):
     __tablename__ = "user"
 
     id = Column(Integer, primary_key=True, index=True)
-    username = Column(String(50))
+    username = Column(String(50), index=True)
     email = Column(String(250), nullable=False, unique=True)
     password = Column(String(255), nullable=False)
     created_at = Column('crated_at', DateTime, default=func.now())
@@ -235,3 +376,8 @@ class Message(Base):
 
     sender = relationship('User', back_populates='sent_messages', foreign_keys=[sender_id])
     receiver = relationship('User', back_populates='received_messages', foreign_keys=[receiver_id])
+
+    __table_args__ = (
+        Index('ix_message_sender_id_timestamp', 'sender_id', 'timestamp'),
+        Index('ix_message_receiver_id_timestamp', 'receiver_id', 'timestamp'),
+    )
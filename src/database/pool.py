@@ -0,0 +1,115 @@
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+
+from src.conf.config import settings
+from src.services.metrics import metrics
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    A ``QueuePool`` that reports how long checkouts wait for a connection.
+
+    A checkout waits when no connection is idle and the overflow is used up. Each such wait is
+    counted in ``db.pool.{name}.waits`` with its duration added to ``db.pool.{name}.wait_seconds``
+    (the slowest in the ``max_wait_seconds`` gauge), and checkouts that give up after ``pool_timeout``
+    are counted in ``db.pool.{name}.timeouts``, so an exhausted pool shows in ``/api/admin/metrics``
+    instead of as unexplained latency.
+    """
+
+    def __init__(self, creator, pool_size: int = 5, max_overflow: int = 10, timeout: float = 30.0,
+                 metrics_name: str = "primary", **kwargs):
+        super().__init__(creator, pool_size=pool_size, max_overflow=max_overflow, timeout=timeout, **kwargs)
+        self.max_overflow = max_overflow
+        self.metrics_name = metrics_name
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        pool = super().recreate()
+        pool.max_overflow, pool.metrics_name = self.max_overflow, self.metrics_name
+        return pool
+
+    def _do_get(self):
+        prefix = f"db.pool.{self.metrics_name}"
+        waits = self.checkedin() == 0 and -1 < self.max_overflow <= self.overflow()
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            metrics.inc(f"{prefix}.timeouts")
+            raise
+        finally:
+            if waits:
+                waited = time.perf_counter() - started
+                metrics.inc(f"{prefix}.waits")
+                metrics.inc(f"{prefix}.wait_seconds", waited)
+                if waited > (metrics.get(f"{prefix}.max_wait_seconds") or 0):
+                    metrics.set(f"{prefix}.max_wait_seconds", waited)
+
+
+def engine_options(url: str, name: str = "primary") -> dict:
+    """
+    Return the ``create_engine`` arguments of the application's engines, from the ``DB_*`` settings.
+
+    Every gunicorn worker has its own pool, so a database serves up to
+    ``workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)`` connections from the app. Server-side statement
+    timeouts are set through the connection options on Postgres; other databases ignore
+    ``DB_STATEMENT_TIMEOUT_MS``.
+
+    Args:
+        url (str): The database URL.
+        name (str): Name of the pool in the metrics.
+
+    Returns:
+        dict: Keyword arguments for ``create_engine``.
+    """
+    parsed = make_url(url)
+    options = {"pool_pre_ping": settings.db_pool_pre_ping, "connect_args": {}}
+    if parsed.get_backend_name() == "sqlite":
+        options["connect_args"]["check_same_thread"] = False
+        if parsed.database in (None, "", ":memory:"):
+            return options
+    options.update(poolclass=InstrumentedQueuePool, pool_size=settings.db_pool_size,
+                   max_overflow=settings.db_max_overflow, pool_timeout=settings.db_pool_timeout,
+                   pool_recycle=settings.db_pool_recycle, pool_use_lifo=True, metrics_name=name)
+    if parsed.get_backend_name() == "postgresql" and settings.db_statement_timeout_ms:
+        options["connect_args"]["options"] = f"-c statement_timeout={settings.db_statement_timeout_ms}"
+    return options
+
+
+def install_pool_metrics(engine: Engine, name: str = "primary") -> None:
+    """
+    Export the connections of an engine's pool as metrics: ``db.pool.{name}.checked_out`` and
+    ``overflow`` gauges, and ``connects``, ``checkouts`` and ``invalidated`` counters.
+    """
+    prefix = f"db.pool.{name}"
+    checked_out = {"connections": 0}
+    lock = threading.Lock()
+
+    def update(change: int) -> None:
+        # The checkin event fires before the pool takes the connection back, so the pool's own
+        # count would still include it: keep ours.
+        with lock:
+            checked_out["connections"] += change
+            metrics.set(f"{prefix}.checked_out", checked_out["connections"])
+        if hasattr(engine.pool, "overflow"):
+            metrics.set(f"{prefix}.overflow", max(engine.pool.overflow(), 0))
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.inc(f"{prefix}.connects")
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.inc(f"{prefix}.checkouts")
+        update(1)
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        update(-1)
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.inc(f"{prefix}.invalidated")
@@ -0,0 +1,118 @@
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from sqlalchemy import Delete, Insert, Select, Update, event, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from src.services.metrics import metrics
+
+POSTGRES_LAG = text("SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+                    "THEN 0 ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END")
+
+
+def default_lag(connection: Connection) -> float:
+    """
+    Return the replication lag of a replica in seconds.
+
+    On Postgres this is the age of the last replayed transaction while WAL received from the
+    primary is still waiting to be replayed, and 0 once the replica has caught up. Other databases
+    have no standard way to tell, so they are assumed to be current.
+    """
+    if connection.dialect.name == "postgresql":
+        return float(connection.execute(POSTGRES_LAG).scalar() or 0)
+    return 0.0
+
+
+class ReplicaMonitor:
+    """
+    Tells whether reads can go to a replica: it answers and lags at most ``max_lag`` seconds.
+
+    The lag is measured at most every ``check_interval`` seconds (by the first request after the
+    interval, the others use the cached value). An unreachable replica counts as lagging, so its
+    reads fall back to the primary until it answers again.
+    """
+
+    def __init__(self, engine: Engine, max_lag: float, check_interval: float,
+                 lag: Callable[[Connection], float] = default_lag):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lag = lag
+        self._checked_at: Optional[float] = None
+        self._current_lag: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def lag(self) -> Optional[float]:
+        """
+        Return the last measured lag in seconds, or None if the replica could not be reached.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._checked_at is None or now - self._checked_at >= self.check_interval:
+                self._checked_at = now
+                try:
+                    with self.engine.connect() as connection:
+                        self._current_lag = self._lag(connection)
+                    metrics.set("db.replica.lag_seconds", self._current_lag)
+                except Exception as e:
+                    logging.error(f"Read replica is unavailable: {e}")
+                    self._current_lag = None
+            return self._current_lag
+
+    def usable(self) -> bool:
+        lag = self.lag()
+        return lag is not None and lag <= self.max_lag
+
+
+class RoutingSession(Session):
+    """
+    A session that reads from a replica and writes to the primary (its ``bind``).
+
+    Whether the replica is used is decided at the first read, from the ``ReplicaMonitor``, and kept
+    for the whole session so its reads see one database. Flushes, INSERT/UPDATE/DELETE statements
+    and ``SELECT ... FOR UPDATE`` always go to the primary, and once the session has written, its
+    later reads go there too: a request reads its own writes even though the replica has not
+    replayed them yet.
+    """
+
+    def __init__(self, *args, replica: Optional[Engine] = None, monitor: Optional[ReplicaMonitor] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replica = replica
+        self.monitor = monitor
+
+    @property
+    def uses_primary(self) -> bool:
+        return self.info.get("primary", False)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if _writes(clause):
+            self.stick_to_primary()
+        if self.replica is None or self.uses_primary or self._flushing or not self._reads_replica():
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        return self.replica
+
+    def _reads_replica(self) -> bool:
+        if "replica" not in self.info:
+            self.info["replica"] = self.monitor is None or self.monitor.usable()
+            metrics.inc("db.replica.sessions" if self.info["replica"] else "db.replica.fallbacks")
+        return self.info["replica"]
+
+    def stick_to_primary(self) -> None:
+        """
+        Send all the later statements of the session to the primary.
+        """
+        self.info["primary"] = True
+
+
+def _writes(clause) -> bool:
+    if isinstance(clause, (Insert, Update, Delete)):
+        return True
+    return isinstance(clause, Select) and clause._for_update_arg is not None
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _stick_after_flush(session, flush_context):
+    session.stick_to_primary()
@@ -0,0 +1,54 @@
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.conf.config import settings
+from src.services.metrics import metrics
+
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE", "SAVEPOINT", "CREATE", "DROP", "ALTER")
+
+
+def install_sqlite_mode(engine: Engine) -> None:
+    """
+    Tune a SQLite engine for serving the application from a single node.
+
+    Each connection is put in WAL mode (readers and the writer no longer block each other) with
+    ``synchronous=NORMAL``, a ``SQLITE_CACHE_SIZE_KB`` page cache, ``SQLITE_MMAP_BYTES`` of
+    memory-mapped I/O and a ``SQLITE_BUSY_TIMEOUT_MS`` busy timeout.
+
+    Writes are serialized without ``database is locked`` errors: SQLite cannot upgrade a read
+    transaction to a write transaction while another connection writes, and fails at once instead of
+    waiting. So the driver's implicit ``BEGIN`` is disabled, statements run in autocommit until the
+    first write of a transaction, and that write opens it with ``BEGIN IMMEDIATE``, which takes the
+    write lock up front (waiting up to the busy timeout for it). Reads before the first write thus
+    each see the latest commit, as under Postgres' default READ COMMITTED, and the write lock is
+    held only from the first write (usually the flush at commit) to the commit.
+
+    Args:
+        engine (Engine): An engine on a SQLite database file.
+    """
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {int(settings.sqlite_busy_timeout_ms)}")
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute("PRAGMA synchronous = NORMAL")
+        cursor.execute(f"PRAGMA cache_size = -{int(settings.sqlite_cache_size_kb)}")
+        cursor.execute(f"PRAGMA mmap_size = {int(settings.sqlite_mmap_bytes)}")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+        cursor.close()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def begin_immediate(conn, cursor, statement, parameters, context, executemany):
+        if conn.connection.dbapi_connection.in_transaction or not _writes(statement):
+            return
+        started = time.perf_counter()
+        cursor.execute("BEGIN IMMEDIATE")
+        metrics.inc("db.sqlite.write_transactions")
+        metrics.inc("db.sqlite.write_lock_wait_seconds", time.perf_counter() - started)
+
+
+def _writes(statement: str) -> bool:
+    return statement.lstrip().split(None, 1)[0].upper() in WRITE_STATEMENTS
@@ -0,0 +1,154 @@
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.database.models import Asset
+
+
+def _lock_asset(db: Session, *criteria) -> Optional[Asset]:
+    """
+    Loads an asset with its row locked until the end of the transaction (a no-op on SQLite, where
+    writers are serialized anyway).
+    """
+    return db.execute(select(Asset).where(*criteria).with_for_update()).scalar()
+
+
+async def acquire_asset(sha256: str, db: Session) -> Optional[Asset]:
+    """
+    Takes a reference to the stored asset with the given content hash.
+
+    The reference count is incremented but not committed, so it is committed (or rolled back)
+    together with the picture that uses the asset.
+
+    Parameters:
+        sha256 (str): Hex SHA-256 of the uploaded file.
+        db (Session): Database session object.
+
+    Returns:
+        Asset | None: The referenced asset, or None if no picture uses a file with this content.
+    """
+    asset = _lock_asset(db, Asset.sha256 == sha256, Asset.ref_count > 0)
+    if asset is not None:
+        asset.ref_count += 1
+        db.flush()
+    return asset
+
+
+async def is_asset_stored(sha256: str, db: Session) -> bool:
+    """
+    Tells whether a file with the given content hash is stored and referenced, without taking a reference.
+
+    Parameters:
+        sha256 (str): Hex SHA-256 of the file.
+        db (Session): Database session object.
+
+    Returns:
+        bool: True if ``acquire_asset`` would currently find the asset.
+    """
+    return db.execute(select(Asset.id).where(Asset.sha256 == sha256, Asset.ref_count > 0)).first() is not None
+
+
+async def stored_hashes(hashes: list[str], db: Session) -> set[str]:
+    """
+    Returns which of the given content hashes are stored and referenced, with one query.
+
+    Parameters:
+        hashes (list[str]): Hex SHA-256 of files.
+        db (Session): Database session object.
+
+    Returns:
+        set[str]: The hashes for which ``is_asset_stored`` would be True.
+    """
+    if not hashes:
+        return set()
+    return set(db.scalars(select(Asset.sha256).where(Asset.sha256.in_(hashes), Asset.ref_count > 0)))
+
+
+async def create_asset(sha256: str, picture_json: dict, picture_url: str, qr: Optional[str], size: int,
+                       db: Session, phash: Optional[int] = None,
+                       derivatives: Optional[dict] = None) -> tuple[Asset, Optional[dict]]:
+    """
+    Records a newly stored file as an asset with one reference, without committing.
+
+    An unreferenced row left behind by a failed purge is reused, and the files it pointed to are
+    returned so the caller can delete them. If another request created the asset for the same
+    content in the meantime, a reference to that asset is taken instead; the caller's files are then
+    not used by the returned asset.
+
+    Parameters:
+        sha256 (str): Hex SHA-256 of the stored file.
+        picture_json (dict): Storage response of the file upload.
+        picture_url (str): URL of the file.
+        qr (str | None): URL of the QR code of the file.
+        size (int): Size of the file in bytes.
+        db (Session): Database session object.
+        phash (int, optional): Perceptual hash of the image, as stored in the database.
+        derivatives (dict, optional): URLs of the resized copies of the file.
+
+    Returns:
+        tuple[Asset, dict | None]: The asset holding the file, and the ``picture_json`` and
+        ``derivatives`` of the files of the reused row, if any.
+    """
+    values = dict(picture_json=picture_json, picture_url=picture_url, qr_code_picture=qr, size=size, phash=phash,
+                  derivatives=derivatives, ref_count=1)
+    asset = _lock_asset(db, Asset.sha256 == sha256)
+    if asset is not None:
+        replaced = None
+        if asset.ref_count > 0:
+            asset.ref_count += 1
+        else:
+            replaced = {"picture_json": asset.picture_json, "derivatives": asset.derivatives}
+            for key, value in values.items():
+                setattr(asset, key, value)
+        db.flush()
+        return asset, replaced
+    try:
+        with db.begin_nested():
+            asset = Asset(sha256=sha256, **values)
+            db.add(asset)
+    except IntegrityError:
+        return await acquire_asset(sha256, db), None
+    return asset, None
+
+
+async def release_asset(asset_id: int, db: Session) -> Optional[Asset]:
+    """
+    Drops a reference to an asset, without committing; called when a picture using it is deleted.
+
+    Parameters:
+        asset_id (int): The ID of the asset.
+        db (Session): Database session object.
+
+    Returns:
+        Asset | None: The asset if no picture references it any more, otherwise None.
+    """
+    asset = _lock_asset(db, Asset.id == asset_id)
+    if asset is None:
+        return None
+    asset.ref_count = max(asset.ref_count - 1, 0)
+    db.flush()
+    return asset if asset.ref_count == 0 else None
+
+
+async def delete_unreferenced_asset(asset_id: int, db: Session) -> Optional[Asset]:
+    """
+    Deletes an asset row if no picture references it, without committing.
+
+    The row stays locked until the caller commits, so an upload of the same content waits and then
+    records its own files instead of reusing an asset whose files are being deleted.
+
+    Parameters:
+        asset_id (int): The ID of the asset.
+        db (Session): Database session object.
+
+    Returns:
+        Asset | None: The deleted asset, or None if it is still referenced or does not exist.
+    """
+    asset = _lock_asset(db, Asset.id == asset_id)
+    if asset is None or asset.ref_count > 0:
+        return None
+    db.delete(asset)
+    db.flush()
+    return asset
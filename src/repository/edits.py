@@ -0,0 +1,126 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.database.models import CachedEdit, Picture
+
+
+def canonical_transformation(transformation: list[dict]) -> tuple[list[dict], str]:
+    """
+    Normalizes a transformation and computes its cache key.
+
+    Numeric parameters are rewritten in their shortest form (``"010"`` and ``"10"`` are the same
+    edit); the order of the effects is kept because it changes the result.
+
+    Parameters:
+        transformation (list[dict]): The effects, as built by ``parse_transform_effects``.
+
+    Returns:
+        tuple[list[dict], str]: The canonical transformation and the hex SHA-256 of its JSON form.
+    """
+    canonical = []
+    for effect in transformation:
+        name, *params = effect["effect"].split(":")
+        params = [str(int(param)) if param.lstrip("-").isdigit() else param for param in params]
+        canonical.append({"effect": ":".join([name, *params])})
+    key = hashlib.sha256(json.dumps(canonical, separators=(",", ":")).encode()).hexdigest()
+    return canonical, key
+
+
+async def get_cached_edit(public_id: str, version, key: str, db: Session) -> Optional[CachedEdit]:
+    """
+    Looks up the stored result of an edit and records the hit, without committing.
+
+    Parameters:
+        public_id (str): Public id of the source picture file.
+        version: Version of the source picture file.
+        key (str): Key of the canonical transformation.
+        db (Session): Database session object.
+
+    Returns:
+        CachedEdit | None: The cached edit, or None on a miss.
+    """
+    cached = db.execute(select(CachedEdit).where(CachedEdit.source_public_id == public_id,
+                                                 CachedEdit.source_version == str(version),
+                                                 CachedEdit.transformation_key == key)).scalar()
+    if cached is not None:
+        cached.hits += 1
+        cached.last_used_at = datetime.now()
+        db.flush()
+    return cached
+
+
+async def store_cached_edit(public_id: str, version, key: str, transformation: list[dict], picture_edited: dict,
+                            picture_edited_url: str, qr: Optional[str], render_ms: float, db: Session) -> bool:
+    """
+    Records the result of an edit, without committing. A concurrent identical edit may have
+    recorded it first, in which case nothing is added.
+
+    Parameters:
+        public_id (str): Public id of the source picture file.
+        version: Version of the source picture file.
+        key (str): Key of the canonical transformation.
+        transformation (list[dict]): The canonical transformation.
+        picture_edited (dict): Storage response of the edited file.
+        picture_edited_url (str): URL of the edited file.
+        qr (str | None): URL of the QR code of the edited file.
+        render_ms (float): Time the edit took.
+        db (Session): Database session object.
+
+    Returns:
+        bool: Whether a new entry was added.
+    """
+    try:
+        with db.begin_nested():
+            db.add(CachedEdit(source_public_id=public_id, source_version=str(version), transformation_key=key,
+                              transformation=transformation, picture_edited_json=picture_edited,
+                              picture_edited_url=picture_edited_url, qr_code_picture_edited=qr, render_ms=render_ms))
+    except IntegrityError:
+        return False
+    return True
+
+
+async def pop_source_edits(public_id: str, db: Session) -> list[CachedEdit]:
+    """
+    Deletes the cached edits of a source picture file, without committing.
+
+    Parameters:
+        public_id (str): Public id of the source picture file.
+        db (Session): Database session object.
+
+    Returns:
+        list[CachedEdit]: The deleted entries, whose files the caller deletes.
+    """
+    return list(db.execute(delete(CachedEdit).where(CachedEdit.source_public_id == public_id)
+                           .returning(CachedEdit)).scalars())
+
+
+async def pop_least_recently_used(max_entries: int, db: Session) -> list[CachedEdit]:
+    """
+    Deletes the least recently used cached edits beyond ``max_entries``, without committing.
+
+    Entries whose file is the current edited version of a picture are kept, so evicting never
+    breaks a picture's ``picture_edited_url`` (looked up through its index).
+
+    Parameters:
+        max_entries (int): The number of entries to keep.
+        db (Session): Database session object.
+
+    Returns:
+        list[CachedEdit]: The deleted entries, whose files the caller deletes.
+    """
+    excess = db.execute(select(func.count(CachedEdit.id))).scalar() - max_entries
+    if excess <= 0:
+        return []
+    in_use = select(Picture.id).where(Picture.picture_edited_url == CachedEdit.picture_edited_url).exists()
+    evicted = list(db.execute(select(CachedEdit).where(~in_use)
+                              .order_by(CachedEdit.last_used_at).limit(excess)).scalars())
+    for cached in evicted:
+        db.delete(cached)
+    db.flush()
+    return evicted
@@ -0,0 +1,82 @@
+from collections import defaultdict
+from typing import Iterator, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.database.models import Comment, Message, Picture, PictureTagsAssociation, Rating, Reaction, Tag, User
+
+USER_COLUMNS = (User.id, User.username, User.email, User.created_at, User.avatar, User.confirmed, User.admin,
+                User.moderator, User.ban_status, User.qr_code)
+PICTURE_COLUMNS = (Picture.id, Picture.user_id, Picture.picture_url, Picture.picture_edited_url,
+                   Picture.qr_code_picture, Picture.qr_code_picture_edited, Picture.description, Picture.created_at,
+                   Picture.rating_count, Picture.rating_sum, Picture.width, Picture.height, Picture.taken_at,
+                   Picture.camera_make, Picture.camera_model, Picture.lens_model, Picture.orientation,
+                   Picture.gps_latitude, Picture.gps_longitude)
+COMMENT_COLUMNS = (Comment.id, Comment.user_id, Comment.picture_id, Comment.content, Comment.created_at,
+                   Comment.updated_at)
+RATING_COLUMNS = (Rating.id, Rating.user_id, Rating.picture_id, Rating.rat)
+REACTION_COLUMNS = (Reaction.id, Reaction.comment_id, Reaction.data)
+MESSAGE_COLUMNS = (Message.id, Message.sender_id, Message.receiver_id, Message.content, Message.timestamp)
+
+
+def _stream(db: Session, statement, chunk_size: int) -> Iterator[list]:
+    """
+    Run a SELECT with a server-side cursor and yield its rows ``chunk_size`` at a time.
+    """
+    yield from db.execute(statement.execution_options(yield_per=chunk_size)).partitions()
+
+
+def _records(db: Session, statement, chunk_size: int) -> Iterator[dict]:
+    for rows in _stream(db, statement, chunk_size):
+        for row in rows:
+            yield row._asdict()
+
+
+def _pictures(db: Session, statement, chunk_size: int) -> Iterator[dict]:
+    for rows in _stream(db, statement, chunk_size):
+        tags = defaultdict(list)
+        for picture_id, name in db.execute(
+                select(PictureTagsAssociation.picture_id, Tag.name).join(Tag)
+                .where(PictureTagsAssociation.picture_id.in_([row.id for row in rows])).order_by(Tag.name)):
+            tags[picture_id].append(name)
+        for row in rows:
+            yield {**row._asdict(), "tags": tags[row.id]}
+
+
+def export_records(db: Session, user_id: Optional[int] = None, chunk_size: int = 1000) -> Iterator[tuple[str, dict]]:
+    """
+    Stream the data of a user, or of every user, as ``(section, record)`` pairs.
+
+    The sections come one after the other: ``users`` (without passwords and tokens), ``pictures``
+    (with their tag names), ``comments``, ``ratings``, ``reactions`` (those on the comments) and
+    ``messages`` (sent or received). Every query is read through a server-side cursor
+    ``chunk_size`` rows at a time and the tags are loaded per chunk of pictures, so memory does not
+    grow with the number of rows. Unlike the other repository functions this is a plain generator:
+    it is consumed by a streaming response, from a worker thread.
+
+    Parameters:
+    - db (Session): The SQLAlchemy session used to interact with the database.
+    - user_id (int, optional): The user whose data is exported; every user's if None.
+    - chunk_size (int): Rows fetched per round-trip.
+
+    Returns:
+    - Iterator[tuple[str, dict]]: The section name and column values of each exported row.
+    """
+    def where(statement, *criteria):
+        return statement.where(*criteria) if user_id is not None else statement
+
+    sections = (
+        ("users", _records, where(select(*USER_COLUMNS), User.id == user_id).order_by(User.id)),
+        ("pictures", _pictures, where(select(*PICTURE_COLUMNS), Picture.user_id == user_id).order_by(Picture.id)),
+        ("comments", _records, where(select(*COMMENT_COLUMNS), Comment.user_id == user_id).order_by(Comment.id)),
+        ("ratings", _records, where(select(*RATING_COLUMNS), Rating.user_id == user_id).order_by(Rating.id)),
+        ("reactions", _records, where(select(*REACTION_COLUMNS).join(Comment), Comment.user_id == user_id)
+         .order_by(Reaction.id)),
+        ("messages", _records, where(select(*MESSAGE_COLUMNS),
+                                     (Message.sender_id == user_id) | (Message.receiver_id == user_id))
+         .order_by(Message.id)),
+    )
+    for section, records, statement in sections:
+        for record in records(db, statement, chunk_size):
+            yield section, record
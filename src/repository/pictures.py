@@ -1,10 +1,16 @@
 from typing import Type
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from src.database.models import Picture, User
+from sqlalchemy.orm.attributes import set_committed_value
+from src.database.models import Asset, Picture, User
+from src.repository.assets import release_asset
+from src.services.phash import hamming, similarity_index, to_unsigned
 from fastapi import HTTPException
 
 
-async def upload_picture(picture_url: str, picture_json: dict, user: User, qr: str, db: Session) -> Picture:
+async def upload_picture(picture_url: str, picture_json: dict, user: User, qr: str, db: Session,
+                         asset_id: int | None = None, phash: int | None = None,
+                         derivatives: dict | None = None) -> Picture:
 
     """
     Asynchronously uploads a picture to the database.
@@ -21,18 +27,45 @@ async def upload_picture(picture_url: str, picture_json: dict, user: User, qr: s
     - user (User): The user object associated with the picture.
     - qr (str): The URL for the QR code of the original picture.
     - db (Session): The SQLAlchemy session used to interact with the database.
+    - asset_id (int, optional): The ID of the stored asset the picture uses; its reference is
+      committed together with the picture.
+    - phash (int, optional): The perceptual hash of the picture, as stored in the database.
+    - derivatives (dict, optional): The URLs of the resized copies of the picture.
 
     Returns:
     - Picture: The newly uploaded Picture object.
     """
     
-    picture = Picture(picture_url=picture_url, picture_json=picture_json, user_id=user.id, qr_code_picture=qr)
+    picture = Picture(picture_url=picture_url, picture_json=picture_json, user_id=user.id, qr_code_picture=qr,
+                      asset_id=asset_id, phash=phash, derivatives=derivatives)
     db.add(picture)
     db.commit()
     db.refresh(picture)
     return picture
 
 
+async def insert_pictures(rows: list[dict], db: Session) -> list[Picture]:
+    """
+    Inserts many pictures with one statement, without committing.
+
+    The new pictures are returned with their IDs and, since they cannot have tags yet, with an empty
+    ``tags`` collection that does not need to be loaded.
+
+    Parameters:
+    - rows (list[dict]): The column values of each picture.
+    - db (Session): The SQLAlchemy session used to interact with the database.
+
+    Returns:
+    - list[Picture]: The inserted pictures, in the order of ``rows``.
+    """
+    if not rows:
+        return []
+    pictures = list(db.scalars(insert(Picture).returning(Picture, sort_by_parameter_order=True), rows))
+    for picture in pictures:
+        set_committed_value(picture, 'tags', [])
+    return pictures
+
+
 async def get_all_pictures(skip: int, limit: int, db: Session) -> list[Type[Picture]]:
     """
     Asynchronously retrieves all pictures from the database.
@@ -69,18 +102,57 @@ async def get_one_picture(picture_id: int, db: Session) -> Picture:
     return db.query(Picture).filter(Picture.id == picture_id).first()
 
 
-async def update_picture(picture_id: int, url: str, user: User, db: Session) -> Picture | None:
+async def get_similar_pictures(picture: Picture, max_distance: int, limit: int, db: Session) -> list[tuple[Picture, int]]:
+    """
+    Asynchronously finds the pictures that look like the given one.
+
+    Candidates come from the in-memory BK-tree of perceptual hashes (``similarity_index``), so the
+    lookup does not scan the picture table. The tree may be behind the database, so candidates are
+    loaded by id, a few more than ``limit`` at a time: deleted pictures are dropped, and the distance
+    is recomputed from each picture's current hash, so a picture whose file was replaced since the
+    tree was built is only returned if it still matches.
+
+    Parameters:
+    - picture (Picture): The picture to compare with; it must have a perceptual hash.
+    - max_distance (int): The maximum Hamming distance between the hashes.
+    - limit (int): The maximum number of pictures to return.
+    - db (Session): The SQLAlchemy session used to interact with the database.
+
+    Returns:
+    - list[tuple[Picture, int]]: The similar pictures with their distance, nearest first.
+    """
+
+    value = to_unsigned(picture.phash)
+    candidates = [picture_id for _, picture_id in similarity_index.search(value, max_distance, db)
+                  if picture_id != picture.id]
+    batch_size = max(limit, 1) * 2
+    found = []
+    for start in range(0, len(candidates), batch_size):
+        for candidate in db.query(Picture).filter(Picture.id.in_(candidates[start:start + batch_size])):
+            distance = hamming(value, to_unsigned(candidate.phash)) if candidate.phash is not None else None
+            if distance is not None and distance <= max_distance:
+                found.append((distance, candidate.id, candidate))
+        if len(found) >= limit:
+            break
+    found.sort(key=lambda entry: entry[:2])
+    return [(candidate, distance) for distance, _, candidate in found[:limit]]
+
+
+async def update_picture(picture_id: int, url: str, user: User, db: Session, asset: Asset | None = None) -> Picture | None:
     """
     Asynchronously updates a picture in the database.
 
     This function updates the specified picture in the database with a new URL
-    and user ID.
+    and user ID. When the new file is given as an asset, the picture takes its file,
+    QR code, hash and derivatives, drops its reference to the previous asset in the same transaction
+    and forgets the edited version of the previous file.
 
     Parameters:
     - picture_id (int): The ID of the picture to update.
     - url (str): The new URL of the picture.
     - user (User): The user object associated with the picture.
     - db (Session): The SQLAlchemy session used to interact with the database.
+    - asset (Asset, optional): The stored asset of the new file.
 
     Returns:
     - Union[Picture, None]: The updated Picture object if successful, otherwise None.
@@ -90,6 +162,15 @@ async def update_picture(picture_id: int, url: str, user: User, db: Session) ->
     if picture:
         picture.user_id = user.id
         picture.picture_url = url
+        if asset is not None:
+            if picture.asset_id is not None:
+                await release_asset(picture.asset_id, db)
+            picture.asset_id = asset.id
+            picture.picture_json = asset.picture_json
+            picture.qr_code_picture = asset.qr_code_picture
+            picture.phash = asset.phash
+            picture.derivatives = asset.derivatives
+            picture.picture_edited_url = picture.picture_edited_json = picture.qr_code_picture_edited = None
         db.commit()
         db.refresh(picture)
     return picture
@@ -99,7 +180,9 @@ async def delete_picture(picture_id: int, db: Session) -> Picture | None:
     """
     Asynchronously deletes a picture from the database.
 
-    This function deletes the specified picture from the database.
+    This function deletes the specified picture from the database and, in the same transaction,
+    drops its reference to the stored asset. Deleting the asset's files once it is unreferenced is
+    left to ``src.services.assets.purge_asset``.
 
     Parameters:
     - picture_id (int): The ID of the picture to delete.
@@ -111,6 +194,8 @@ async def delete_picture(picture_id: int, db: Session) -> Picture | None:
 
     picture = db.query(Picture).filter(Picture.id == picture_id).first()
     if picture:
+        if picture.asset_id is not None:
+            await release_asset(picture.asset_id, db)
         db.delete(picture)
         db.commit()
     return picture
@@ -144,6 +229,26 @@ async def upload_edited_picture(picture: dict, picture_edited: dict, picture_edi
         "qr_code_picture_edited": qr
     }
 
+async def set_picture_derivatives(picture: Picture, derivatives: dict, db: Session) -> None:
+    """
+    Stores the URLs of the resized copies of a picture.
+
+    The copies belong to the picture's file, so they are also recorded on its asset and on the
+    other pictures using the same asset.
+
+    Parameters:
+    - picture (Picture): The picture whose derivatives were generated.
+    - derivatives (dict): The URLs of the resized copies, by format and width.
+    - db (Session): The SQLAlchemy session used to interact with the database.
+    """
+    picture.derivatives = derivatives
+    if picture.asset_id is not None:
+        db.query(Asset).filter(Asset.id == picture.asset_id).update({Asset.derivatives: derivatives})
+        db.query(Picture).filter(Picture.asset_id == picture.asset_id) \
+            .update({Picture.derivatives: derivatives}, synchronize_session=False)
+    db.commit()
+
+
 async def validate_edit_parameters(picture_edit):
     """
     Validate the parameters provided for editing a picture.
@@ -1,13 +1,73 @@
-from sqlalchemy import and_
+from fastapi import HTTPException
+from sqlalchemy import and_, exists, func, literal, select, text, update
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import Session
 
-from src.database.models import Rating, User
+from src.database.models import Picture, Rating, User
+
+# Upserts a rating and applies the difference to the picture's counters in one statement. The
+# previous rating is read with FOR UPDATE, which returns the latest committed version, and the
+# counters are changed relative to the picture row, which Postgres re-reads after waiting for its
+# lock, so concurrent raters of a picture need no other lock. When another transaction inserts the
+# same user's first rating concurrently, the insert does nothing and no picture row is returned.
+_POSTGRES_UPSERT_RATING = text("""
+WITH previous AS (
+    SELECT id, rat FROM rating WHERE picture_id = :picture_id AND user_id = :user_id FOR UPDATE
+), updated AS (
+    UPDATE rating SET rat = :rat FROM previous WHERE rating.id = previous.id RETURNING previous.rat AS previous
+), inserted AS (
+    INSERT INTO rating (picture_id, user_id, rat)
+    SELECT :picture_id, :user_id, :rat
+    WHERE NOT EXISTS (SELECT 1 FROM previous) AND EXISTS (SELECT 1 FROM picture WHERE id = :picture_id)
+    ON CONFLICT (picture_id, user_id) DO NOTHING
+    RETURNING rat
+)
+UPDATE picture
+SET rating_count = rating_count + (SELECT count(*) FROM inserted)
+                   + (SELECT count(*) FROM updated WHERE previous IS NULL),
+    rating_sum = rating_sum + :rat - coalesce((SELECT previous FROM updated), 0)
+WHERE id = :picture_id AND (EXISTS (SELECT 1 FROM inserted) OR EXISTS (SELECT 1 FROM updated))
+RETURNING id
+""")
+
+
+def refresh_rating_aggregates(picture_id: int, db: Session):
+    """
+    Recomputes the rating counters stored on a picture from its ratings.
+
+    Must run in the same transaction as the change to the picture's ratings, after the picture row
+    has been locked (on SQLite, after the change itself, which takes the database write lock), so
+    concurrent writers cannot interleave between the change and the recount.
+
+    Parameters:
+        picture_id (int): The ID of the picture whose counters are refreshed.
+        db (Session): Database session object.
+    """
+    ratings = select(Rating).where(Rating.picture_id == picture_id, Rating.rat.is_not(None)).subquery()
+    db.execute(update(Picture).where(Picture.id == picture_id).values(
+        rating_count=select(func.count()).select_from(ratings).scalar_subquery(),
+        rating_sum=select(func.coalesce(func.sum(ratings.c.rat), 0)).scalar_subquery(),
+    ))
+
+
+def _lock_picture(picture_id: int, db: Session):
+    """
+    Locks the picture row so rating writes for one picture are serialized (a no-op on SQLite,
+    where writers are serialized anyway). Returns the picture id, or None if the picture does not exist.
+    """
+    return db.execute(select(Picture.id).where(Picture.id == picture_id).with_for_update()).scalar()
 
 
 async def add_rating_to_picture(picture_id: int, rating: int, user: User, db: Session):
     """
     Adds or updates a rating for a picture by a specific user.
 
+    On Postgres the rating and the picture's rating counters are written by a single statement
+    (``_POSTGRES_UPSERT_RATING``), retried once if it lost a race with the same user's concurrent
+    first rating. On SQLite, whose writers are serialized by the database lock taken by the first
+    write, the rating is upserted with ``INSERT ... ON CONFLICT DO UPDATE`` on the unique
+    ``(picture_id, user_id)`` constraint and the counters are recomputed in the same transaction.
+
     Parameters:
         picture_id (int): The ID of the picture to rate.
         rating (int): The rating value.
@@ -16,13 +76,27 @@ async def add_rating_to_picture(picture_id: int, rating: int, user: User, db: Se
 
     Returns:
         dict: A message indicating that the rating was successfully created or updated.
+
+    Raises:
+        HTTPException: 404 if the picture does not exist.
     """
-    rating_record = db.query(Rating).filter(and_(Rating.picture_id == picture_id, Rating.user_id == user.id)).first()
-    if rating_record:
-        rating_record.rat = rating
+    parameters = {"picture_id": picture_id, "user_id": user.id, "rat": rating}
+    if db.get_bind().dialect.name == "postgresql":
+        found = db.execute(_POSTGRES_UPSERT_RATING, parameters).scalar() is not None
+        if not found:
+            found = db.execute(_POSTGRES_UPSERT_RATING, parameters).scalar() is not None
     else:
-        new_rating = Rating(picture_id=picture_id, rat=rating, user_id=user.id)
-        db.add(new_rating)
+        picture_exists = exists().where(Picture.id == picture_id)
+        statement = sqlite.insert(Rating).from_select(
+            ["picture_id", "user_id", "rat"],
+            select(literal(picture_id), literal(user.id), literal(rating)).where(picture_exists))
+        statement = statement.on_conflict_do_update(index_elements=[Rating.picture_id, Rating.user_id],
+                                                    set_={"rat": statement.excluded.rat})
+        found = db.execute(statement).rowcount > 0
+        if found:
+            refresh_rating_aggregates(picture_id, db)
+    if not found:
+        raise HTTPException(status_code=404, detail="Picture not found")
     db.commit()
     return {"message": "The rating was successfully created or updated."}
 
@@ -39,9 +113,12 @@ async def remove_rating_from_picture(picture_id: int, user: User, db: Session):
         Returns:
             dict: A message indicating the outcome of the operation.
         """
+    _lock_picture(picture_id, db)
     rating_record = db.query(Rating).filter(and_(Rating.picture_id == picture_id, Rating.user_id == user.id)).first()
     if rating_record:
         db.delete(rating_record)
+        db.flush()
+        refresh_rating_aggregates(picture_id, db)
         db.commit()
         return {"message": "Rating removed successfully."}
     else:
@@ -59,9 +136,12 @@ async def remove_rating_from_picture_admin(picture_id: int, user_id: int, db: Se
         Returns:
             dict: A message indicating the outcome of the operation.
         """
+    _lock_picture(picture_id, db)
     rating_record = db.query(Rating).filter(and_(Rating.picture_id == picture_id, Rating.user_id == user_id)).first()
     if rating_record:
         db.delete(rating_record)
+        db.flush()
+        refresh_rating_aggregates(picture_id, db)
         db.commit()
         return {"message": "Rating removed successfully."}
     else:
@@ -86,7 +166,7 @@ async def get_rating(picture_id: int, db: Session):
 
 async def get_average_of_rating(picture_id: int, db: Session):
     """
-    Calculates the average rating for a specific picture.
+    Calculates the average rating for a specific picture from the counters stored on the picture.
 
     Parameters:
         picture_id (int): The ID of the picture whose average rating is to be calculated.
@@ -95,9 +175,8 @@ async def get_average_of_rating(picture_id: int, db: Session):
     Returns:
         dict: A message containing the average rating if available, otherwise indicating no ratings.
     """
-    ratings = db.query(Rating).filter(Rating.picture_id == picture_id).all()
-    if ratings:
-        average = sum(rating.rat for rating in ratings) / len(ratings)
-        return {"average_rating": average}
+    counters = db.query(Picture.rating_count, Picture.rating_sum).filter(Picture.id == picture_id).first()
+    if counters and counters.rating_count:
+        return {"average_rating": counters.rating_sum / counters.rating_count}
     else:
         return {"message": "No ratings available for this picture."}
\ No newline at end of file
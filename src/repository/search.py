@@ -1,17 +1,60 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from fastapi import HTTPException, Depends
 from typing import List, Optional
-from sqlalchemy import or_
+from sqlalchemy import func, or_, select
 
 from src.database.models import Picture, Tag, PictureTagsAssociation
 from src.database.db import get_db
-from src.schemas import PictureResponse
+from src.services.exif import METADATA_FIELDS
+from src.schemas import PictureMetadataFilter, PictureResponse, TagModel
+
+
+def metadata_conditions(filters: PictureMetadataFilter) -> list:
+    """
+    Translate metadata filters into conditions on the indexed metadata columns of ``Picture``.
+
+    Camera and lens prefixes are compared with ``lower(column) LIKE 'prefix%'``, which the indexes
+    on the lowercased columns serve.
+
+    Parameters:
+    - `filters` (PictureMetadataFilter): The filters; unset ones add no condition.
+
+    Returns:
+    - list: SQLAlchemy conditions to combine with AND.
+    """
+    conditions = []
+    if filters.taken_after is not None:
+        conditions.append(Picture.taken_at >= filters.taken_after)
+    if filters.taken_before is not None:
+        conditions.append(Picture.taken_at < filters.taken_before)
+    if filters.camera:
+        camera = filters.camera.lower()
+        conditions.append(or_(func.lower(Picture.camera_make).startswith(camera, autoescape=True),
+                              func.lower(Picture.camera_model).startswith(camera, autoescape=True)))
+    if filters.lens:
+        conditions.append(func.lower(Picture.lens_model).startswith(filters.lens.lower(), autoescape=True))
+    if filters.min_width is not None:
+        conditions.append(Picture.width >= filters.min_width)
+    if filters.min_height is not None:
+        conditions.append(Picture.height >= filters.min_height)
+    if filters.orientation is not None:
+        conditions.append(Picture.orientation == filters.orientation)
+    if filters.has_gps is not None:
+        conditions.append(Picture.gps_latitude.is_not(None) if filters.has_gps else Picture.gps_latitude.is_(None))
+    if filters.bbox is not None:
+        south, west, north, east = filters.bbox
+        conditions.append(Picture.gps_latitude.between(south, north))
+        conditions.append(Picture.gps_longitude.between(west, east))
+    return conditions
 
 
 async def search_pictures(keyword: Optional[str] = None,
                           sort_by: Optional[str] = "created_at",
                           sort_order: Optional[str] = "desc",
-                          db: Session = Depends(get_db)
+                          db: Session = Depends(get_db),
+                          filters: Optional[PictureMetadataFilter] = None,
+                          skip: int = 0,
+                          limit: int = 20
                           ) -> List[PictureResponse]:
     """
     Searches for pictures based on keywords, sort criteria, and order. It allows for filtering pictures
@@ -26,19 +69,23 @@ async def search_pictures(keyword: Optional[str] = None,
     - `sort_order` (Optional[str]): The order in which the results should be sorted. Defaults to "desc" (descending).
                                     Allowed values are "asc" (ascending) and "desc" (descending).
     - `db` (Session): The database session.
+    - `filters` (Optional[PictureMetadataFilter]): Filters on the extracted image metadata (capture time,
+                                                  camera, lens, size, orientation, GPS position).
+    - `skip` (int): The number of matching pictures to skip.
+    - `limit` (int): The maximum number of pictures to return.
 
     Returns:
-    - List[PictureResponse]: A list of `PictureResponse` objects, each representing a picture that matches the search criteria.
+    - List[PictureResponse]: A page of `PictureResponse` objects, each representing a picture that matches the search criteria.
                              Each `PictureResponse` includes picture ID, description, picture URL, average rating, creation date,
-                             user ID, associated tags IDs, and a QR code picture URL.
+                             user ID, associated tags, and a QR code picture URL.
 
     Raises:
     - HTTPException: If no pictures are found that match the search criteria, a 404 error is raised with the detail "Picture not found".
 
-    The function first filters tags by the keyword and then finds pictures associated with these tags. It also searches
-    within picture descriptions for the keyword. The resulting list of pictures is then sorted based on the specified
-    `sort_by` and `sort_order` parameters. If no keyword is provided, all pictures are considered in the search. The
-    function ensures that the sorting parameters are valid and defaults them if necessary.
+    The function matches the keyword against the tag names and the picture descriptions in one query, sorted by the
+    database according to `sort_by` and `sort_order` (pictures without a rating sort as 0, ties by ID) and cut to the
+    requested page; the tags of the page are loaded in one more query. If no keyword is provided, all pictures are
+    considered in the search. The function ensures that the sorting parameters are valid and defaults them if necessary.
     """
 
     if sort_by not in ["rating", "created_at"]:
@@ -47,26 +94,32 @@ async def search_pictures(keyword: Optional[str] = None,
     if sort_order not in ["asc", "desc"]:
         sort_order = "desc"
 
-    tags_ids = [tag.id for tag in db.query(Tag).filter(Tag.name.like(f"%{keyword}%")).all()]
-
-    pictures_ids = [pic_id for (pic_id,) in db.query(PictureTagsAssociation.picture_id).filter(
-        PictureTagsAssociation.tag_id.in_(tags_ids)).all()]
-
-    pictures = db.query(Picture).filter(
-        or_(
-            Picture.description.like(f"%{keyword}%"),
-            Picture.id.in_(pictures_ids)
+    query = db.query(Picture).options(selectinload(Picture.tags))
+    if keyword is not None:
+        tagged = (select(PictureTagsAssociation.picture_id)
+                  .join(Tag, Tag.id == PictureTagsAssociation.tag_id)
+                  .where(Tag.name.like(f"%{keyword}%")))
+        query = query.filter(
+            or_(
+                Picture.description.like(f"%{keyword}%"),
+                Picture.id.in_(tagged)
+            )
         )
-    ).all()
+    if filters is not None:
+        query = query.filter(*metadata_conditions(filters))
+
+    sort_key = func.coalesce(Picture.average_rating, 0) if sort_by == "rating" else Picture.created_at
+    if sort_order == "desc":
+        query = query.order_by(sort_key.desc(), Picture.id.desc())
+    else:
+        query = query.order_by(sort_key.asc(), Picture.id.asc())
+    pictures = query.offset(skip).limit(limit).all()
 
     if not pictures:
         raise HTTPException(status_code=404, detail="Picture not found")
 
-    pictures = sorted(pictures, key=lambda x: getattr(x, sort_by), reverse=(sort_order == "desc"))
-
     picture_responses = []
     for picture in pictures:
-        tag_ids = [tag.id for tag in picture.tags]
         picture_response = PictureResponse(
             id=picture.id,
             description=picture.description,
@@ -74,8 +127,12 @@ async def search_pictures(keyword: Optional[str] = None,
             average_rating=picture.average_rating,
             created_at=picture.created_at,
             user_id=picture.user_id,
-            tags=tag_ids,
-            qr_code_picture=picture.qr_code_picture
+            tags=[TagModel(id=tag.id, name=tag.name) for tag in picture.tags],
+            qr_code_picture=picture.qr_code_picture,
+            derivatives=picture.derivatives,
+            srcset=picture.srcset,
+            srcset_webp=picture.srcset_webp,
+            **{field: getattr(picture, field) for field in METADATA_FIELDS}
         )
         picture_responses.append(picture_response)
 
@@ -1,4 +1,5 @@
 from typing import List
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
 from src.database.models import Tag, PictureTagsAssociation
 from src.schemas import TagModel, TagsResponseModel
@@ -65,3 +66,37 @@ async def add_tags_to_db(picture_id: int, tags: List[str], db: Session) -> TagsR
 
     return TagsResponseModel(new_tags=[TagModel(id=tag.id, name=tag.name) for tag in new_tags],
                              existing_tags=[TagModel(id=tag.id, name=tag.name) for tag in existing_tags])
+
+
+async def get_or_create_tags(names: List[str], db: Session) -> dict[str, int]:
+    """
+    Return the IDs of tags by name, inserting the missing ones in one statement, without committing.
+
+    Parameters:
+    - names (List[str]): The tag names.
+    - db (Session): The SQLAlchemy session used to interact with the database.
+
+    Returns:
+    - dict[str, int]: The ID of each tag name.
+    """
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+    tag_ids = dict(db.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names))).all())
+    missing = [{"name": name} for name in names if name not in tag_ids]
+    if missing:
+        tag_ids.update(db.execute(insert(Tag).returning(Tag.name, Tag.id), missing).all())
+    return tag_ids
+
+
+async def add_picture_tags(associations: List[tuple[int, int]], db: Session) -> None:
+    """
+    Tag many new pictures with one statement, without committing.
+
+    Parameters:
+    - associations (List[tuple[int, int]]): ``(picture_id, tag_id)`` pairs; the pictures must not have these tags yet.
+    - db (Session): The SQLAlchemy session used to interact with the database.
+    """
+    if associations:
+        db.execute(insert(PictureTagsAssociation),
+                   [{"picture_id": picture_id, "tag_id": tag_id} for picture_id, tag_id in associations])
@@ -1,9 +1,10 @@
-from typing import Type, List
+from typing import Iterator, Type, List, Optional
 from fastapi import HTTPException
+from sqlalchemy import and_, func, select
 from sqlalchemy.orm import Session
 
-from src.database.models import User
-from src.schemas import UserModel, UserDb
+from src.database.models import Comment, Picture, User
+from src.schemas import UserModel, UserDb, UserFilter, UserRole
 from src.services.auth import auth_service
 
 
@@ -66,22 +67,108 @@ async def get_user_by_id(user_id: int,
     return UserDb.from_orm(user)
 
 
-async def list_all_users(db: Session) -> List[User]:
+USER_LISTING_COLUMNS = (User.id, User.username, User.email, User.created_at, User.avatar, User.confirmed,
+                        User.ban_status, User.admin, User.moderator)
+ROLE_CONDITIONS = {
+    UserRole.admin: User.admin.is_(True),
+    UserRole.moderator: and_(User.admin.isnot(True), User.moderator.is_(True)),
+    UserRole.user: and_(User.admin.isnot(True), User.moderator.isnot(True)),
+}
+
+
+def _flag(column, value: Optional[bool]):
+    return column.is_(True) if value else column.isnot(True)
+
+
+def user_conditions(filters: Optional[UserFilter]) -> list:
+    """
+    Translate the filters of the admin user listing into WHERE conditions.
+
+    Args:
+        filters (UserFilter, optional): The filters; None selects every user.
+
+    Returns:
+        list: SQLAlchemy conditions to combine with AND.
     """
-    Asynchronously retrieves a list of all users from the database.
+    if filters is None:
+        return []
+    conditions = []
+    if filters.banned is not None:
+        conditions.append(_flag(User.ban_status, filters.banned))
+    if filters.confirmed is not None:
+        conditions.append(_flag(User.confirmed, filters.confirmed))
+    if filters.role is not None:
+        conditions.append(ROLE_CONDITIONS[filters.role])
+    return conditions
+
+
+def _listing_row(row) -> dict:
+    values = row._asdict()
+    admin, moderator = values.pop("admin"), values.pop("moderator")
+    values["role"] = (UserRole.admin if admin else UserRole.moderator if moderator else UserRole.user).value
+    values["confirmed"], values["ban_status"] = bool(values["confirmed"]), bool(values["ban_status"])
+    return values
+
+
+async def list_all_users(db: Session, limit: int = 100, after: Optional[int] = None,
+                         filters: Optional[UserFilter] = None) -> List[dict]:
+    """
+    Asynchronously retrieves one page of users, with their role and picture and comment counts.
 
-    This function queries the database for all users and returns a list of SQLAlchemy `User` model
-    instances representing all users in the database.
+    Users are ordered by ID and paginated with a keyset cursor: the next page starts after the ID
+    of the last user of this one, so every page costs the same however deep it is. The counts are
+    correlated subqueries served by the ``user_id`` indexes, evaluated for the users of the page only.
 
     Args:
         db (Session): The database session used to execute the query.
+        limit (int): The maximum number of users to return.
+        after (int, optional): Return the users whose ID is greater than this cursor.
+        filters (UserFilter, optional): Banned, confirmed and role filters.
 
     Returns:
-        List[User]: A list of all user instances in the database.
+        List[dict]: The users of the page, as the fields of ``UserAdminDb``.
+    """
+    picture_count = (select(func.count(Picture.id)).where(Picture.user_id == User.id)
+                     .correlate(User).scalar_subquery())
+    comment_count = (select(func.count(Comment.id)).where(Comment.user_id == User.id)
+                     .correlate(User).scalar_subquery())
+    conditions = user_conditions(filters)
+    if after is not None:
+        conditions.append(User.id > after)
+    rows = db.execute(select(*USER_LISTING_COLUMNS, picture_count.label("picture_count"),
+                             comment_count.label("comment_count"))
+                      .where(*conditions).order_by(User.id).limit(limit))
+    return [_listing_row(row) for row in rows]
+
+
+def iter_users(db: Session, filters: Optional[UserFilter] = None, chunk_size: int = 1000) -> Iterator[dict]:
+    """
+    Stream every user matching the filters, with their role and counts, for the CSV export.
 
+    The counts are grouped once per table and outer-joined, which over the whole table is cheaper
+    than one subquery per user, and the rows are read through a server-side cursor ``chunk_size``
+    at a time. This is a plain generator, consumed by a streaming response from a worker thread.
+
+    Args:
+        db (Session): The database session used to execute the query.
+        filters (UserFilter, optional): Banned, confirmed and role filters.
+        chunk_size (int): Rows fetched per round-trip.
+
+    Returns:
+        Iterator[dict]: The users ordered by ID, as the fields of ``UserAdminDb``.
     """
-    users = db.query(User).all()
-    return users
+    pictures = (select(Picture.user_id, func.count(Picture.id).label("count"))
+                .group_by(Picture.user_id).subquery())
+    comments = (select(Comment.user_id, func.count(Comment.id).label("count"))
+                .group_by(Comment.user_id).subquery())
+    statement = (select(*USER_LISTING_COLUMNS, func.coalesce(pictures.c.count, 0).label("picture_count"),
+                        func.coalesce(comments.c.count, 0).label("comment_count"))
+                 .outerjoin(pictures, pictures.c.user_id == User.id)
+                 .outerjoin(comments, comments.c.user_id == User.id)
+                 .where(*user_conditions(filters)).order_by(User.id)
+                 .execution_options(yield_per=chunk_size))
+    for row in db.execute(statement):
+        yield _listing_row(row)
 
 
 async def update_user_name(user_id: int,
@@ -209,7 +296,7 @@ async def get_user_by_username(username: str, db: Session):
 
     This function queries the database for a user with the specified `username`. If the user exists,
     it returns a Pydantic model (`UserDb`) representation of the user. If the user does not exist,
-    it raises an HTTPException with a 400 status code.
+    it raises an HTTPException with a 404 status code.
 
     Args:
         username (str): The unique username of the user to retrieve.
@@ -219,8 +306,7 @@ async def get_user_by_username(username: str, db: Session):
         UserDb: A Pydantic model representing the retrieved user's data.
 
     Raises:
-+        HTTPException: A 404 error if the user with the specified username does not exist.
--        HTTPException: A 400 error if the user with the specified username does not exist.
+        HTTPException: A 404 error if the user with the specified username does not exist.
     """
     user = db.query(User).filter(User.username == username).first()
     if not user:
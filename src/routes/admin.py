@@ -0,0 +1,120 @@
+import os
+import re
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from starlette.responses import FileResponse
+
+from src.conf.config import settings
+from src.database.db import get_db
+from src.database.models import CachedEdit
+from src.services.auth import auth_service
+from src.services.export import ExportFormat, export_response
+from src.services.metrics import metrics
+from src.services.slow_query import slow_query_log
+
+router = APIRouter(prefix="/admin",
+                   tags=["admin"],
+                   dependencies=[Depends(auth_service.require_role(required_role="admin"))])
+
+
+@router.get("/slow-queries")
+async def read_slow_queries(limit: Optional[int] = 100):
+    """
+    Return the statements recorded by the slow-query log, slowest first.
+
+    Each record contains the normalized SQL, the shape of its bind parameters, the route and
+    repository function that issued it and, for sampled Postgres statements, the plan
+    (``EXPLAIN (ANALYZE, BUFFERS)`` for SELECTs, ``EXPLAIN`` for writes).
+
+    Parameters:
+    - `limit` (Optional[int]): Maximum number of records to return.
+
+    Returns:
+    - A dictionary with the active threshold and the list of slow-query records.
+    """
+    return {"threshold_ms": slow_query_log.threshold_ms, "queries": slow_query_log.entries(limit)}
+
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_slow_queries():
+    """
+    Empty the slow-query ring buffer.
+    """
+    slow_query_log.clear()
+
+
+@router.get("/profiles")
+async def list_profiles():
+    """
+    List the request profiles captured by the on-demand profiler, newest first.
+
+    Returns:
+    - A list of profile ids that can be passed to `/admin/profiles/{profile_id}`.
+    """
+    if not os.path.isdir(settings.profiling_output_dir):
+        return []
+    names = [name[:-len(".html")] for name in os.listdir(settings.profiling_output_dir) if name.endswith(".html")]
+    return sorted(names, reverse=True)
+
+
+@router.get("/profiles/{profile_id}")
+async def read_profile(profile_id: str):
+    """
+    Return a captured request profile as an interactive HTML flame graph.
+
+    Parameters:
+    - `profile_id` (str): The id sent in the `X-Profile-Id` response header of the profiled request.
+    """
+    path = os.path.join(settings.profiling_output_dir, f"{profile_id}.html")
+    if not re.fullmatch(r"[\w.-]+", profile_id) or not os.path.isfile(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return FileResponse(path, media_type="text/html")
+
+
+@router.get("/metrics")
+async def read_metrics():
+    """
+    Return the counters and gauges of the worker process that answers, with derived ratios.
+
+    Returns:
+    - A dictionary with `counters`, `gauges` and `ratios` (e.g. `edit_cache.hit_ratio`, null before any event).
+    """
+    snapshot = metrics.snapshot()
+    snapshot["ratios"] = {"edit_cache.hit_ratio": metrics.ratio("edit_cache.hits", "edit_cache.misses")}
+    return snapshot
+
+
+@router.get("/edit-cache")
+async def read_edit_cache(db: Session = Depends(get_db)):
+    """
+    Summarize the cache of picture edits across all workers.
+
+    Returns:
+    - A dictionary with the number of stored edits, the hits they answered and the rendering and
+      upload time those hits saved, in seconds.
+    """
+    entries, hits, saved_ms = db.query(func.count(CachedEdit.id), func.coalesce(func.sum(CachedEdit.hits), 0),
+                                       func.coalesce(func.sum(CachedEdit.hits * CachedEdit.render_ms), 0)).one()
+    return {"entries": entries, "hits": hits, "saved_seconds": round(saved_ms / 1000, 3),
+            "max_entries": settings.edit_cache_max_entries}
+
+
+@router.get("/export", response_class=StreamingResponse,
+            responses={200: {"content": {"application/x-ndjson": {}, "application/x-tar": {}}}})
+async def export_data(export_format: ExportFormat = Query("tar", alias="format"), user_id: Optional[int] = None,
+                      db: Session = Depends(get_db)):
+    """
+    Stream a backup of the data of every user, or of one user.
+
+    Same content and formats as `/api/users/me/export`, for all users at once: users, pictures,
+    comments, ratings, reactions and messages, each table read in chunks while it is sent.
+
+    Parameters:
+    - `format` (str): `tar` (default, one NDJSON file per table) or `ndjson`.
+    - `user_id` (Optional[int]): Export only this user.
+    """
+    return export_response(db, user_id, export_format, f"photoshare-{user_id}" if user_id else "photoshare-backup")
@@ -4,7 +4,7 @@ from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from src.services.auth_roles import is_admin_or_moderator
-from src.database.db import get_db
+from src.database.db import get_db, get_read_db
 from src.database.models import User
 from src.schemas import CommentModel, CommentResponse
 from src.repository import comments as repository_comments
@@ -16,7 +16,7 @@ router = APIRouter(prefix="/comments", tags=["comments"])
 @router.get("/{comment_id}", response_model=CommentResponse)
 async def read_comment(
         comment_id: int,
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         current_user: User = Depends(auth_service.get_current_user)
 ):
     """
@@ -39,7 +39,7 @@ async def read_comments(
         picture_id: int,
         skip: int = 0,
         limit: int = 20,
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ):
     """
     The read_comments function will return a list of comments for the picture with the given id.
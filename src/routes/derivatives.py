@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import RedirectResponse
+from sqlalchemy.orm import Session
+
+from src.database.db import get_db
+from src.repository import pictures as repository_pictures
+from src.services.derivatives import FORMATS, WIDTHS, ensure_derivatives
+from src.services.storage import StorageBackend, get_storage
+
+router = APIRouter(prefix="/derivatives", tags=["derivatives"])
+
+
+@router.get("/{picture_id}/{width}.{image_format}", response_class=RedirectResponse)
+async def get_derivative(picture_id: int, width: int, image_format: str, db: Session = Depends(get_db),
+                         storage: StorageBackend = Depends(get_storage)):
+    """
+    Redirect to a resized copy of a picture, generating the copies on the first request.
+
+    This is where the ``srcset`` of a picture points until its derivatives are stored; afterwards
+    the ``srcset`` lists their URLs directly. A picture narrower than the requested width is served
+    at its own size.
+
+    Args:
+        picture_id (int): The ID of the picture.
+        width (int): One of the derivative widths (160, 480 or 1080).
+        image_format (str): ``webp`` or ``jpeg``.
+        db (Session): Database session object.
+        storage (StorageBackend): The storage backend of the picture.
+
+    Returns:
+        RedirectResponse: A redirect to the stored copy.
+    """
+    if width not in WIDTHS or image_format not in FORMATS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    picture = await repository_pictures.get_one_picture(picture_id, db)
+    if picture is None or not picture.picture_json:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Picture not found")
+
+    urls = (await ensure_derivatives(picture, storage, db)).get(image_format, {})
+    if not urls:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    url = urls.get(str(width)) or urls[max(urls, key=int)]
+    return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
@@ -0,0 +1,131 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from PIL import UnidentifiedImageError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+from src.conf.config import settings
+from src.database.db import get_db
+from src.repository import pictures as repository_pictures
+from src.services.resize import DiskLRUCache, cache_key, get_image_cache, parse_sizes, resize
+from src.services.storage import StorageBackend, get_storage
+
+router = APIRouter(prefix="/img", tags=["images"])
+
+MAX_DIMENSION = 4096
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=86400"
+SIZES = parse_sizes(settings.image_sizes)
+
+
+async def resized_response(request: Request, storage: StorageBackend, cache: DiskLRUCache, public_id: str,
+                           version, width: Optional[int], height: Optional[int], fit: str, image_format: str,
+                           immutable: bool) -> Response:
+    """
+    Serve a resized copy of a stored file from the disk cache, rendering it on a miss.
+
+    The strong ``ETag`` is the cache key, derived from the file's id and stored version and the
+    parameters, so a conditional request is answered with 304 without reading the cache or the
+    source. Only the sizes of ``IMAGE_SIZES`` are rendered, which bounds what a client can add to
+    the cache.
+    """
+    if width is None and height is None:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="w or h is required")
+    if any(size is not None and size not in SIZES for size in (width, height)):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"w and h must be one of {', '.join(map(str, sorted(SIZES)))}")
+    key = cache_key(public_id, version, width, height, fit, image_format)
+    headers = {"etag": f'"{key[:32]}"', "cache-control": IMMUTABLE if immutable else REVALIDATE}
+    if headers["etag"] in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    async def render() -> bytes:
+        try:
+            source = await run_in_threadpool(storage.get, public_id)
+        except (FileNotFoundError, IsADirectoryError, ValueError):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+        try:
+            return await run_in_threadpool(resize, source, width, height, fit, image_format)
+        except (UnidentifiedImageError, OSError):
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Not an image")
+
+    data = await cache.get_or_create(key, render)
+    return Response(data, media_type=f"image/{image_format}", headers=headers)
+
+
+@router.get("/files/{public_id:path}", response_class=Response)
+async def get_resized_file(public_id: str, request: Request,
+                           w: Optional[int] = Query(None, ge=1, le=MAX_DIMENSION),
+                           h: Optional[int] = Query(None, ge=1, le=MAX_DIMENSION),
+                           fit: str = Query("limit", pattern="^(limit|fill)$"),
+                           fmt: str = Query("jpeg", pattern="^(jpeg|png|webp)$"),
+                           v: Optional[str] = Query(None, max_length=32),
+                           storage: StorageBackend = Depends(get_storage),
+                           cache: DiskLRUCache = Depends(get_image_cache)):
+    """
+    Resize any stored file, e.g. an avatar; the local storage backend's transformed URLs point here.
+
+    Args:
+        public_id (str): The id of the stored file, e.g. ``avatars/abc``.
+        request (Request): The incoming request.
+        w (int, optional): Target width, one of ``IMAGE_SIZES``.
+        h (int, optional): Target height, one of ``IMAGE_SIZES``.
+        fit (str): ``limit`` (fit within w x h) or ``fill`` (crop to w x h).
+        fmt (str): Output format: ``jpeg``, ``png`` or ``webp``.
+        v (str, optional): Version of the file; when it is the current one the response is cached
+            for a year, since an overwritten file gets a new version.
+        storage (StorageBackend): The configured storage backend.
+        cache (DiskLRUCache): The cache of resized images.
+
+    Returns:
+        Response: The resized image, or 304 if the client's copy is current.
+    """
+    try:
+        version = await run_in_threadpool(storage.version, public_id)
+    except (FileNotFoundError, ValueError):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    return await resized_response(request, storage, cache, public_id, version, w, h, fit, fmt,
+                                  immutable=version is not None and v == str(version))
+
+
+@router.get("/{picture_id}", response_class=Response)
+async def get_resized_picture(picture_id: int, request: Request,
+                              w: Optional[int] = Query(None, ge=1, le=MAX_DIMENSION),
+                              h: Optional[int] = Query(None, ge=1, le=MAX_DIMENSION),
+                              fit: str = Query("limit", pattern="^(limit|fill)$"),
+                              fmt: str = Query("jpeg", pattern="^(jpeg|png|webp)$"),
+                              v: Optional[str] = Query(None, max_length=32),
+                              db: Session = Depends(get_db),
+                              storage: StorageBackend = Depends(get_storage),
+                              cache: DiskLRUCache = Depends(get_image_cache)):
+    """
+    Resize the original of a picture to a size that has no precomputed derivative.
+
+    Results are kept in a size-bounded disk cache (``IMAGE_CACHE_DIR``, ``IMAGE_CACHE_MAX_BYTES``)
+    and a burst of identical requests renders once.
+
+    Args:
+        picture_id (int): The ID of the picture.
+        request (Request): The incoming request.
+        w (int, optional): Target width, one of ``IMAGE_SIZES``.
+        h (int, optional): Target height, one of ``IMAGE_SIZES``.
+        fit (str): ``limit`` (fit within w x h) or ``fill`` (crop to w x h).
+        fmt (str): Output format: ``jpeg``, ``png`` or ``webp``.
+        v (str, optional): Version of the picture's file; when it is the current one the response
+            is cached for a year, since a replaced file gets a new version.
+        db (Session): Database session object.
+        storage (StorageBackend): The configured storage backend.
+        cache (DiskLRUCache): The cache of resized images.
+
+    Returns:
+        Response: The resized image, or 304 if the client's copy is current.
+    """
+    picture = await repository_pictures.get_one_picture(picture_id, db)
+    if picture is None or not picture.picture_json:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Picture not found")
+    source = picture.picture_json
+    version = source.get("version")
+    return await resized_response(request, storage, cache, source["public_id"], version, w, h, fit, fmt,
+                                  immutable=version is not None and v == str(version))
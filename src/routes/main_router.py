@@ -1,30 +1,40 @@
 from datetime import datetime
+from typing import Optional
+from urllib.parse import urlencode
 
-from fastapi import Request, HTTPException, APIRouter, Form, UploadFile, File
+from fastapi import Request, HTTPException, APIRouter, Form, BackgroundTasks
 from fastapi.params import Depends
 from sqlalchemy.orm import Session
 from starlette import status
 from starlette.responses import HTMLResponse, RedirectResponse, Response
 from starlette.templating import Jinja2Templates
 
-from src.database.db import get_db
+from src.database.db import get_db, get_read_db
 from src.database.models import User, Picture, Comment, Rating
+from src.services.assets import purge_asset, store_picture_asset
 from src.services.auth import auth_service
+from src.services.exif import extract_picture_metadata
+from src.services.export import csv_stream, download_response
 import src.repository.pictures as picture_repository
 import src.repository.rating as rating_repository
-from src.conf.cloudinary import configure_cloudinary, generate_random_string
-from src.services.qr import generate_qr_and_upload_to_cloudinary
-import cloudinary
-import cloudinary.uploader
+import src.repository.users as user_repository
+from src.routes.users import user_filter
+from src.schemas import UserAdminDb, UserFilter
+from src.conf.config import settings
+from src.conf.cloudinary import generate_random_string
+from src.services.storage import StorageBackend, get_storage
+from src.services.uploads import multipart_openapi, receive_upload
 from fastapi import HTTPException, status
 
 templates = Jinja2Templates(directory='templates')
 router = APIRouter()
 
+USERS_PAGE_SIZE = 50
+
 
 @router.get("/", response_class=HTMLResponse)
 async def index(request: Request,
-                db: Session = Depends(get_db),
+                db: Session = Depends(get_read_db),
                 current_user: User = Depends(auth_service.get_current_user_optional)
                 ):
 
@@ -40,6 +50,8 @@ async def index(request: Request,
 
 @router.get('/users')
 async def users(request: Request,
+                after: Optional[int] = None,
+                filters: UserFilter = Depends(user_filter),
                 db: Session = Depends(get_db),
                 current_user: User = Depends(auth_service.get_current_user_optional),
                 ):
@@ -50,13 +62,34 @@ async def users(request: Request,
     if current_user:
         user = db.query(User).filter(User.id == current_user.id).first()
         if user.admin:
-            users_details = db.query(User).all()
-            context = {'request': request, 'user': user, 'users_details': users_details}
+            users_details = await user_repository.list_all_users(db, limit=USERS_PAGE_SIZE, after=after,
+                                                                 filters=filters)
+            query = {key: str(value).lower() for key, value in filters.model_dump(mode='json', exclude_none=True).items()}
+            next_url = None
+            if len(users_details) == USERS_PAGE_SIZE:
+                next_url = '/users?' + urlencode({**query, 'after': users_details[-1]['id']})
+            context = {'request': request, 'user': user, 'users_details': users_details, 'filters': query,
+                       'next_url': next_url, 'export_url': '/users/export?' + urlencode(query)}
             return templates.TemplateResponse('users.html', context)
 
     return RedirectResponse(url='/', status_code=status.HTTP_401_UNAUTHORIZED)
 
 
+@router.get('/users/export')
+async def export_users(filters: UserFilter = Depends(user_filter),
+                       db: Session = Depends(get_db),
+                       current_user: User = Depends(auth_service.get_current_user_optional)
+                       ):
+    """
+    Download the users of the admin panel matching its filters as CSV, for the session's admin.
+    """
+    if current_user is None or not current_user.admin:
+        return RedirectResponse(url='/login', status_code=status.HTTP_401_UNAUTHORIZED)
+
+    rows = user_repository.iter_users(db, filters, settings.export_chunk_size)
+    return download_response(db, csv_stream(rows, list(UserAdminDb.model_fields)), "text/csv", "users.csv")
+
+
 @router.get("/users/{user_id}")
 async def show_user(request: Request,
                     user_id: int,
@@ -134,7 +167,10 @@ async def picture_uploader(picture_url: str,
                            picture_json: dict,
                            user: User, qr: str,
                            description: str,
-                           db: Session
+                           db: Session,
+                           asset_id: int = None,
+                           phash: int = None,
+                           derivatives: dict = None
                            ) -> Picture:
 
     picture = Picture(
@@ -143,7 +179,10 @@ async def picture_uploader(picture_url: str,
         user_id=user.id,
         qr_code_picture=qr,
         description=description,
-        created_at=datetime.now()
+        created_at=datetime.now(),
+        asset_id=asset_id,
+        phash=phash,
+        derivatives=derivatives
     )
     db.add(picture)
     db.commit()
@@ -156,33 +195,35 @@ async def authentication_page(request: Request):
     return templates.TemplateResponse('picture_upload.html', {"request": request})
 
 
-@router.post("/picture/upload", response_class=HTMLResponse)
+@router.post("/picture/upload", response_class=HTMLResponse,
+             openapi_extra=multipart_openapi("picture", "description", "metadata"))
 async def upload_picture(request: Request,
-                         picture: UploadFile = File(...),
-                         description: str = Form(...),
-                         metadata: str = Form("{}"),
-                         qr_code: UploadFile = File(None),
+                         background_tasks: BackgroundTasks,
                          current_user: User = Depends(auth_service.get_current_user_optional),
-                         db: Session = Depends(get_db)
+                         db: Session = Depends(get_db),
+                         storage: StorageBackend = Depends(get_storage)
                          ):
 
     if not current_user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication required.")
 
-    configure_cloudinary()
     picture_name = generate_random_string()
-    picture = cloudinary.uploader.upload(picture.file, public_id=picture_name, folder='picture', overwrite=True)
-    version = picture.get('version')
-
-    picture_url = cloudinary.CloudinaryImage(picture['public_id']).build_url(version=version)
-    qr = await generate_qr_and_upload_to_cloudinary(picture_url, picture)
-
-    uploaded_picture = await picture_uploader(picture_url=picture_url,
-                                              picture_json=picture,
+    upload = await receive_upload(request, 'picture', storage, folder='picture', name=picture_name, commit=False)
+    if 'description' not in upload.fields:
+        upload.abort()
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Description is required.")
+    asset = await store_picture_asset(upload, storage, db)
+
+    uploaded_picture = await picture_uploader(picture_url=asset.picture_url,
+                                              picture_json=asset.picture_json,
                                               user=current_user,
-                                              description=description,
-                                              qr=qr,
-                                              db=db)
+                                              description=upload.fields['description'],
+                                              qr=asset.qr_code_picture,
+                                              db=db,
+                                              asset_id=asset.id,
+                                              phash=asset.phash,
+                                              derivatives=asset.derivatives)
+    background_tasks.add_task(extract_picture_metadata, uploaded_picture.id, storage, db.get_bind())
 
     return RedirectResponse(url=f"/picture/{uploaded_picture.id}", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -190,7 +231,7 @@ async def upload_picture(request: Request,
 @router.get("/picture/{picture_id}", response_class=HTMLResponse)
 async def get_picture(request: Request,
                       picture_id: int,
-                      db: Session = Depends(get_db),
+                      db: Session = Depends(get_read_db),
                       current_user: User = Depends(auth_service.get_current_user_optional)
                       ):
 
@@ -311,7 +352,8 @@ async def delete_comment(comment_id: int,
 @router.post("/picture/delete/{picture_id}")
 async def delete_picture(picture_id: int,
                          db: Session = Depends(get_db),
-                         current_user: User = Depends(auth_service.get_current_user_optional)
+                         current_user: User = Depends(auth_service.get_current_user_optional),
+                         storage: StorageBackend = Depends(get_storage)
                          ):
 
     if not current_user:
@@ -326,8 +368,10 @@ async def delete_picture(picture_id: int,
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="You do not have permission to perform this action.")
 
-    db.delete(picture)
-    db.commit()
+    asset_id = picture.asset_id
+    await picture_repository.delete_picture(picture_id, db)
+    if asset_id is not None:
+        await purge_asset(asset_id, storage, db)
 
     return RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -389,7 +433,7 @@ async def rate_picture(picture_id: int,
 @router.get("/picture/{picture_id}/ratings", response_class=HTMLResponse)
 async def view_picture_ratings(request: Request,
                                picture_id: int,
-                               db: Session = Depends(get_db),
+                               db: Session = Depends(get_read_db),
                                current_user: User = Depends(auth_service.get_current_user_optional)
                                ):
 
@@ -422,8 +466,7 @@ async def delete_rating(rating_id: int,
                             detail="You do not have permission to delete this rating.")
 
     picture_id = rating.picture_id
-    db.delete(rating)
-    db.commit()
+    await rating_repository.remove_rating_from_picture_admin(picture_id, rating.user_id, db)
 
     return RedirectResponse(url=f"/picture/{picture_id}", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -0,0 +1,140 @@
+import os
+import re
+from typing import Optional
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from starlette.responses import Response
+
+from src.conf.config import settings
+from src.services.storage import LocalStorage, StorageBackend, get_storage, sniff_image_type
+
+router = APIRouter(prefix="/media", tags=["media"])
+
+CHUNK_SIZE = 256 * 1024
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """
+    Parse a single-range ``Range`` header into an inclusive ``(start, end)`` pair.
+
+    Returns None for headers that are ignored (multiple ranges or another unit), so the whole file is
+    served, and raises ValueError when the range cannot be satisfied.
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+class LocalFileResponse(Response):
+    """
+    Send part or all of a file, without copying it through Python when the server allows it.
+
+    Servers implementing the ASGI ``http.response.zerocopy`` extension get the open file and send it
+    with ``sendfile``; when ``STORAGE_LOCAL_ACCEL_REDIRECT`` is set, the body is left to the reverse
+    proxy through ``X-Accel-Redirect``. Otherwise the file is read in chunks in a worker thread.
+    """
+
+    def __init__(self, path: str, start: int, end: int, status_code: int, headers: dict,
+                 accel_redirect: Optional[str] = None):
+        super().__init__(status_code=status_code, headers=headers)
+        self.path = path
+        self.start = start
+        self.count = end - start + 1
+        self.accel_redirect = accel_redirect
+
+    async def __call__(self, scope, receive, send):
+        if self.accel_redirect:
+            self.headers["x-accel-redirect"] = self.accel_redirect
+            del self.headers["content-length"]
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        with open(self.path, "rb") as f:
+            if "http.response.zerocopy" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopy", "file": f, "offset": self.start, "count": self.count})
+                return
+            offset, remaining = self.start, self.count
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(os.pread, f.fileno(), min(CHUNK_SIZE, remaining), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b""})
+
+
+@router.api_route("/{public_id:path}", methods=["GET", "HEAD"])
+async def get_media(public_id: str, request: Request, storage: StorageBackend = Depends(get_storage)):
+    """
+    Serve a file of the local storage backend.
+
+    Supports conditional requests (``If-None-Match``) with a strong ``ETag`` derived from the file's
+    size and modification time, and single byte ranges (``Range`` / ``If-Range``).
+
+    Args:
+        public_id (str): The id of the stored file, e.g. ``picture/abc``.
+        request (Request): The incoming request.
+        storage (StorageBackend): The configured storage backend.
+
+    Returns:
+        Response: 200 with the file, 206 with a byte range, 304 if unchanged or 416 for a bad range.
+    """
+    if not isinstance(storage, LocalStorage):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    try:
+        path = storage.path(public_id)
+        stat = os.stat(path)
+    except (ValueError, FileNotFoundError, IsADirectoryError):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    headers = {"etag": etag, "accept-ranges": "bytes", "cache-control": "public, max-age=86400"}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    with open(path, "rb") as f:
+        sniffed = sniff_image_type(f.read(16))
+    headers["content-type"] = sniffed[1] if sniffed else "application/octet-stream"
+
+    size = stat.st_size
+    start, end, status_code = 0, size - 1, status.HTTP_200_OK
+    range_header = request.headers.get("range")
+    if range_header and request.headers.get("if-range", etag) == etag:
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                            headers={**headers, "content-range": f"bytes */{size}"})
+        if byte_range:
+            start, end = byte_range
+            status_code = status.HTTP_206_PARTIAL_CONTENT
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+    headers["content-length"] = str(end - start + 1)
+
+    accel_redirect = None
+    if settings.storage_local_accel_redirect:
+        accel_redirect = f"{settings.storage_local_accel_redirect.rstrip('/')}/{public_id}"
+    return LocalFileResponse(path, start, end, status_code, headers, accel_redirect)
@@ -1,38 +1,53 @@
 from typing import List, Type
-from fastapi import APIRouter, Depends, HTTPException,  UploadFile, File, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-import cloudinary
-import cloudinary.uploader
 
-from src.database.db import get_db
+from src.conf.config import settings
+
+from src.database.db import get_db, get_read_db
 from src.database.models import User, Picture
-from src.schemas import PictureDB, PictureEdit, PictureResponse
+from src.schemas import PictureDB, PictureEdit, PictureResponse, SimilarPictureResponse
 from src.repository import pictures as repository_pictures
+from src.services.assets import purge_asset, store_picture_asset
 from src.services.auth import auth_service
-from src.services.qr import generate_qr_and_upload_to_cloudinary
-from src.conf.cloudinary import configure_cloudinary, generate_random_string
+from src.services.batch_uploads import BatchUpload
+from src.services.edits import edit_picture_cached, evict_source_edits
+from src.services.exif import extract_picture_metadata
+from src.services.storage import StorageBackend, get_storage
+from src.services.uploads import multipart_openapi, receive_upload, receive_uploads
+from src.conf.cloudinary import generate_random_string
 
 
 router = APIRouter(prefix='/pictures', tags=["pictures"])
 
 
-@router.post("/upload", status_code=status.HTTP_201_CREATED, response_model=PictureResponse)
+@router.post("/upload", status_code=status.HTTP_201_CREATED, response_model=PictureResponse,
+             openapi_extra=multipart_openapi("picture"))
 async def upload_picture(
-        picture: UploadFile = File(),
+        request: Request,
+        background_tasks: BackgroundTasks,
         current_user: User = Depends(auth_service.get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_db),
+        storage: StorageBackend = Depends(get_storage)
 ) -> PictureDB:
     """
     Upload a picture to the database.
 
-    This endpoint uploads a picture file to the cloud storage using Cloudinary. It then associates
-    the uploaded picture with the current user and saves the picture data to the database.
+    This endpoint streams the picture file (multipart field ``picture``) to the configured storage
+    (Cloudinary or the local filesystem), rejecting files that are too large or not images as early as
+    possible. Files are stored once per content: re-uploading a picture that is already stored reuses its
+    file and QR code and only adds a database row. It then associates the uploaded picture with the current
+    user and saves the picture data to the database. The image metadata (dimensions, EXIF) is extracted
+    after the response is sent.
 
     Parameters:
-    - picture (UploadFile): The picture file to be uploaded.
+    - request (Request): The request whose multipart body carries the picture file.
+    - background_tasks (BackgroundTasks): Background tasks to execute.
     - current_user (User): The current user authenticated via the authentication service.
     - db (Session, optional): An SQLAlchemy database session instance provided by the FastAPI dependency
       injection system.
+    - storage (StorageBackend): The storage backend the file is written to.
 
     Returns:
     - The URL of the uploaded picture as a PictureDB instance.
@@ -40,24 +55,71 @@ async def upload_picture(
     if not current_user.confirmed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access to upload picture")
 
-    configure_cloudinary()
     picture_name = generate_random_string()
-    picture = cloudinary.uploader.upload(picture.file, public_id=picture_name, folder='picture', overwrite=True)
-    version = picture.get('version')
-
-    picture_url = cloudinary.CloudinaryImage(picture['public_id']).build_url(version=version)
-    qr = await generate_qr_and_upload_to_cloudinary(picture_url, picture)
+    upload = await receive_upload(request, 'picture', storage, folder='picture', name=picture_name, commit=False)
+    asset = await store_picture_asset(upload, storage, db)
 
-    picture_in_db = await repository_pictures.upload_picture(picture_url=picture_url, picture_json=picture, user=current_user, qr=qr, db=db)
+    picture_in_db = await repository_pictures.upload_picture(picture_url=asset.picture_url, picture_json=asset.picture_json,
+                                                             user=current_user, qr=asset.qr_code_picture, db=db,
+                                                             asset_id=asset.id, phash=asset.phash,
+                                                             derivatives=asset.derivatives)
+    background_tasks.add_task(extract_picture_metadata, picture_in_db.id, storage, db.get_bind())
 
     return picture_in_db
 
 
+@router.post("/upload/batch", openapi_extra=multipart_openapi("pictures"),
+             responses={200: {"content": {"application/x-ndjson": {}},
+                              "description": "One JSON line per file, in order of completion."}})
+async def upload_pictures(
+        request: Request,
+        background_tasks: BackgroundTasks,
+        current_user: User = Depends(auth_service.get_current_user),
+        db: Session = Depends(get_db),
+        storage: StorageBackend = Depends(get_storage)
+) -> StreamingResponse:
+    """
+    Upload several pictures in one request.
+
+    Every part named ``pictures`` is streamed to storage like ``/upload`` does, and the files are
+    stored (with their QR code and resized copies) ``UPLOAD_BATCH_CONCURRENCY`` at a time while the
+    rest of the body is still arriving. Files already stored are reused. The pictures are inserted in
+    bulk, and the result of each file is streamed back as an NDJSON line as soon as it is recorded:
+    ``{"index", "filename", "status_code": 201, "picture"}`` or ``{"index", "filename", "status_code",
+    "detail"}`` for a file that was rejected (413, 415) or could not be stored. At most
+    ``UPLOAD_BATCH_MAX_FILES`` files are accepted; the others are rejected with 413.
+
+    Parameters:
+    - request (Request): The request whose multipart body carries the picture files.
+    - background_tasks (BackgroundTasks): Background tasks to execute.
+    - current_user (User): The current user authenticated via the authentication service.
+    - db (Session, optional): An SQLAlchemy database session instance provided by the FastAPI dependency
+      injection system.
+    - storage (StorageBackend): The storage backend the files are written to.
+
+    Returns:
+    - A streaming NDJSON response with one line per file.
+    """
+    if not current_user.confirmed:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access to upload picture")
+
+    batch = BatchUpload(current_user, storage, db, settings.upload_batch_concurrency, background_tasks)
+    try:
+        async for upload in receive_uploads(request, 'pictures', storage, folder='picture',
+                                            name=generate_random_string, max_files=settings.upload_batch_max_files):
+            await batch.add(upload)
+    except BaseException:
+        await batch.cancel()
+        raise
+
+    return StreamingResponse(batch.results(), media_type="application/x-ndjson", background=background_tasks)
+
+
 @router.get("/", response_model=List[PictureResponse])
 async def get_all_pictures(
         skip: int = 0,
         limit: int = 20,
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ) -> list[Type[Picture]]:
     """
     Retrieve all pictures from the database.
@@ -83,7 +145,7 @@ async def get_all_pictures(
 async def get_one_picture(
         picture_id: int,
         current_user: User = Depends(auth_service.get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ) -> PictureResponse:
     """
     Retrieve a specific picture from the database.
@@ -110,31 +172,76 @@ async def get_one_picture(
     return picture
 
 
-@router.put("/{picture_id}", response_model=PictureResponse)
+@router.get("/{picture_id}/similar", response_model=List[SimilarPictureResponse])
+async def get_similar_pictures(
+        picture_id: int,
+        distance: int = Query(10, ge=0, le=32),
+        limit: int = Query(20, ge=1, le=100),
+        current_user: User = Depends(auth_service.get_current_user),
+        db: Session = Depends(get_read_db)
+) -> list[SimilarPictureResponse]:
+    """
+    Retrieve the pictures that look like a specific picture.
+
+    This endpoint compares the 64-bit perceptual hashes of the pictures and returns those within the
+    given Hamming distance (0 means visually identical, around 10 still catches resized, recompressed
+    or slightly edited copies), nearest first.
+
+    Parameters:
+    - picture_id (int): The ID of the picture to compare with.
+    - distance (int): The maximum Hamming distance between the hashes (0-32).
+    - limit (int): The maximum number of pictures to retrieve.
+    - current_user (User): The current user authenticated via the authentication service.
+    - db (Session, optional): An SQLAlchemy database session instance provided by the FastAPI dependency
+      injection system.
+
+    Returns:
+    - A list of SimilarPictureResponse instances with the distance of each picture.
+    """
+
+    if not current_user.confirmed:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access to picture")
+
+    picture = await repository_pictures.get_one_picture(picture_id=picture_id, db=db)
+    if picture is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Picture not found")
+    if picture.phash is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="The picture has not been hashed yet")
+
+    similar = await repository_pictures.get_similar_pictures(picture, distance, limit, db)
+    return [SimilarPictureResponse(**PictureResponse.model_validate(similar_picture).model_dump(), distance=d)
+            for similar_picture, d in similar]
+
+
+@router.put("/{picture_id}", response_model=PictureResponse, openapi_extra=multipart_openapi("picture"))
 async def update_picture(
         picture_id: int,
-        picture: UploadFile = File(),
+        request: Request,
+        background_tasks: BackgroundTasks,
         current_user: User = Depends(auth_service.get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_db),
+        storage: StorageBackend = Depends(get_storage)
 ) -> PictureDB:
     """
     Update a picture in the database.
 
-    This endpoint updates the specified picture in the database with a new picture file.
+    This endpoint updates the specified picture in the database with a new picture file, stored like an
+    upload (shared with identical pictures). The edited version of the previous file is dropped, and the
+    metadata of the new file is extracted after the response is sent.
 
     Parameters:
     - picture_id (int): The ID of the picture to update.
-    - picture (UploadFile): The new picture file to upload.
+    - request (Request): The request whose multipart body carries the new picture file (field ``picture``).
+    - background_tasks (BackgroundTasks): Background tasks to execute.
     - current_user (User): The current user authenticated via the authentication service.
     - db (Session, optional): An SQLAlchemy database session instance provided by the FastAPI dependency
       injection system.
+    - storage (StorageBackend): The storage backend the file is written to.
 
     Returns:
     - The URL of the updated picture as a PictureDB instance.
     """
 
-    configure_cloudinary()
-
     random_string = generate_random_string()
 
     picture_data = await repository_pictures.get_one_picture(picture_id, db)
@@ -145,10 +252,18 @@ async def update_picture(
     if not current_user.id == picture_data.user_id and not current_user.admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You are not allowed to update this picture")
 
-    picture_uploaded = cloudinary.uploader.upload(picture.file, public_id=f'picture/{current_user.email}', overwrite=True)
-    url = cloudinary.CloudinaryImage(f'picture/{random_string}').build_url(version=picture_uploaded.get('version'))
+    upload = await receive_upload(request, 'picture', storage, folder='picture', name=random_string, commit=False)
+    asset = await store_picture_asset(upload, storage, db)
+    old_asset_id, old_source = picture_data.asset_id, picture_data.picture_json
 
-    picture_url = await repository_pictures.update_picture(picture_id=picture_id, url=url, user=current_user, db=db)
+    picture_url = await repository_pictures.update_picture(picture_id=picture_id, url=asset.picture_url, user=current_user,
+                                                           db=db, asset=asset)
+    if old_asset_id is not None:
+        await purge_asset(old_asset_id, storage, db)
+    elif old_source:
+        await evict_source_edits(old_source['public_id'], storage, db)
+        db.commit()
+    background_tasks.add_task(extract_picture_metadata, picture_id, storage, db.get_bind())
 
     return picture_url
 
@@ -157,18 +272,21 @@ async def update_picture(
 async def delete_picture(
         picture_id: int,
         current_user: User = Depends(auth_service.get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_db),
+        storage: StorageBackend = Depends(get_storage)
 ) -> PictureDB:
     """
     Delete a picture from the database.
 
-    This endpoint deletes the specified picture from the database.
+    This endpoint deletes the specified picture from the database. The stored file and QR code are
+    deleted as well once no other picture uses them.
 
     Parameters:
     - picture_id (int): The ID of the picture to delete.
     - current_user (User): The current user authenticated via the authentication service.
     - db (Session, optional): An SQLAlchemy database session instance provided by the FastAPI dependency
       injection system.
+    - storage (StorageBackend): The storage backend holding the picture.
 
     Returns:
     - The PictureDB instance representing the deleted picture.
@@ -182,7 +300,10 @@ async def delete_picture(
     if not current_user.id == picture.user_id and not current_user.admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You don't have permission to delete this picture")
 
+    asset_id = picture.asset_id
     deleted_picture = await repository_pictures.delete_picture(picture_id=picture_id, db=db)
+    if asset_id is not None:
+        await purge_asset(asset_id, storage, db)
 
     return deleted_picture
 
@@ -192,11 +313,16 @@ async def edit_picture(
         picture_id: int,
         picture_edit: PictureEdit,
         current_user: User = Depends(auth_service.get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_db),
+        storage: StorageBackend = Depends(get_storage)
 ):
     """
     Edit a picture based on the specified parameters.
 
+    Deterministic effects are rendered locally from the stored file; edits with generative effects
+    (``gen_replace``, ``gen_remove``) or red-eye removal are transformed by Cloudinary. Repeating an edit
+    already made to the same picture file returns the stored result without transforming it again.
+
     Parameters:
     - picture_id (int): The ID of the picture to be edited.
     - picture_edit (PictureEdit): An object containing the parameters for editing the picture. The parameters include:
@@ -211,6 +337,7 @@ async def edit_picture(
         - gen_remove (str): A string representing the removal transformation. If specified, 'gen_replace' should not be provided.
     - current_user (User): The current user authenticated via the authentication service.
     - db (Session, optional): An SQLAlchemy database session instance provided by the FastAPI dependency injection system.
+    - storage (StorageBackend): The storage backend holding the picture.
 
     Returns:
     - The edited URL of the picture as a string.
@@ -227,20 +354,12 @@ async def edit_picture(
     if not current_user.id == picture_db.user_id and not current_user.admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You are not allowed to update this picture")
 
-    configure_cloudinary()
-
     await repository_pictures.validate_edit_parameters(picture_edit)
-    picture = picture_db.picture_json
-    picture_public_id = picture['public_id']
-    picture_version = picture['version']
-
     transformation = await repository_pictures.parse_transform_effects(picture_edit)
-    transformation_url = cloudinary.utils.cloudinary_url(picture_public_id, transformation=transformation)[0]
-
-    picture_edited = cloudinary.uploader.upload(transformation_url, version=picture_version, public_id=f'{picture_public_id}_edited', overwrite=True)
-    picture_edited_url = cloudinary.CloudinaryImage(picture_edited['public_id']).build_url(version=picture_version)
-
-    qr = await generate_qr_and_upload_to_cloudinary(picture_edited_url, picture_edited, picture_version)
+    try:
+        picture_edited, picture_edited_url, qr = await edit_picture_cached(picture_db, transformation, storage, db)
+    except NotImplementedError as e:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
 
     return await repository_pictures.upload_edited_picture(picture=picture_db, picture_edited=picture_edited, picture_edited_url=picture_edited_url, qr=qr, db=db)
 
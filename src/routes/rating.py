@@ -1,7 +1,7 @@
 from fastapi import Depends, HTTPException, status, APIRouter
 from sqlalchemy.orm import Session
 
-from src.database.db import get_db
+from src.database.db import get_db, get_read_db
 from src.database.models import User
 from src.repository.rating import add_rating_to_picture, remove_rating_from_picture, get_rating, get_average_of_rating, \
     remove_rating_from_picture_admin
@@ -81,7 +81,7 @@ async def delete_admin_rating(
 @router.post("/picture")
 async def get_ratings(
         data: RatingPicture,
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ):
     """
     Retrieves all ratings associated with a specific picture. This endpoint is open and does not
@@ -102,7 +102,7 @@ async def get_ratings(
 @router.post("/average/picture")
 async def get_average_rating(
         data: RatingPicture,
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ):
     """
     Calculates and returns the average rating for a specific picture. This endpoint is open and
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, status, Depends
 from sqlalchemy.orm import Session
 
-from src.database.db import get_db
+from src.database.db import get_db, get_read_db
 from src.database.models import User
 from src.schemas import ReactionName
 from src.services.auth import auth_service
@@ -52,7 +52,7 @@ async def remove_reaction(
 @router.get("/{comment_id}")
 async def get_reactions(
         comment_id: int,
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ):
     """
     The get_reactions function returns a dict of all users and their reactions for a given comment.
@@ -69,7 +69,7 @@ async def get_reactions(
 @router.get("/number/{comment_id}")
 async def get_number_of_reactions(
         comment_id: int,
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ):
     """
     The get_number_of_reactions function returns the numbers of reactions for a given comment.
@@ -1,36 +1,75 @@
+from datetime import datetime
+
 from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from typing import List, Optional
 
-from src.database.db import get_db
-from src.schemas import PictureResponse
+from src.database.db import get_read_db
+from src.schemas import PictureMetadataFilter, PictureResponse
 from src.repository import search as repository_search
 
 
 router = APIRouter(prefix="/search", tags=["search"])
 
 
+def metadata_filter(taken_after: Optional[datetime] = None,
+                    taken_before: Optional[datetime] = None,
+                    camera: Optional[str] = Query(None, min_length=1, max_length=64,
+                                                  description="Prefix of the camera make or model"),
+                    lens: Optional[str] = Query(None, min_length=1, max_length=128,
+                                                description="Prefix of the lens model"),
+                    min_width: Optional[int] = Query(None, ge=1),
+                    min_height: Optional[int] = Query(None, ge=1),
+                    orientation: Optional[int] = Query(None, ge=1, le=8, description="EXIF orientation"),
+                    has_gps: Optional[bool] = None,
+                    bbox: Optional[str] = Query(None, description="Area of the GPS position: south,west,north,east")
+                    ) -> PictureMetadataFilter:
+    """
+    Collect the metadata filters of a search from its query parameters.
+    """
+    area = None
+    if bbox is not None:
+        try:
+            area = tuple(float(value) for value in bbox.split(","))
+        except ValueError:
+            area = ()
+        if len(area) != 4:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                detail="bbox must be four numbers: south,west,north,east")
+    return PictureMetadataFilter(taken_after=taken_after, taken_before=taken_before, camera=camera, lens=lens,
+                                 min_width=min_width, min_height=min_height, orientation=orientation,
+                                 has_gps=has_gps, bbox=area)
+
+
 @router.post("/pictures", response_model=List[PictureResponse])
 async def search_pictures(
         keyword: Optional[str] = None,
         sort_by: Optional[str] = "created_at",
         sort_order: Optional[str] = "desc",
-        db: Session = Depends(get_db)
+        filters: PictureMetadataFilter = Depends(metadata_filter),
+        skip: int = Query(0, ge=0),
+        limit: int = Query(20, ge=1, le=100),
+        db: Session = Depends(get_read_db)
 ):
     """
     Searches for images matching the provided keyword and returns a list of image responses.
     The search considers both image descriptions and tags assigned to images.
-    Results can be sorted by rating or creation date, in ascending or descending order.
+    Results can be sorted by rating or creation date, in ascending or descending order, and narrowed by
+    the image metadata: capture time, camera, lens, size, orientation and GPS position.
 
     Args:
         keyword (Optional[str]): The keyword used to filter images. Defaults to `None`.
         sort_by (Optional[str]): The field by which results should be sorted. Possible values are "rating" or "created_at". Defaults to "created_at".
         sort_order (Optional[str]): Specifies whether results should be sorted in ascending ("asc") or descending ("desc") order. Defaults to "desc".
+        filters (PictureMetadataFilter): Metadata filters from the query parameters (``taken_after``, ``taken_before``, ``camera``, ``lens``, ``min_width``, ``min_height``, ``orientation``, ``has_gps``, ``bbox``).
+        skip (int): The number of matching images to skip. Defaults to 0.
+        limit (int): The maximum number of images to return (1-100). Defaults to 20.
         db (Session): Database session, a dependency injected by FastAPI.
 
     Returns:
-        List[PictureResponse]: A list of PictureResponse objects representing images that meet the search criteria.
+        List[PictureResponse]: A page of PictureResponse objects representing images that meet the search criteria.
     """
-    pictures = await repository_search.search_pictures(keyword=keyword, sort_by=sort_by, sort_order=sort_order, db=db)
+    pictures = await repository_search.search_pictures(keyword=keyword, sort_by=sort_by, sort_order=sort_order, db=db,
+                                                     filters=filters, skip=skip, limit=limit)
 
     return pictures
@@ -1,20 +1,31 @@
 from typing import List
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
-from fastapi_limiter.depends import RateLimiter
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-import cloudinary
-import cloudinary.uploader
 from src.database.db import get_db
 from src.database.models import User
 from src.repository import users as repository_users
-from src.repository.users import get_user_by_id, list_all_users, update_user_name, ban_user, get_user_by_username
+from src.repository.users import (get_user_by_id, iter_users, list_all_users, update_user_name, ban_user,
+                                  get_user_by_username)
 from src.services.auth import auth_service
-from src.schemas import UserDb, UserUpdateName
-from src.conf.cloudinary import configure_cloudinary, generate_random_string
+from src.services.export import ExportFormat, csv_stream, download_response, export_response
+from src.schemas import UserAdminDb, UserDb, UserFilter, UserRole, UserUpdateName
+from src.conf.config import settings
+from src.conf.cloudinary import generate_random_string
+from src.services.storage import StorageBackend, get_storage
+from src.services.uploads import multipart_openapi, receive_upload
 
 router = APIRouter(prefix="/users", tags=["users"])
 
-rate_limit = RateLimiter(times=10, seconds=60)
+
+def user_filter(banned: Optional[bool] = None,
+                confirmed: Optional[bool] = None,
+                role: Optional[UserRole] = None) -> UserFilter:
+    """
+    Collect the filters of the admin user listing from its query parameters.
+    """
+    return UserFilter(banned=banned, confirmed=confirmed, role=role)
 
 
 @router.get("/me/", response_model=UserDb)
@@ -31,52 +42,109 @@ async def read_users_me(current_user: User = Depends(auth_service.get_current_us
     return current_user
 
 
-@router.patch('/avatar', response_model=UserDb)
-async def update_avatar_user(file: UploadFile = File(),
+@router.get("/me/export", response_class=StreamingResponse,
+            responses={200: {"content": {"application/x-ndjson": {}, "application/x-tar": {}}}})
+async def export_users_me(export_format: ExportFormat = Query("ndjson", alias="format"),
+                          current_user: User = Depends(auth_service.get_current_user),
+                          db: Session = Depends(get_db)) -> StreamingResponse:
+    """
+    Download everything stored about the authenticated user.
+
+    The profile, pictures (with tags), comments, ratings, reactions on the user's comments and
+    messages are streamed as NDJSON (one object per line, its kind in ``type``) or as a tar archive
+    with one NDJSON file per kind. Rows are read in chunks while the response is sent, so the export
+    works for any amount of data.
+
+    Args:
+        export_format (str): ``ndjson`` (default) or ``tar``.
+        current_user (User): The authenticated user.
+        db (Session): SQLAlchemy database session.
+
+    Returns:
+        StreamingResponse: The export as a file download.
+    """
+    return export_response(db, current_user.id, export_format, f"photoshare-{current_user.id}")
+
+
+@router.patch('/avatar', response_model=UserDb, openapi_extra=multipart_openapi("file"))
+async def update_avatar_user(request: Request,
                              current_user: User = Depends(auth_service.get_current_user),
-                             db: Session = Depends(get_db)) -> UserDb:
+                             db: Session = Depends(get_db),
+                             storage: StorageBackend = Depends(get_storage)) -> UserDb:
     """
     Update the avatar for the authenticated user.
 
+    The avatar URL crops the image to 250x250: a Cloudinary transformation, or with local storage
+    the ``/img/files`` resize route.
+
     Args:
-        file (UploadFile): Uploaded file containing the new avatar image.
+        request (Request): The request whose multipart body carries the new avatar image (field ``file``).
         current_user (User): The authenticated user.
         db (Session): SQLAlchemy database session.
+        storage (StorageBackend): The storage backend the avatar is written to.
 
     Returns:
         UserDb: The updated user profile.
     """
-    configure_cloudinary()
     random_string = generate_random_string()
 
-    r = cloudinary.uploader.upload(file.file, public_id=f'avatars/{random_string}', overwrite=True)
-    src_url = cloudinary.CloudinaryImage(f'avatars/{random_string}') \
-        .build_url(width=250, height=250, crop='fill', version=r.get('version'))
+    r = (await receive_upload(request, 'file', storage, folder='avatars', name=random_string)).stored
+    src_url = storage.url(r['public_id'], width=250, height=250, crop='fill', version=r.get('version'))
     user = await repository_users.update_avatar(current_user.email, src_url, db)
     return user
 
 
 @router.get('/all',
-            response_model=List[UserDb],
+            response_model=List[UserAdminDb],
             dependencies=[Depends(auth_service.require_role(required_role="moderator"))])
-async def read_all_users(db: Session = Depends(get_db),
-                         ) -> List[UserDb]:
+async def read_all_users(response: Response,
+                         limit: int = Query(100, ge=1, le=500),
+                         after: Optional[int] = Query(None, description="Cursor: the ID of the last user of the previous page"),
+                         filters: UserFilter = Depends(user_filter),
+                         db: Session = Depends(get_db),
+                         ) -> List[dict]:
     """
-    Asynchronously retrieves all users from the database.
+    Asynchronously retrieves one page of users, ordered by ID.
 
-    This endpoint queries the database for all users and returns them as a list of Pydantic models
-    conforming to `UserDb`. This operation is non-blocking and is performed asynchronously.
+    Each user comes with their role, status and picture and comment counts. When more users may
+    follow, the cursor of the next page is sent in the ``X-Next-Cursor`` header: pass it as ``after``.
 
     Args:
+        response (Response): The response, to set the cursor header on.
+        limit (int): The maximum number of users per page.
+        after (int, optional): The cursor of the page.
+        filters (UserFilter): The ``banned``, ``confirmed`` and ``role`` query parameters.
         db (Session): The database session dependency injected by FastAPI.
 
     Returns:
-        List[UserDb]: A list of users represented as Pydantic models.
+        List[UserAdminDb]: The users of the page.
     """
-    users = await list_all_users(db=db)
+    users = await list_all_users(db=db, limit=limit, after=after, filters=filters)
+    if len(users) == limit:
+        response.headers["X-Next-Cursor"] = str(users[-1]["id"])
     return users
 
 
+@router.get('/all/export',
+            response_class=StreamingResponse,
+            responses={200: {"content": {"text/csv": {}}}},
+            dependencies=[Depends(auth_service.require_role(required_role="moderator"))])
+async def export_all_users(filters: UserFilter = Depends(user_filter),
+                           db: Session = Depends(get_db)) -> StreamingResponse:
+    """
+    Download the users matching the filters as CSV, streamed as it is read from the database.
+
+    Args:
+        filters (UserFilter): The ``banned``, ``confirmed`` and ``role`` query parameters.
+        db (Session): The database session dependency injected by FastAPI.
+
+    Returns:
+        StreamingResponse: The CSV file, with the fields of ``UserAdminDb``.
+    """
+    rows = iter_users(db, filters, settings.export_chunk_size)
+    return download_response(db, csv_stream(rows, list(UserAdminDb.model_fields)), "text/csv", "users.csv")
+
+
 @router.patch('/update/{user_id}', response_model=UserDb)
 async def update_user_name_route(user_id: int,
                                  user_name_update: UserUpdateName,
@@ -28,6 +28,32 @@ class UserDb(BaseModel):
         from_attributes = True
 
 
+class UserRole(str, Enum):
+    admin = "admin"
+    moderator = "moderator"
+    user = "user"
+
+
+class UserFilter(BaseModel):
+    """
+    Filters of the admin user listing; None leaves a criterion out.
+    """
+    banned: Optional[bool] = None
+    confirmed: Optional[bool] = None
+    role: Optional[UserRole] = None
+
+
+class UserAdminDb(UserDb):
+    """
+    Schema for a user in the admin listing, with their status and activity counts.
+    """
+    confirmed: bool
+    ban_status: bool
+    role: UserRole
+    picture_count: int
+    comment_count: int
+
+
 class UserResponse(BaseModel):
     """
     Schema for the response after user creation.
@@ -123,11 +149,43 @@ class PictureResponse(PictureBase):
     created_at: datetime
     tags: Optional[List[TagModel]]
     qr_code_picture: Optional[str] | None
+    derivatives: Optional[dict[str, dict[str, str]]] = None
+    srcset: str
+    srcset_webp: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    taken_at: Optional[datetime] = None
+    camera_make: Optional[str] = None
+    camera_model: Optional[str] = None
+    lens_model: Optional[str] = None
+    orientation: Optional[int] = None
+    gps_latitude: Optional[float] = None
+    gps_longitude: Optional[float] = None
 
     class Config:
         from_attributes = True
 
 
+class SimilarPictureResponse(PictureResponse):
+    distance: int
+
+
+class PictureMetadataFilter(BaseModel):
+    """
+    Filters on the image metadata extracted after upload; pictures without metadata never match.
+    ``bbox`` is ``(south, west, north, east)`` in degrees.
+    """
+    taken_after: Optional[datetime] = None
+    taken_before: Optional[datetime] = None
+    camera: Optional[str] = None
+    lens: Optional[str] = None
+    min_width: Optional[int] = None
+    min_height: Optional[int] = None
+    orientation: Optional[int] = None
+    has_gps: Optional[bool] = None
+    bbox: Optional[tuple[float, float, float, float]] = None
+
+
 class PictureSearch(PictureBase):
     keywords: Optional[List[str]] | None
     id: Optional[List[int]] | None
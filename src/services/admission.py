@@ -0,0 +1,157 @@
+import asyncio
+import fnmatch
+import json
+import math
+import time
+from collections import deque
+from typing import Optional
+
+from src.services.metrics import metrics
+
+ENDPOINT_CLASSES = {
+    "upload": ("POST /api/pictures/upload", "POST /api/pictures/upload/batch", "PUT /api/pictures/*",
+               "PATCH /api/users/avatar", "POST /picture/upload"),
+    "edit": ("POST /api/pictures/edit/*",),
+    "export": ("GET /api/users/me/export", "GET /api/users/all/export", "GET /api/admin/export"),
+    "search": ("POST /api/search/*", "GET /api/pictures/*/similar"),
+}
+
+
+def parse_limits(limits: str) -> dict[str, int]:
+    """
+    Parse ``ADMISSION_LIMITS``: comma-separated ``class=concurrency`` entries.
+    """
+    parsed = {}
+    for entry in limits.split(","):
+        if entry.strip():
+            name, _, limit = entry.partition("=")
+            parsed[name.strip()] = int(limit)
+    return parsed
+
+
+class AdmissionGate:
+    """
+    Lets at most ``limit`` requests of an endpoint class run at once, with at most ``queue_size``
+    more waiting (first come, first served) for up to ``timeout`` seconds.
+
+    Requests beyond that are refused at once instead of piling up threads, connections and memory,
+    so the admitted ones keep their latency. The gauges ``admission.{name}.active`` and ``queued``
+    and the counters ``admitted``, ``rejected``, ``timeouts`` and ``wait_seconds`` are exported.
+    The gate belongs to one worker process; it only ever runs on that process' event loop.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._duration: Optional[float] = None
+
+    def _gauges(self) -> None:
+        metrics.set(f"admission.{self.name}.active", self.active)
+        metrics.set(f"admission.{self.name}.queued", len(self._waiters))
+
+    async def acquire(self) -> bool:
+        """
+        Wait for a slot; False if the queue is full or the wait timed out.
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+        elif len(self._waiters) >= self.queue_size:
+            metrics.inc(f"admission.{self.name}.rejected")
+            return False
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            self._gauges()
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), self.timeout)
+            except asyncio.TimeoutError:
+                if not waiter.done():
+                    self._waiters.remove(waiter)
+                    waiter.cancel()
+                    metrics.inc(f"admission.{self.name}.timeouts")
+                    self._gauges()
+                    return False
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self.release()
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                self._gauges()
+                raise
+            finally:
+                metrics.inc(f"admission.{self.name}.wait_seconds", time.perf_counter() - started)
+        metrics.inc(f"admission.{self.name}.admitted")
+        self._gauges()
+        return True
+
+    def release(self, duration: Optional[float] = None) -> None:
+        """
+        Free a slot, handing it to the oldest waiting request; ``duration`` is how long the request ran.
+        """
+        if duration is not None:
+            self._duration = duration if self._duration is None else 0.8 * self._duration + 0.2 * duration
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+        else:
+            self.active -= 1
+        self._gauges()
+
+    def retry_after(self) -> int:
+        """
+        Estimate the seconds before a refused request would be admitted: the time for the queue to
+        drain, from the average duration of the requests.
+        """
+        duration = self._duration if self._duration is not None else 1.0
+        return max(1, math.ceil(duration * (len(self._waiters) + 1) / self.limit))
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that runs the requests of each endpoint class (``ENDPOINT_CLASSES``) through
+    its ``AdmissionGate``.
+
+    A request that cannot be admitted gets 503 with a ``Retry-After`` header. The slot is held
+    until the response, including a streamed body and its background tasks, is complete. Other
+    requests pass straight through.
+    """
+
+    def __init__(self, app, limits: dict[str, int], queue_size: int, timeout: float):
+        self.app = app
+        self.gates = {name: AdmissionGate(name, limit, queue_size, timeout)
+                      for name, limit in limits.items() if limit > 0}
+
+    def gate(self, method: str, path: str) -> Optional[AdmissionGate]:
+        route = f"{method} {path}"
+        for name, patterns in ENDPOINT_CLASSES.items():
+            if name in self.gates and any(fnmatch.fnmatchcase(route, pattern) for pattern in patterns):
+                return self.gates[name]
+        return None
+
+    async def __call__(self, scope, receive, send):
+        gate = self.gate(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await gate.acquire():
+            body = json.dumps({"detail": "Server busy, retry later"}).encode()
+            await send({"type": "http.response.start",
+                        "status": 503,
+                        "headers": [(b"content-type", b"application/json"),
+                                    (b"content-length", str(len(body)).encode()),
+                                    (b"retry-after", str(gate.retry_after()).encode())]})
+            await send({"type": "http.response.body", "body": body})
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release(time.perf_counter() - started)
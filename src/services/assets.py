@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from src.database.models import Asset
+from src.repository import assets as repository_assets
+from src.services.derivatives import delete_derivatives, derivative_name, render_in_worker, store_derivatives
+from src.services.edits import evict_source_edits
+from src.services.phash import image_hash, to_signed
+from src.services.qr import generate_qr_and_upload, qr_public_id
+from src.services.storage import StorageBackend
+from src.services.uploads import ReceivedUpload
+
+
+@dataclass
+class PreparedAsset:
+    """
+    A stored picture file with its QR code, derivatives and perceptual hash, not yet recorded as an asset.
+    """
+    sha256: str
+    size: int
+    stored: dict
+    picture_url: str
+    qr: Optional[str]
+    phash: Optional[int]
+    derivatives: Optional[dict]
+
+
+async def prepare_picture_asset(upload: ReceivedUpload, storage: StorageBackend) -> PreparedAsset:
+    """
+    Store a received file with its QR code and derivatives, without touching the database.
+
+    The file is stored under its SHA-256 followed by a random suffix, so each upload writes new
+    storage keys: a purge of an earlier asset of the same content cannot delete them. The perceptual
+    hash and the derivatives are computed from the received file (the derivative worker process is
+    only given its path) while it is still a temporary file, then the file, its QR code and the
+    derivatives are stored, the last two concurrently. Everything runs in worker threads or
+    processes, so several files can be prepared concurrently. If the derivatives cannot be generated
+    they are left to the first request for them.
+
+    Args:
+        upload (ReceivedUpload): The received, not yet committed, upload.
+        storage (StorageBackend): The storage backend of the file.
+
+    Returns:
+        PreparedAsset: What ``record_picture_asset`` needs to record the asset.
+    """
+    name = f"{upload.sha256}_{uuid.uuid4().hex[:8]}"
+    path = await run_in_threadpool(upload.local_path)
+    phash, rendered = await asyncio.gather(run_in_threadpool(image_hash, path), _render(path, name))
+    stored = await run_in_threadpool(upload.commit, name)
+    picture_url = storage.url(stored['public_id'], version=stored.get('version'))
+    qr, derivatives = await asyncio.gather(generate_qr_and_upload(picture_url, storage, stored),
+                                           _store(rendered, derivative_name(stored), storage))
+    return PreparedAsset(upload.sha256, upload.size, stored, picture_url, qr, to_signed(phash), derivatives)
+
+
+async def _render(path: str, name: str) -> Optional[dict]:
+    try:
+        return await render_in_worker(path)
+    except Exception as e:
+        logging.error(f"Could not generate the derivatives of {name}: {e}")
+        return None
+
+
+async def _store(rendered: Optional[dict], name: str, storage: StorageBackend) -> Optional[dict]:
+    if rendered is None:
+        return None
+    try:
+        return await store_derivatives(rendered, name, storage)
+    except Exception as e:
+        logging.error(f"Could not store the derivatives of {name}: {e}")
+        return None
+
+
+async def record_picture_asset(prepared: PreparedAsset, storage: StorageBackend, db: Session) -> Asset:
+    """
+    Record a prepared file as an asset (or take a reference to the asset of the same content), without committing.
+
+    Files no asset points to afterwards are deleted: the prepared ones when another upload of the
+    same content was recorded first, and those of an unreferenced row left by a failed purge when
+    the row is reused.
+    """
+    asset, replaced = await repository_assets.create_asset(prepared.sha256, prepared.stored, prepared.picture_url,
+                                                           prepared.qr, prepared.size, db, phash=prepared.phash,
+                                                           derivatives=prepared.derivatives)
+    unused = [replaced] if replaced is not None else []
+    if asset.picture_json != prepared.stored:
+        unused.append({"picture_json": prepared.stored, "derivatives": prepared.derivatives})
+    for files in unused:
+        try:
+            await run_in_threadpool(delete_asset_files, files["picture_json"], files["derivatives"], storage)
+        except Exception as e:
+            logging.error(f"Could not delete unused asset files {files['picture_json'].get('public_id')}: {e}")
+    return asset
+
+
+async def store_picture_asset(upload: ReceivedUpload, storage: StorageBackend, db: Session) -> Asset:
+    """
+    Store an uploaded picture once per distinct content.
+
+    The upload must have been received with ``commit=False``. If a picture with the same SHA-256 is
+    already stored, the upload is discarded and the existing asset (file and QR code) is reused, so
+    a duplicate costs no storage round-trip. Otherwise the file is prepared (stored with its QR
+    code, derivatives and perceptual hash) and a new asset is recorded.
+
+    The asset's reference is taken but not committed: it is committed with the ``Picture`` row that
+    points to it.
+
+    Args:
+        upload (ReceivedUpload): The received, not yet committed, upload.
+        storage (StorageBackend): The storage backend of the file.
+        db (Session): Database session object.
+
+    Returns:
+        Asset: The asset the new picture should reference.
+    """
+    asset = await repository_assets.acquire_asset(upload.sha256, db)
+    if asset is not None:
+        upload.abort()
+        return asset
+    return await record_picture_asset(await prepare_picture_asset(upload, storage), storage, db)
+
+
+def delete_asset_files(picture_json: dict, derivatives: Optional[dict], storage: StorageBackend) -> None:
+    """
+    Delete a stored picture file with its QR code and derivatives; runs in a worker thread.
+    """
+    if picture_json:
+        storage.delete(picture_json['public_id'])
+        storage.delete(qr_public_id(picture_json))
+        delete_derivatives(derivative_name(picture_json), derivatives, storage)
+
+
+async def purge_asset(asset_id: int, storage: StorageBackend, db: Session) -> bool:
+    """
+    Delete an asset, its files, derivatives and the cached edits made from it once no picture references it any more.
+
+    Called after the deletion of a picture has been committed. The row is deleted under its lock
+    and the deletion is committed only once the files are gone, so a storage failure (logged, not
+    raised) leaves an unreferenced row whose files the next upload of the same content deletes. An
+    upload racing with the purge stores its file under new keys, so it never loses it.
+
+    Args:
+        asset_id (int): The ID of the asset of the deleted picture.
+        storage (StorageBackend): The storage backend of the files.
+        db (Session): Database session object.
+
+    Returns:
+        bool: True if the asset and its files were deleted.
+    """
+    asset = await repository_assets.delete_unreferenced_asset(asset_id, db)
+    if asset is None:
+        db.rollback()
+        return False
+    try:
+        if asset.picture_json:
+            await run_in_threadpool(delete_asset_files, asset.picture_json, asset.derivatives, storage)
+            await evict_source_edits(asset.picture_json['public_id'], storage, db)
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Could not delete the files of asset {asset_id}: {e}")
+        return False
+    db.commit()
+    return True
@@ -1,6 +1,5 @@
 from typing import Optional, Dict, Union, Callable, Literal
 
-import redis as redis
 from jose import JWTError, jwt
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
@@ -14,12 +13,10 @@ from starlette.requests import Request
 from src.database.db import get_db
 from src.database.models import User
 from src.repository import users as repository_users
+from src.services.cache import CacheBackend, get_cache
 
 from src.services.secrets_manager import SecretsManager
 
-REDIS_HOST = SecretsManager.get_secret("REDIS_HOST")
-REDIS_PORT = SecretsManager.get_secret("REDIS_PORT")
-REDIS_PASSWORD = SecretsManager.get_secret("REDIS_PASSWORD")
 SECRET_KEY = SecretsManager.get_secret("SECRET_KEY")
 ALGORITHM = SecretsManager.get_secret("ALGORITHM")
 
@@ -33,7 +30,7 @@ class Auth:
         SECRET_KEY (str): Secret key for token encoding and decoding.
         ALGORITHM (str): Algorithm used for token encoding and decoding.
         oauth2_scheme (OAuth2PasswordBearer): OAuth2 password bearer for token retrieval.
-        r (redis.Redis): Redis instance for caching user data.
+        r (CacheBackend): Cache of the current users, selected by ``CACHE_BACKEND``.
     """
 
     def __init__(self, db: Session = Depends(get_db)):
@@ -50,9 +47,7 @@ class Auth:
     SECRET_KEY = SECRET_KEY
     ALGORITHM = ALGORITHM
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    r = redis.Redis(host=REDIS_HOST,
-                    port=REDIS_PORT,
-                    password=REDIS_PASSWORD)
+    r: CacheBackend = get_cache()
 
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         """
@@ -146,6 +141,25 @@ class Auth:
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
+    def token_email(self, token: str, scope: str = "access_token") -> Optional[str]:
+        """
+        Read the email of a token without touching the database.
+
+        Args:
+            token (str): An access or refresh token.
+            scope (str): The scope the token must have.
+
+        Returns:
+            str | None: The email, or None if the token is invalid, expired or of another scope.
+        """
+        try:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+        except JWTError:
+            return None
+        if payload.get("scope") != scope:
+            return None
+        return payload.get("sub")
+
     async def get_current_user(
         self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
     ) -> Dict:
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Optional, Union
+
+from fastapi import BackgroundTasks, HTTPException, status
+from sqlalchemy.orm import Session
+
+from src.database.models import Asset, User
+from src.repository import assets as repository_assets
+from src.repository import pictures as repository_pictures
+from src.schemas import PictureResponse
+from src.services.assets import PreparedAsset, prepare_picture_asset, record_picture_asset
+from src.services.exif import extract_picture_metadata
+from src.services.storage import StorageBackend
+from src.services.uploads import ReceivedUpload, RejectedUpload
+
+
+@dataclass
+class _Entry:
+    index: int
+    upload: ReceivedUpload
+
+
+@dataclass
+class _Work:
+    task: asyncio.Future
+    reuse: bool = False
+    entries: list[_Entry] = field(default_factory=list)
+
+
+class BatchUpload:
+    """
+    Stores the files of a batch upload concurrently and records their pictures in bulk.
+
+    Files are handed over with ``add`` as soon as they are received. A file whose content is
+    already stored is not uploaded again; the others are prepared (stored with their QR code and
+    derivatives) by at most ``concurrency`` tasks at a time, and identical files of the batch share
+    one task. These tasks never touch the database: ``results`` records the assets and inserts the
+    pictures of all the files that completed since the last round with one statement and one commit,
+    then reports them, so the number of round-trips shrinks as the batch gets faster.
+    """
+
+    def __init__(self, user: User, storage: StorageBackend, db: Session, concurrency: int,
+                 background_tasks: Optional[BackgroundTasks] = None):
+        self.user = user
+        self.storage = storage
+        self.db = db
+        self.background_tasks = background_tasks
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._work: dict[str, _Work] = {}
+        self._rejected: list[tuple[int, RejectedUpload]] = []
+        self._count = 0
+
+    async def add(self, upload: Union[ReceivedUpload, RejectedUpload]) -> None:
+        """
+        Start processing a received file (or record its rejection).
+        """
+        index, self._count = self._count, self._count + 1
+        if isinstance(upload, RejectedUpload):
+            self._rejected.append((index, upload))
+            return
+        entry = _Entry(index, upload)
+        work = self._work.get(upload.sha256)
+        if work is None:
+            if await repository_assets.is_asset_stored(upload.sha256, self.db):
+                task = asyncio.get_running_loop().create_future()
+                task.set_result(None)
+                work = _Work(task, reuse=True)
+            else:
+                work = _Work(asyncio.ensure_future(self._prepare(upload)))
+            self._work[upload.sha256] = work
+        else:
+            upload.abort()
+        work.entries.append(entry)
+
+    async def _prepare(self, upload: ReceivedUpload) -> PreparedAsset:
+        async with self._semaphore:
+            return await prepare_picture_asset(upload, self.storage)
+
+    async def cancel(self) -> None:
+        """
+        Stop the pending work and discard the files that were not stored.
+
+        Used when the body turns out to be invalid or the client goes away. Storage calls already
+        running in a thread are waited for, so no file is discarded while it is being written.
+        """
+        for work in self._work.values():
+            work.task.cancel()
+        await asyncio.gather(*(work.task for work in self._work.values()), return_exceptions=True)
+        for work in self._work.values():
+            for entry in work.entries:
+                entry.upload.abort()
+
+    async def results(self) -> AsyncIterator[str]:
+        """
+        Yield one NDJSON line per file as its picture is recorded: ``index`` (position in the body),
+        ``filename``, ``status_code`` and the ``picture`` or the ``detail`` of the error.
+
+        The response is streamed after the endpoint returns, when its ``get_db`` dependency has
+        already closed the session, so the session is closed again once the batch is done.
+        """
+        try:
+            async for line in self._results():
+                yield line
+        finally:
+            await self.cancel()
+            self.db.close()
+
+    async def _results(self) -> AsyncIterator[str]:
+        for index, rejected in self._rejected:
+            yield self._line(index, rejected.filename, rejected.status_code, detail=rejected.detail)
+
+        pending = {work.task: work for work in self._work.values()}
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            recorded, failed = [], []
+            for task in done:
+                work = pending.pop(task)
+                for entry in work.entries:
+                    try:
+                        recorded.append((entry, await self._record(entry, work)))
+                    except HTTPException as e:
+                        failed.append((entry, e.status_code, e.detail))
+                    except Exception as e:
+                        logging.error(f"Could not store batch upload file {entry.upload.filename}: {e}")
+                        failed.append((entry, status.HTTP_500_INTERNAL_SERVER_ERROR, "Could not store the file"))
+
+            for entry, status_code, detail in failed:
+                yield self._line(entry.index, entry.upload.filename, status_code, detail=detail)
+            if not recorded:
+                continue
+            pictures = await repository_pictures.insert_pictures(
+                [dict(picture_url=asset.picture_url, picture_json=asset.picture_json, user_id=self.user.id,
+                      qr_code_picture=asset.qr_code_picture, asset_id=asset.id, phash=asset.phash,
+                      derivatives=asset.derivatives) for _, asset in recorded], self.db)
+            lines = [self._line(entry.index, entry.upload.filename, status.HTTP_201_CREATED,
+                                picture=PictureResponse.model_validate(picture).model_dump(mode="json"))
+                     for (entry, _), picture in zip(recorded, pictures)]
+            self.db.commit()
+            for picture in pictures:
+                if self.background_tasks is not None:
+                    self.background_tasks.add_task(extract_picture_metadata, picture.id, self.storage,
+                                                   self.db.get_bind())
+            for line in lines:
+                yield line
+
+    async def _record(self, entry: _Entry, work: _Work) -> Asset:
+        if work.reuse:
+            asset = await repository_assets.acquire_asset(entry.upload.sha256, self.db)
+            if asset is not None:
+                entry.upload.abort()
+                return asset
+            prepared = await self._prepare(entry.upload)
+        else:
+            prepared = work.task.result()
+        return await record_picture_asset(prepared, self.storage, self.db)
+
+    @staticmethod
+    def _line(index: int, filename: Optional[str], status_code: int, **result) -> str:
+        return json.dumps({"index": index, "filename": filename, "status_code": status_code, **result}) + "\n"
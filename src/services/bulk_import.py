@@ -0,0 +1,319 @@
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.cloudinary import generate_random_string
+from src.conf.config import settings
+from src.database.models import User
+from src.repository import assets as repository_assets
+from src.repository import pictures as repository_pictures
+from src.repository import tags as repository_tags
+from src.services.assets import PreparedAsset, prepare_picture_asset, record_picture_asset
+from src.services.exif import read_metadata
+from src.services.storage import StorageBackend, sniff_image_type
+from src.services.uploads import SNIFF_BYTES, ReceivedUpload, UploadPipeline, allowed_formats
+
+CHUNK_BYTES = 1024 * 1024
+MAX_TAGS = 5
+MAX_TAG_LENGTH = 50
+
+
+@dataclass
+class ScannedFile:
+    """
+    A file of the imported directory, hashed and checked by ``scan_file``.
+
+    ``error`` is set (and the other fields may be None) when the file cannot be imported.
+    """
+    path: str
+    sha256: Optional[str] = None
+    size: int = 0
+    metadata: Optional[dict] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class ImportReport:
+    """
+    Counts of an ``import_directory`` run.
+    """
+    imported: int = 0
+    skipped: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """
+        Imported images per second.
+        """
+        return self.imported / self.seconds if self.seconds else 0.0
+
+
+def scan_file(path: str, max_bytes: int, formats: set[str]) -> ScannedFile:
+    """
+    Hash a file and read its image metadata; run in the worker processes of ``import_directory``.
+
+    Args:
+        path (str): Path of the file.
+        max_bytes (int): Largest accepted file.
+        formats (set[str]): Accepted image formats.
+
+    Returns:
+        ScannedFile: The content hash, size and metadata of the file, or why it is not imported.
+    """
+    size = os.path.getsize(path)
+    if size > max_bytes:
+        return ScannedFile(path, size=size, error=f"larger than {max_bytes} bytes")
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        sniffed = sniff_image_type(f.read(SNIFF_BYTES))
+        if sniffed is None or sniffed[0] not in formats:
+            return ScannedFile(path, size=size, error="not an allowed image")
+        f.seek(0)
+        while chunk := f.read(CHUNK_BYTES):
+            sha256.update(chunk)
+        f.seek(0)
+        try:
+            metadata = read_metadata(f)
+        except Exception as e:
+            return ScannedFile(path, size=size, error=f"unreadable image: {e}")
+    return ScannedFile(path, sha256.hexdigest(), size, metadata)
+
+
+def walk_images(root: str) -> Iterator[str]:
+    """
+    Yield the paths of the files under ``root`` in a stable order, skipping hidden files and directories.
+    """
+    for directory, directories, files in os.walk(root):
+        directories[:] = sorted(name for name in directories if not name.startswith("."))
+        for name in sorted(files):
+            if not name.startswith("."):
+                yield os.path.join(directory, name)
+
+
+def path_tags(root: str, path: str, tags: list[str], directory_tags: bool) -> list[str]:
+    """
+    Return the tags of an imported file: ``tags`` then, with ``directory_tags``, the directories between ``root`` and the file.
+    """
+    names = list(tags)
+    if directory_tags:
+        names += os.path.relpath(os.path.dirname(path), root).split(os.sep)
+    names = [name.strip()[:MAX_TAG_LENGTH] for name in names if name.strip() and name != "."]
+    return list(dict.fromkeys(names))[:MAX_TAGS]
+
+
+class Checkpoint:
+    """
+    Paths already handled by previous runs, appended to a file after every committed batch.
+
+    Imported files are found again by their content hash anyway; the checkpoint spares a resumed
+    run from hashing them again.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.done: set[str] = set()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.done = {line.rstrip("\n") for line in f if line.strip()}
+
+    def add(self, paths: list[str]) -> None:
+        self.done.update(paths)
+        if self.path and paths:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(f"{path}\n" for path in paths)
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def _receive(scanned: ScannedFile, storage: StorageBackend, formats: set[str]) -> ReceivedUpload:
+    pipeline = UploadPipeline(storage.writer("picture", generate_random_string()), scanned.size + 1, formats)
+    try:
+        with open(scanned.path, "rb") as f:
+            while chunk := f.read(CHUNK_BYTES):
+                pipeline.write(chunk)
+        pipeline.close()
+    except BaseException:
+        pipeline.writer.abort()
+        raise
+    return ReceivedUpload(stored=None, sha256=pipeline.sha256.hexdigest(), size=pipeline.size,
+                          image_format=pipeline.image_format, filename=os.path.basename(scanned.path),
+                          writer=pipeline.writer)
+
+
+async def _store(scanned: ScannedFile, storage: StorageBackend, formats: set[str],
+                 semaphore: asyncio.Semaphore) -> PreparedAsset:
+    async with semaphore:
+        upload = await run_in_threadpool(_receive, scanned, storage, formats)
+        try:
+            return await prepare_picture_asset(upload, storage)
+        finally:
+            upload.abort()
+
+
+async def import_batch(files: list[ScannedFile], root: str, user: User, storage: StorageBackend, db: Session,
+                       tags: list[str], directory_tags: bool, semaphore: asyncio.Semaphore,
+                       report: ImportReport) -> list[str]:
+    """
+    Import a batch of scanned files with one picture insert, one tag insert and one commit.
+
+    Files that cannot be imported or whose content is already stored are skipped; repeated content
+    within the batch is imported once. New files go through the same storage, QR code, derivative
+    and perceptual hash pipeline as ``/api/pictures/upload``, ``semaphore`` of them at a time.
+
+    Args:
+        files (list[ScannedFile]): The scanned files.
+        root (str): The imported directory.
+        user (User): The owner of the new pictures.
+        storage (StorageBackend): Where the files are stored.
+        db (Session): Database session object.
+        tags (list[str]): Tags of every new picture.
+        directory_tags (bool): Also tag pictures with the names of their directories.
+        semaphore (asyncio.Semaphore): Limits the files stored at the same time.
+        report (ImportReport): Updated with the counts of the batch.
+
+    Returns:
+        list[str]: The paths that are done (imported or skipped); failed files are left for the next run.
+    """
+    done, new = [], {}
+    stored = await repository_assets.stored_hashes([f.sha256 for f in files if f.error is None], db)
+    for scanned in files:
+        if scanned.error is not None:
+            logging.error(f"Skipping {scanned.path}: {scanned.error}")
+        if scanned.error is not None or scanned.sha256 in stored or scanned.sha256 in new:
+            report.skipped += 1
+            done.append(scanned.path)
+        else:
+            new[scanned.sha256] = scanned
+    if not new:
+        return done
+
+    formats = allowed_formats()
+    prepared = await asyncio.gather(*(_store(scanned, storage, formats, semaphore) for scanned in new.values()),
+                                    return_exceptions=True)
+    rows, imported = [], []
+    for scanned, result in zip(new.values(), prepared):
+        if isinstance(result, BaseException):
+            logging.error(f"Could not import {scanned.path}: {result}")
+            report.failed += 1
+            continue
+        asset = await record_picture_asset(result, storage, db)
+        rows.append(dict(picture_url=asset.picture_url, picture_json=asset.picture_json, user_id=user.id,
+                         qr_code_picture=asset.qr_code_picture, asset_id=asset.id, phash=asset.phash,
+                         derivatives=asset.derivatives, **scanned.metadata))
+        imported.append(scanned)
+
+    pictures = await repository_pictures.insert_pictures(rows, db)
+    names = {scanned.path: path_tags(root, scanned.path, tags, directory_tags) for scanned in imported}
+    tag_ids = await repository_tags.get_or_create_tags([name for value in names.values() for name in value], db)
+    await repository_tags.add_picture_tags([(picture.id, tag_ids[name]) for picture, scanned in zip(pictures, imported)
+                                            for name in names[scanned.path]], db)
+    db.commit()
+    report.imported += len(pictures)
+    return done + [scanned.path for scanned in imported]
+
+
+async def import_directory(root: str, user: User, storage: StorageBackend, db: Session, tags: Optional[list[str]] = None,
+                           directory_tags: bool = False, batch_size: int = 200, workers: int = 4,
+                           checkpoint: Optional[str] = None, executor: Optional[Executor] = None,
+                           progress: bool = False) -> ImportReport:
+    """
+    Import the images of a directory tree as pictures of a user.
+
+    The files are hashed (and their metadata read) by ``executor``, a process pool by default, while
+    the previous batch is stored and inserted. Each batch is committed before its paths are added to
+    the ``checkpoint`` file, so an interrupted import resumes after the last committed batch.
+
+    Args:
+        root (str): The directory to import.
+        user (User): The owner of the new pictures.
+        storage (StorageBackend): Where the files are stored.
+        db (Session): Database session object.
+        tags (list[str], optional): Tags of every new picture.
+        directory_tags (bool): Also tag pictures with the names of their directories.
+        batch_size (int): Files per database batch.
+        workers (int): Processes hashing files, and files stored at the same time.
+        checkpoint (str, optional): File recording the paths already handled.
+        executor (Executor, optional): Runs ``scan_file``; a pool of ``workers`` processes if not given.
+        progress (bool): Print the progress and throughput after every batch.
+
+    Returns:
+        ImportReport: The number of imported, skipped and failed files, and the time taken.
+    """
+    started = time.perf_counter()
+    report = ImportReport()
+    done = Checkpoint(checkpoint)
+    paths = [os.path.abspath(path) for path in walk_images(root)]
+    paths = [path for path in paths if path not in done.done]
+    semaphore = asyncio.Semaphore(workers)
+    own_executor = executor is None
+    executor = executor or ProcessPoolExecutor(max_workers=workers)
+    loop = asyncio.get_running_loop()
+    max_bytes, formats = settings.upload_max_bytes, allowed_formats()
+
+    def scan(batch: list[str]) -> asyncio.Future:
+        return asyncio.gather(*(loop.run_in_executor(executor, scan_file, path, max_bytes, formats) for path in batch))
+
+    try:
+        batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+        scanning = scan(batches[0]) if batches else None
+        for i in range(len(batches)):
+            files = await scanning
+            scanning = scan(batches[i + 1]) if i + 1 < len(batches) else None
+            done.add(await import_batch(files, os.path.abspath(root), user, storage, db, tags or [], directory_tags,
+                                        semaphore, report))
+            report.seconds = time.perf_counter() - started
+            if progress:
+                handled = report.imported + report.skipped + report.failed
+                print(f"{handled}/{len(paths)} files: {report.imported} imported, {report.skipped} skipped, "
+                      f"{report.failed} failed, {report.rate:.1f} images/s", flush=True)
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Import a directory of images as pictures of a user.")
+    parser.add_argument("directory")
+    parser.add_argument("--user", required=True, help="Email of the owner of the pictures.")
+    parser.add_argument("--tag", action="append", default=[], help="Tag every picture (repeatable).")
+    parser.add_argument("--directory-tags", action="store_true", help="Tag pictures with their directory names.")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--checkpoint", default=None,
+                        help="Progress file of the import (default: .import-checkpoint in the directory).")
+    args = parser.parse_args(argv)
+
+    from src.database.db import SessionLocal
+    from src.services import derivatives
+    from src.services.storage import get_storage
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == args.user).first()
+        if user is None:
+            parser.error(f"No user with email {args.user}")
+        report = asyncio.run(import_directory(
+            args.directory, user, get_storage(), db, args.tag, args.directory_tags, args.batch_size, args.workers,
+            args.checkpoint or os.path.join(args.directory, ".import-checkpoint"), progress=True))
+        print(f"Imported {report.imported} pictures ({report.skipped} skipped, {report.failed} failed) "
+              f"in {report.seconds:.1f}s: {report.rate:.1f} images/s")
+    finally:
+        db.close()
+        derivatives.shutdown()
+
+
+if __name__ == "__main__":
+    main()
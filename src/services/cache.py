@@ -0,0 +1,253 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Optional, Tuple
+
+import redis
+
+from src.conf.config import settings
+from src.services.metrics import metrics
+from src.services.secrets_manager import SecretsManager
+
+# KEYS[1]: bucket; ARGV: refill rate (tokens/s), burst, cost. Returns {allowed, tokens, retry_after}
+# as strings, since Lua numbers are truncated to integers in replies.
+TOKEN_BUCKET = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed, retry_after = 0, (cost - tokens) / rate
+if tokens >= cost then
+    allowed, tokens, retry_after = 1, tokens - cost, 0
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+
+class CacheBackend:
+    """
+    Interface of the key-value stores behind the user cache and the rate limiter.
+
+    The methods are the subset of the ``redis.Redis`` client the app uses, with the same
+    signatures, so a Redis client and an in-process store are interchangeable.
+    """
+    name = ""
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ex: Optional[float] = None) -> bool:
+        """
+        Store a value, expiring after ``ex`` seconds if given.
+        """
+        raise NotImplementedError
+
+    def expire(self, key: str, seconds: float) -> bool:
+        """
+        Make a key expire after ``seconds``; False if it does not exist.
+        """
+        raise NotImplementedError
+
+    def delete(self, *keys: str) -> int:
+        raise NotImplementedError
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        """
+        Add ``amount`` to a counter (created at 0) and return its new value.
+        """
+        raise NotImplementedError
+
+    def take(self, key: str, rate: float, burst: float, cost: float) -> Tuple[bool, float, float]:
+        """
+        Atomically take ``cost`` tokens from a token bucket refilled at ``rate`` tokens per second up
+        to ``burst`` (a new bucket is full).
+
+        Returns:
+            tuple: Whether the tokens were taken, the tokens left, and the seconds until ``cost``
+            tokens are available (0 when taken).
+        """
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """
+    A thread-safe in-process cache with per-key expiry, bounded to ``max_entries`` by evicting the
+    least recently used key.
+
+    Expired keys are dropped when they are read or evicted. Each worker process has its own copy,
+    so this suits single-node deployments and tests, or an L1 in front of Redis. Hits, misses and
+    evictions are counted in ``cache.{name}.*`` metrics.
+    """
+    name = "memory"
+
+    def __init__(self, max_entries: int = 10000, name: Optional[str] = None):
+        self.max_entries = max_entries
+        self.name = name or self.name
+        self._entries: OrderedDict[str, tuple[Any, Optional[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, key: str):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._entries[key]
+            return None
+        return entry
+
+    def _store(self, key: str, value: Any, expires_at: Optional[float]) -> None:
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            metrics.inc(f"cache.{self.name}.evictions")
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                metrics.inc(f"cache.{self.name}.misses")
+                return None
+            self._entries.move_to_end(key)
+        metrics.inc(f"cache.{self.name}.hits")
+        return entry[0]
+
+    def set(self, key: str, value: Any, ex: Optional[float] = None) -> bool:
+        with self._lock:
+            self._store(key, value, time.monotonic() + ex if ex is not None else None)
+        return True
+
+    def expire(self, key: str, seconds: float) -> bool:
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return False
+            self._entries[key] = (entry[0], time.monotonic() + seconds)
+        return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(self._entries.pop(key, None) is not None for key in keys)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            entry = self._live(key)
+            value, expires_at = (int(entry[0]), entry[1]) if entry is not None else (0, None)
+            self._store(key, value + amount, expires_at)
+        return value + amount
+
+    def take(self, key: str, rate: float, burst: float, cost: float) -> Tuple[bool, float, float]:
+        with self._lock:
+            now = time.monotonic()
+            entry = self._live(key)
+            tokens, ts = entry[0] if entry is not None else (burst, now)
+            tokens = min(burst, tokens + (now - ts) * rate)
+            taken = tokens >= cost
+            if taken:
+                tokens -= cost
+            self._store(key, (tokens, now), now + burst / rate)
+        return taken, tokens, 0.0 if taken else (cost - tokens) / rate
+
+
+class RedisCache(CacheBackend):
+    """
+    A cache shared by every worker and node, in Redis.
+    """
+    name = "redis"
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+        self._token_bucket = client.register_script(TOKEN_BUCKET)
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.client.get(key)
+        metrics.inc("cache.redis.misses" if value is None else "cache.redis.hits")
+        return value
+
+    def set(self, key: str, value: Any, ex: Optional[float] = None) -> bool:
+        return bool(self.client.set(key, value, px=int(ex * 1000) if ex is not None else None))
+
+    def expire(self, key: str, seconds: float) -> bool:
+        return bool(self.client.pexpire(key, int(seconds * 1000)))
+
+    def delete(self, *keys: str) -> int:
+        return self.client.delete(*keys)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        return self.client.incr(key, amount)
+
+    def take(self, key: str, rate: float, burst: float, cost: float) -> Tuple[bool, float, float]:
+        taken, tokens, retry_after = self._token_bucket(keys=[key], args=[rate, burst, cost])
+        return bool(taken), float(tokens), float(retry_after)
+
+
+class TwoTierCache(CacheBackend):
+    """
+    An in-process L1 in front of a shared L2 (Redis).
+
+    Reads are answered from L1 when possible, otherwise from L2 and kept in L1 for at most
+    ``local_ttl`` seconds; writes go to both. A key changed or deleted through another worker or
+    node is therefore seen here after ``local_ttl`` seconds at worst. Counters and token buckets
+    live in L2 only, so they are shared.
+    """
+    name = "two-tier"
+
+    def __init__(self, local: MemoryCache, remote: CacheBackend, local_ttl: float = 5.0):
+        self.local = local
+        self.remote = remote
+        self.local_ttl = local_ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.local.get(key)
+        if value is None:
+            value = self.remote.get(key)
+            if value is not None:
+                self.local.set(key, value, ex=self.local_ttl)
+        return value
+
+    def set(self, key: str, value: Any, ex: Optional[float] = None) -> bool:
+        stored = self.remote.set(key, value, ex=ex)
+        self.local.set(key, value, ex=min(ex, self.local_ttl) if ex is not None else self.local_ttl)
+        return stored
+
+    def expire(self, key: str, seconds: float) -> bool:
+        self.local.expire(key, min(seconds, self.local_ttl))
+        return self.remote.expire(key, seconds)
+
+    def delete(self, *keys: str) -> int:
+        self.local.delete(*keys)
+        return self.remote.delete(*keys)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        return self.remote.incr(key, amount)
+
+    def take(self, key: str, rate: float, burst: float, cost: float) -> Tuple[bool, float, float]:
+        return self.remote.take(key, rate, burst, cost)
+
+
+def redis_client() -> redis.Redis:
+    """
+    Return a client of the Redis server given by the ``REDIS_*`` secrets.
+    """
+    return redis.Redis(host=SecretsManager.get_secret("REDIS_HOST"),
+                       port=SecretsManager.get_secret("REDIS_PORT"),
+                       password=SecretsManager.get_secret("REDIS_PASSWORD"))
+
+
+@lru_cache
+def get_cache() -> CacheBackend:
+    """
+    Return the cache backend selected by ``CACHE_BACKEND``: "redis", "memory" or "two-tier".
+    """
+    if settings.cache_backend == "memory":
+        return MemoryCache(settings.cache_max_entries)
+    if settings.cache_backend == "redis":
+        return RedisCache(redis_client())
+    if settings.cache_backend == "two-tier":
+        return TwoTierCache(MemoryCache(settings.cache_max_entries, name="local"), RedisCache(redis_client()),
+                            settings.cache_local_ttl)
+    raise ValueError(f"Unknown cache backend: {settings.cache_backend}")
@@ -0,0 +1,190 @@
+import asyncio
+import io
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Union
+
+from PIL import Image, ImageOps
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.config import settings
+from src.database.models import Picture
+from src.repository import pictures as repository_pictures
+from src.services.storage import StorageBackend
+
+WIDTHS = Picture.DERIVATIVE_WIDTHS
+FORMATS = {"webp": ("WEBP", {"quality": 80, "method": 4}), "jpeg": ("JPEG", {"quality": 82, "progressive": True})}
+
+FOLDER = "derivatives"
+ORIENTATION = 0x0112
+
+_pool: Optional[ProcessPoolExecutor] = None
+_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _downscale(image: Image.Image, width: int) -> Image.Image:
+    """
+    Shrink an image to ``width``, first by an integer factor with ``reduce`` (a cheap box filter)
+    while it stays at least twice the target, then with a Lanczos resize for the last step.
+    """
+    factor = image.width // (width * 2)
+    if factor >= 2:
+        image = image.reduce(factor)
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def render_derivatives(source: Union[bytes, str]) -> dict[str, dict[int, bytes]]:
+    """
+    Encode the responsive sizes of an image; runs in a worker process.
+
+    JPEG sources are decoded at a reduced scale (``draft``) when the largest size allows it, and
+    each smaller size is derived from the previous one, so a 12 MP photo is only decoded once and
+    mostly at a fraction of its resolution. The image is rotated upright according to its EXIF
+    orientation, and the widths apply to the upright image. Sizes wider than the source are skipped.
+
+    Args:
+        source (bytes | str): The encoded source image, or the path of a file holding it.
+
+    Returns:
+        dict[str, dict[int, bytes]]: Encoded images by format (``webp``, ``jpeg``) and width.
+    """
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as opened:
+        rotated = opened.getexif().get(ORIENTATION, 1) in (5, 6, 7, 8)
+        width, height = (opened.height, opened.width) if rotated else opened.size
+        widths = [target for target in sorted(WIDTHS, reverse=True) if target < width] or [width]
+        draft = (widths[0], widths[0] * height // max(width, 1))
+        opened.draft("RGB", draft[::-1] if rotated else draft)
+        upright = ImageOps.exif_transpose(opened)
+        image = upright.convert("RGBA" if "A" in upright.getbands() or "transparency" in upright.info else "RGB")
+
+    rendered: dict[str, dict[int, bytes]] = {image_format: {} for image_format in FORMATS}
+    for width in widths:
+        if image.width > width:
+            image = _downscale(image, width)
+        for image_format, (pil_format, options) in FORMATS.items():
+            output = io.BytesIO()
+            (image.convert("RGB") if pil_format == "JPEG" else image).save(output, format=pil_format, **options)
+            rendered[image_format][width] = output.getvalue()
+    return rendered
+
+
+def _executor() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if _pool is None and settings.derivatives_workers > 0:
+        _pool = ProcessPoolExecutor(max_workers=settings.derivatives_workers)
+    return _pool
+
+
+def shutdown() -> None:
+    """
+    Stop the worker processes; called on application shutdown.
+    """
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+async def render_in_worker(source: Union[bytes, str]) -> dict[str, dict[int, bytes]]:
+    """
+    Run ``render_derivatives`` in the process pool of ``DERIVATIVES_WORKERS`` processes (in a
+    thread when it is 0), so it neither blocks the event loop nor competes for the GIL with
+    request handling. Pass a path rather than bytes for large files: only it is sent to the worker.
+    """
+    executor = _executor()
+    if executor is None:
+        return await run_in_threadpool(render_derivatives, source)
+    return await asyncio.get_running_loop().run_in_executor(executor, render_derivatives, source)
+
+
+async def store_derivatives(rendered: dict[str, dict[int, bytes]], name: str,
+                            storage: StorageBackend) -> dict[str, dict[str, str]]:
+    """
+    Store rendered derivatives in the ``derivatives`` folder, all at once in worker threads.
+
+    Args:
+        rendered (dict[str, dict[int, bytes]]): As returned by ``render_derivatives``.
+        name (str): Base name of the stored files, e.g. the name of the picture file.
+        storage (StorageBackend): Where the derivatives are stored.
+
+    Returns:
+        dict[str, dict[str, str]]: URLs by format and width, as kept in ``Picture.derivatives``.
+    """
+    sizes = [(image_format, width, encoded) for image_format, encoded_sizes in rendered.items()
+             for width, encoded in encoded_sizes.items()]
+    stored = await asyncio.gather(*(run_in_threadpool(storage.put, encoded, FOLDER, f"{name}_{width}_{image_format}")
+                                    for image_format, width, encoded in sizes))
+    derivatives: dict[str, dict[str, str]] = {}
+    for (image_format, width, _), result in zip(sizes, stored):
+        derivatives.setdefault(image_format, {})[str(width)] = storage.url(result["public_id"],
+                                                                          version=result.get("version"))
+    return derivatives
+
+
+async def create_derivatives(data: bytes, name: str, storage: StorageBackend) -> dict[str, dict[str, str]]:
+    """
+    Render the responsive sizes of a picture in a worker process and store them in the ``derivatives`` folder.
+
+    Args:
+        data (bytes): The encoded picture.
+        name (str): Base name of the stored files, e.g. the name of the picture file.
+        storage (StorageBackend): Where the derivatives are stored.
+
+    Returns:
+        dict[str, dict[str, str]]: URLs by format and width, as kept in ``Picture.derivatives``.
+    """
+    return await store_derivatives(await render_in_worker(data), name, storage)
+
+
+def derivative_name(picture_json: dict) -> str:
+    """
+    Return the base name of the derivatives of a stored picture file.
+    """
+    return os.path.basename(picture_json["public_id"])
+
+
+def delete_derivatives(name: str, derivatives: Optional[dict], storage: StorageBackend) -> None:
+    """
+    Delete the stored files listed in ``derivatives`` (as returned by ``create_derivatives``).
+    """
+    for image_format, urls in (derivatives or {}).items():
+        for width in urls:
+            storage.delete(f"{FOLDER}/{name}_{width}_{image_format}")
+
+
+async def ensure_derivatives(picture: Picture, storage: StorageBackend, db: Session) -> dict[str, dict[str, str]]:
+    """
+    Return the derivatives of a picture, generating them first if it has none yet.
+
+    Pictures uploaded before derivatives existed get them on the first request. Concurrent requests
+    for the same file wait for a single generation instead of each rendering it, and a picture whose
+    asset already has derivatives (generated through another picture) just takes them.
+
+    Args:
+        picture (Picture): The picture; must have a stored file.
+        storage (StorageBackend): The storage backend of the file.
+        db (Session): Database session object.
+
+    Returns:
+        dict[str, dict[str, str]]: URLs by format and width.
+    """
+    if picture.derivatives:
+        return picture.derivatives
+    source = picture.picture_json
+    lock = _locks.get(source["public_id"])
+    if lock is None:
+        lock = _locks[source["public_id"]] = asyncio.Lock()
+    async with lock:
+        db.refresh(picture)
+        if picture.derivatives:
+            return picture.derivatives
+        if picture.asset is not None and picture.asset.derivatives:
+            derivatives = picture.asset.derivatives
+        else:
+            data = await run_in_threadpool(storage.get, source["public_id"])
+            derivatives = await create_derivatives(data, derivative_name(source), storage)
+        await repository_pictures.set_picture_derivatives(picture, derivatives, db)
+    return derivatives
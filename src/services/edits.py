@@ -0,0 +1,98 @@
+import logging
+import time
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.config import settings
+from src.database.models import CachedEdit, Picture
+from src.repository import edits as repository_edits
+from src.services.metrics import metrics
+from src.services.qr import generate_qr_and_upload, qr_public_id
+from src.services.storage import StorageBackend
+from src.services.transform import transform_picture
+
+
+async def edit_picture_cached(picture: Picture, transformation: list[dict], storage: StorageBackend,
+                              db: Session) -> tuple[dict, str, str]:
+    """
+    Apply an edit to a picture, reusing the stored result of an identical earlier edit.
+
+    Results are cached by the source file (public id and version) and the canonical transformation,
+    and stored under a name derived from both, so they are immutable and shared by every picture
+    with the same file. A hit costs one lookup: no transformation, upload or QR code. A miss
+    renders the edit, records it with the time it took and, every tenth of ``EDIT_CACHE_MAX_ENTRIES``
+    recorded edits, evicts the least recently used entries beyond it. The entry is committed with the
+    caller's update of the picture.
+
+    Hits, misses and the saved time are counted in ``edit_cache.*`` metrics.
+
+    Args:
+        picture (Picture): The picture to edit.
+        transformation (list[dict]): The effects, as built by ``parse_transform_effects``.
+        storage (StorageBackend): The storage backend holding the picture.
+        db (Session): Database session object.
+
+    Returns:
+        tuple[dict, str, str]: The storage response, URL and QR code URL of the edited picture.
+
+    Raises:
+        NotImplementedError: If the edit needs a backend that cannot transform.
+    """
+    source = picture.picture_json
+    canonical, key = repository_edits.canonical_transformation(transformation)
+    cached = await repository_edits.get_cached_edit(source['public_id'], source['version'], key, db)
+    if cached is not None:
+        metrics.inc("edit_cache.hits")
+        metrics.inc("edit_cache.saved_seconds", cached.render_ms / 1000)
+        return cached.picture_edited_json, cached.picture_edited_url, cached.qr_code_picture_edited
+
+    metrics.inc("edit_cache.misses")
+    started = time.perf_counter()
+    picture_edited = await transform_picture(storage, source['public_id'], canonical,
+                                             f"{source['public_id']}_{key[:16]}_edited", version=source['version'])
+    picture_edited_url = storage.url(picture_edited['public_id'], version=source['version'])
+    qr = await generate_qr_and_upload(picture_edited_url, storage, picture_edited, source['version'])
+    render_ms = (time.perf_counter() - started) * 1000
+    metrics.inc("edit_cache.render_seconds", render_ms / 1000)
+
+    if await repository_edits.store_cached_edit(source['public_id'], source['version'], key, canonical,
+                                                picture_edited, picture_edited_url, qr, render_ms, db):
+        await _evict_in_batches(storage, db)
+    return picture_edited, picture_edited_url, qr
+
+
+_stored_since_eviction = 0
+
+
+async def _evict_in_batches(storage: StorageBackend, db: Session) -> None:
+    """
+    Evict the least recently used edits once every tenth of ``EDIT_CACHE_MAX_ENTRIES`` stored edits
+    (counted per process), so a miss does not count the whole cache. Between two rounds the cache
+    may hold that many entries over the limit.
+    """
+    global _stored_since_eviction
+    _stored_since_eviction += 1
+    if _stored_since_eviction < max(1, settings.edit_cache_max_entries // 10):
+        return
+    _stored_since_eviction = 0
+    await run_in_threadpool(_delete_files, await repository_edits.pop_least_recently_used(
+        settings.edit_cache_max_entries, db), storage)
+
+
+async def evict_source_edits(public_id: str, storage: StorageBackend, db: Session) -> None:
+    """
+    Drop the cached edits of a picture file that is no longer used, and delete their files.
+    The deletion of the entries is committed by the caller.
+    """
+    await run_in_threadpool(_delete_files, await repository_edits.pop_source_edits(public_id, db), storage)
+
+
+def _delete_files(entries: list[CachedEdit], storage: StorageBackend) -> None:
+    for cached in entries:
+        metrics.inc("edit_cache.evictions")
+        try:
+            storage.delete(cached.picture_edited_json['public_id'])
+            storage.delete(qr_public_id(cached.picture_edited_json))
+        except Exception as e:
+            logging.error(f"Could not delete the files of cached edit {cached.id}: {e}")
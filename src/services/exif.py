@@ -0,0 +1,195 @@
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import BinaryIO, Callable, Optional
+
+from PIL import ExifTags, Image, UnidentifiedImageError
+from sqlalchemy import select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from src.database.models import Picture
+from src.services.storage import StorageBackend
+
+METADATA_FIELDS = ("width", "height", "taken_at", "camera_make", "camera_model", "lens_model", "orientation",
+                   "gps_latitude", "gps_longitude")
+DATE_FORMAT = "%Y:%m:%d %H:%M:%S"
+
+
+def _text(value, max_length: int = 64) -> Optional[str]:
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", "replace")
+    if not isinstance(value, str):
+        return None
+    return value.replace("\x00", "").strip()[:max_length] or None
+
+
+def _date(value) -> Optional[datetime]:
+    try:
+        return datetime.strptime(_text(value) or "", DATE_FORMAT)
+    except ValueError:
+        return None
+
+
+def _degrees(value, reference) -> Optional[float]:
+    try:
+        degrees, minutes, seconds = (float(part) for part in value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    decimal = degrees + minutes / 60 + seconds / 3600
+    return -decimal if _text(reference) in ("S", "W") else decimal
+
+
+def read_metadata(f: BinaryIO) -> dict:
+    """
+    Read the dimensions and EXIF metadata of an image without decoding its pixels.
+
+    Pillow only parses the headers when an image is opened (the EXIF segment of a JPEG sits before
+    the pixel data), so this reads a few kilobytes of the file. PNG EXIF stored after the pixels is
+    not read, since reaching it would mean decoding the image.
+
+    Args:
+        f (BinaryIO): The open image file.
+
+    Returns:
+        dict: The values of ``METADATA_FIELDS``; missing or invalid tags are None.
+    """
+    with Image.open(f) as image:
+        width, height = image.size
+        if image.format == "PNG" and "exif" not in image.info:
+            exif = Image.Exif()
+        else:
+            exif = image.getexif()
+
+    details = exif.get_ifd(ExifTags.IFD.Exif)
+    gps = exif.get_ifd(ExifTags.IFD.GPSInfo)
+    orientation = exif.get(ExifTags.Base.Orientation)
+    if not isinstance(orientation, int) or not 1 <= orientation <= 8:
+        orientation = None
+    if orientation in (5, 6, 7, 8):
+        width, height = height, width
+
+    latitude = _degrees(gps.get(ExifTags.GPS.GPSLatitude), gps.get(ExifTags.GPS.GPSLatitudeRef))
+    longitude = _degrees(gps.get(ExifTags.GPS.GPSLongitude), gps.get(ExifTags.GPS.GPSLongitudeRef))
+    if latitude is None or longitude is None or abs(latitude) > 90 or abs(longitude) > 180:
+        latitude = longitude = None
+
+    return {
+        "width": width,
+        "height": height,
+        "taken_at": _date(details.get(ExifTags.Base.DateTimeOriginal) or exif.get(ExifTags.Base.DateTime)),
+        "camera_make": _text(exif.get(ExifTags.Base.Make)),
+        "camera_model": _text(exif.get(ExifTags.Base.Model)),
+        "lens_model": _text(details.get(ExifTags.Base.LensModel), 128),
+        "orientation": orientation,
+        "gps_latitude": latitude,
+        "gps_longitude": longitude,
+    }
+
+
+def read_stored_metadata(storage: StorageBackend, public_id: str) -> Optional[dict]:
+    """
+    Read the metadata of a stored file, or None (logged) if it cannot be read.
+    """
+    try:
+        with storage.open(public_id) as f:
+            return read_metadata(f)
+    except (FileNotFoundError, UnidentifiedImageError, OSError, ValueError) as e:
+        logging.error(f"Could not read the metadata of {public_id}: {e}")
+        return None
+
+
+async def extract_picture_metadata(picture_id: int, storage: StorageBackend, bind: Engine | Connection) -> None:
+    """
+    Store the metadata of a picture's file in its columns; run as a background task after upload.
+
+    The task runs once the response is sent, so it uses its own session on the engine of the
+    request's session (``db.get_bind()``) instead of the request's one.
+
+    Args:
+        picture_id (int): The ID of the picture.
+        storage (StorageBackend): The storage backend of the file.
+        bind (Engine | Connection): What the request's session was bound to.
+    """
+    with Session(bind) as db:
+        picture = db.get(Picture, picture_id)
+        if picture is None or not picture.picture_json:
+            return
+        metadata = await run_in_threadpool(read_stored_metadata, storage, picture.picture_json["public_id"])
+        if metadata is None:
+            return
+        for field, value in metadata.items():
+            setattr(picture, field, value)
+        db.commit()
+
+
+def backfill(db: Session, open_file: Callable[[Picture], BinaryIO], batch_size: int = 500, workers: int = 8) -> int:
+    """
+    Extract the missing metadata of stored pictures.
+
+    Args:
+        db (Session): Database session object.
+        open_file (Callable[[Picture], BinaryIO]): Opens the file of a picture.
+        batch_size (int): Pictures read and committed per batch.
+        workers (int): Threads reading files in parallel.
+
+    Returns:
+        int: The number of pictures that got metadata.
+    """
+    def read(picture):
+        try:
+            with open_file(picture) as f:
+                return read_metadata(f)
+        except Exception as e:
+            logging.error(f"Could not read the metadata of picture {picture.id}: {e}")
+            return None
+
+    extracted, last_id = 0, 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            pictures = db.execute(select(Picture).where(Picture.width.is_(None), Picture.id > last_id)
+                                  .order_by(Picture.id).limit(batch_size)).scalars().all()
+            if not pictures:
+                return extracted
+            for picture, metadata in zip(pictures, executor.map(read, pictures)):
+                if metadata is not None:
+                    for field, value in metadata.items():
+                        setattr(picture, field, value)
+                    extracted += 1
+            db.commit()
+            last_id = pictures[-1].id
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Extract the metadata of pictures uploaded before extraction existed.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    import io
+    import urllib.request
+    from src.database.db import SessionLocal
+    from src.services.storage import get_storage
+
+    storage = get_storage()
+
+    def open_file(picture: Picture) -> BinaryIO:
+        if picture.picture_json and picture.picture_json.get("public_id"):
+            return storage.open(picture.picture_json["public_id"])
+        with urllib.request.urlopen(picture.picture_url) as response:
+            return io.BytesIO(response.read())
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        extracted = backfill(db, open_file, args.batch_size, args.workers)
+        print(f"Extracted the metadata of {extracted} pictures in {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import csv
+import io
+import json
+import tarfile
+import tempfile
+import time
+from datetime import date, datetime
+from typing import Iterable, Iterator, Literal, Optional
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.repository.export import export_records
+
+FORMATS = {"ndjson": "application/x-ndjson", "tar": "application/x-tar"}
+ExportFormat = Literal["ndjson", "tar"]
+SPOOL_BYTES = 1024 * 1024
+CHUNK_BYTES = 64 * 1024
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _line(record: dict) -> bytes:
+    return json.dumps(record, default=_default, ensure_ascii=False).encode() + b"\n"
+
+
+def ndjson_stream(records: Iterable[tuple[str, dict]]) -> Iterator[bytes]:
+    """
+    Encode exported records as NDJSON, one object per line with its section in ``type``.
+
+    Lines are grouped into chunks of about ``CHUNK_BYTES`` so the response is not sent row by row.
+    """
+    chunk = bytearray()
+    for section, record in records:
+        chunk += _line({"type": section, **record})
+        if len(chunk) >= CHUNK_BYTES:
+            yield bytes(chunk)
+            chunk.clear()
+    if chunk:
+        yield bytes(chunk)
+
+
+def tar_stream(records: Iterable[tuple[str, dict]], prefix: str = "export") -> Iterator[bytes]:
+    """
+    Encode exported records as a tar archive with one ``{prefix}/{section}.ndjson`` member per section.
+
+    A tar header carries the size of its member, so each section is written to a temporary file
+    (kept in memory up to ``SPOOL_BYTES``) and sent once complete. Memory therefore stays bounded
+    however many rows a section has; the archive is written by hand instead of with
+    ``tarfile.TarFile`` so that every block can be yielded as soon as it is ready.
+    """
+    def member(section: str, spool) -> Iterator[bytes]:
+        info = tarfile.TarInfo(f"{prefix}/{section}.ndjson")
+        info.size, info.mtime, info.mode = spool.tell(), int(time.time()), 0o644
+        yield info.tobuf(tarfile.PAX_FORMAT)
+        spool.seek(0)
+        while chunk := spool.read(CHUNK_BYTES):
+            yield chunk
+        if info.size % tarfile.BLOCKSIZE:
+            yield tarfile.NUL * (tarfile.BLOCKSIZE - info.size % tarfile.BLOCKSIZE)
+        spool.close()
+
+    current, spool = None, None
+    for section, record in records:
+        if section != current:
+            if spool is not None:
+                yield from member(current, spool)
+            current, spool = section, tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        spool.write(_line(record))
+    if spool is not None:
+        yield from member(current, spool)
+    yield tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+
+
+def csv_stream(rows: Iterable[dict], fields: list[str]) -> Iterator[bytes]:
+    """
+    Encode rows as CSV with a header line, in chunks of about ``CHUNK_BYTES``.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fields, extrasaction="ignore")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({key: value.isoformat() if isinstance(value, (datetime, date)) else value
+                         for key, value in row.items()})
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def export_stream(records: Iterable[tuple[str, dict]], export_format: str, prefix: str = "export") -> Iterator[bytes]:
+    """
+    Encode exported records in ``export_format`` (a key of ``FORMATS``).
+    """
+    if export_format == "tar":
+        return tar_stream(records, prefix)
+    return ndjson_stream(records)
+
+
+def download_response(db: Session, chunks: Iterator[bytes], media_type: str, filename: str) -> StreamingResponse:
+    """
+    Stream a body generated from the database as a file download.
+
+    The body is generated in a worker thread while it is sent. The ``get_db`` dependency closes the
+    session when the endpoint returns, before the body is streamed, so the generator closes it
+    again once it is done.
+
+    Args:
+        db (Session): Database session object the chunks are read with.
+        chunks (Iterator[bytes]): The body.
+        media_type (str): Content type of the body.
+        filename (str): File name of the download.
+
+    Returns:
+        StreamingResponse: The download.
+    """
+    def body() -> Iterator[bytes]:
+        try:
+            yield from chunks
+        finally:
+            db.close()
+
+    return StreamingResponse(body(), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+def export_response(db: Session, user_id: Optional[int], export_format: ExportFormat, name: str) -> StreamingResponse:
+    """
+    Stream the export of a user (or of every user) as a file download.
+
+    Args:
+        db (Session): Database session object.
+        user_id (int, optional): The exported user; every user if None.
+        export_format (str): ``ndjson`` or ``tar``.
+        name (str): File name of the download, without extension.
+
+    Returns:
+        StreamingResponse: The export.
+    """
+    records = export_records(db, user_id, settings.export_chunk_size)
+    return download_response(db, export_stream(records, export_format, name), FORMATS[export_format],
+                             f"{name}.{export_format}")
@@ -0,0 +1,58 @@
+import threading
+from collections import defaultdict
+from typing import Optional
+
+
+class Metrics:
+    """
+    In-process counters and gauges, reported by ``/api/admin/metrics``.
+
+    Each worker process keeps its own values; they describe the process that answers the request.
+    Names are dotted (``edit_cache.hits``) and values are plain numbers, so the snapshot can be
+    scraped as JSON or summed across workers.
+    """
+
+    def __init__(self):
+        self._counters: dict[str, float] = defaultdict(float)
+        self._gauges: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1) -> None:
+        """
+        Add ``value`` to a counter.
+        """
+        with self._lock:
+            self._counters[name] += value
+
+    def set(self, name: str, value: float) -> None:
+        """
+        Set a gauge to its current value.
+        """
+        with self._lock:
+            self._gauges[name] = value
+
+    def get(self, name: str) -> Optional[float]:
+        with self._lock:
+            if name in self._counters:
+                return self._counters[name]
+            return self._gauges.get(name)
+
+    def ratio(self, numerator: str, *others: str) -> Optional[float]:
+        """
+        Return ``numerator / (numerator + others)``, e.g. a hit ratio, or None before any event.
+        """
+        with self._lock:
+            total = self._counters.get(numerator, 0) + sum(self._counters.get(name, 0) for name in others)
+            return self._counters.get(numerator, 0) / total if total else None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"counters": dict(sorted(self._counters.items())), "gauges": dict(sorted(self._gauges.items()))}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+
+
+metrics = Metrics()
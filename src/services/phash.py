@@ -0,0 +1,279 @@
+import argparse
+import io
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Optional, Union
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from src.database.models import Asset, Picture
+
+HASH_SIZE = 8
+SAMPLES = 4
+REBUILD_SECONDS = 600
+
+
+def dhash(image: Image.Image) -> int:
+    """
+    Compute the 64-bit difference hash (dHash) of an image.
+
+    The image is reduced to a 9x8 grid of brightness averages and each bit says whether a cell is
+    brighter than its right neighbour, so resizing, recompression and small colour changes keep
+    most bits. Pillow only resizes to ``SAMPLES`` pixels per cell (and lets JPEG decode at a
+    reduced scale); the averaging into cells and the comparisons are done with NumPy.
+
+    Args:
+        image (Image.Image): The image to hash.
+
+    Returns:
+        int: The hash as an unsigned 64-bit integer.
+    """
+    width, height = (HASH_SIZE + 1) * SAMPLES, HASH_SIZE * SAMPLES
+    image.draft("L", (width * 2, height * 2))
+    pixels = np.asarray(image.convert("L").resize((width, height), Image.BILINEAR), dtype=np.float32)
+    cells = pixels.reshape(HASH_SIZE, SAMPLES, HASH_SIZE + 1, SAMPLES).mean(axis=(1, 3))
+    bits = cells[:, 1:] > cells[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def image_hash(data: Union[bytes, str, BinaryIO]) -> Optional[int]:
+    """
+    Compute the dHash of an encoded image (its bytes, path or file), or None if Pillow cannot decode it.
+    """
+    try:
+        with Image.open(io.BytesIO(data) if isinstance(data, bytes) else data) as image:
+            return dhash(image)
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        logging.info(f"Could not compute the perceptual hash: {e}")
+        return None
+
+
+def to_signed(value: Optional[int]) -> Optional[int]:
+    """
+    Convert an unsigned 64-bit hash to the signed value stored in a BIGINT column.
+    """
+    return value - (1 << 64) if value is not None and value >= 1 << 63 else value
+
+
+def to_unsigned(value: Optional[int]) -> Optional[int]:
+    """
+    Convert a hash read from a BIGINT column back to its unsigned value.
+    """
+    return value + (1 << 64) if value is not None and value < 0 else value
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over 64-bit hashes with the Hamming distance.
+
+    Children are keyed by their distance to the parent; by the triangle inequality a search for
+    hashes within ``k`` of a query only descends into children whose key lies within ``k`` of the
+    query's distance to the node, which skips most of the tree for small ``k``.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value: int, item: int) -> None:
+        node = [value, [item], {}]
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming(value, current[0])
+            if distance == 0:
+                current[1].append(item)
+                return
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, value: int, max_distance: int) -> list[tuple[int, int]]:
+        """
+        Return ``(distance, item)`` pairs of all hashes within ``max_distance`` of ``value``.
+        """
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                found.extend((distance, item) for item in items)
+            for key, child in children.items():
+                if distance - max_distance <= key <= distance + max_distance:
+                    stack.append(child)
+        return found
+
+
+class SimilarityIndex:
+    """
+    Process-wide BK-tree of picture hashes.
+
+    ``start`` builds the tree in a background thread, with its own session, when the application
+    starts and rebuilds it every ``REBUILD_SECONDS``, swapping the new tree in at once; so pictures
+    hashed by the backfill, re-hashed or deleted by other workers are eventually reflected without
+    a request ever waiting for a full scan. Pictures added since the last build are picked up
+    incrementally (by id) before each lookup. Results are checked against the database by the caller.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tree = BKTree()
+        self.last_id = 0
+        self.ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _hashes(db: Session, after_id: int):
+        return db.execute(select(Picture.id, Picture.phash)
+                          .where(Picture.id > after_id, Picture.phash.is_not(None))
+                          .order_by(Picture.id)).all()
+
+    def rebuild(self, db: Session) -> None:
+        """
+        Build a new tree from the database and swap it in.
+        """
+        tree, last_id = BKTree(), 0
+        for picture_id, value in self._hashes(db, 0):
+            tree.add(to_unsigned(value), picture_id)
+            last_id = picture_id
+        with self.lock:
+            self.tree, self.last_id = tree, last_id
+
+    def refresh(self, db: Session) -> None:
+        """
+        Add the pictures created since the tree was built (all of them if it never was and no
+        background build is running).
+        """
+        if self._thread is not None and not self.ready.is_set():
+            return
+        rows = self._hashes(db, self.last_id)
+        with self.lock:
+            for picture_id, value in rows:
+                if picture_id > self.last_id:
+                    self.tree.add(to_unsigned(value), picture_id)
+                    self.last_id = picture_id
+
+    def search(self, value: int, max_distance: int, db: Session) -> list[tuple[int, int]]:
+        """
+        Return ``(distance, picture_id)`` pairs within ``max_distance`` of ``value``, nearest first.
+        """
+        self.refresh(db)
+        with self.lock:
+            return sorted(self.tree.search(value, max_distance))
+
+    def start(self, session_factory) -> None:
+        """
+        Build the tree and keep rebuilding it in a daemon thread; called on application startup.
+        """
+        if self._thread is not None:
+            return
+
+        def run():
+            while True:
+                try:
+                    with session_factory() as db:
+                        self.rebuild(db)
+                except Exception as e:
+                    logging.error(f"Could not build the similarity index: {e}")
+                finally:
+                    self.ready.set()
+                if self._stop.wait(REBUILD_SECONDS):
+                    return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="similarity-index", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the rebuild thread; called on application shutdown.
+        """
+        self._stop.set()
+
+
+similarity_index = SimilarityIndex()
+
+
+def backfill(db: Session, fetch, batch_size: int = 100, workers: int = 8) -> int:
+    """
+    Compute the missing hashes of stored pictures (and their assets).
+
+    Args:
+        db (Session): Database session object.
+        fetch (Callable[[Picture], bytes]): Returns the file content of a picture.
+        batch_size (int): Pictures hashed and committed per batch.
+        workers (int): Threads downloading and hashing in parallel.
+
+    Returns:
+        int: The number of pictures that got a hash.
+    """
+    def compute(picture):
+        try:
+            return image_hash(fetch(picture))
+        except Exception as e:
+            logging.error(f"Could not fetch picture {picture.id}: {e}")
+            return None
+
+    hashed, last_id = 0, 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            pictures = db.execute(select(Picture).where(Picture.phash.is_(None), Picture.id > last_id)
+                                  .order_by(Picture.id).limit(batch_size)).scalars().all()
+            if not pictures:
+                return hashed
+            for picture, value in zip(pictures, executor.map(compute, pictures)):
+                if value is not None:
+                    picture.phash = to_signed(value)
+                    if picture.asset_id is not None:
+                        db.execute(update(Asset).where(Asset.id == picture.asset_id, Asset.phash.is_(None))
+                                   .values(phash=picture.phash))
+                    hashed += 1
+            db.commit()
+            last_id = pictures[-1].id
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Compute perceptual hashes of pictures uploaded before hashing existed.")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    import urllib.request
+    from src.database.db import SessionLocal
+    from src.services.storage import get_storage
+
+    storage = get_storage()
+
+    def fetch(picture: Picture) -> bytes:
+        if picture.picture_json and picture.picture_json.get("public_id"):
+            return storage.get(picture.picture_json["public_id"])
+        with urllib.request.urlopen(picture.picture_url) as response:
+            return response.read()
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        hashed = backfill(db, fetch, args.batch_size, args.workers)
+        print(f"Hashed {hashed} pictures in {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import os
+import time
+import uuid
+from typing import Optional
+from urllib.parse import parse_qs
+
+from starlette.concurrency import run_in_threadpool
+
+from src.services.auth import auth_service
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_QUERY = "profile"
+
+
+def _profile_mode(scope) -> Optional[str]:
+    """
+    Return the requested profiling mode (``"store"`` or ``"html"``), or None when profiling was not asked for.
+    """
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return "html" if value.lower() == b"html" else "store"
+    if PROFILE_QUERY.encode() in scope.get("query_string", b""):
+        values = parse_qs(scope["query_string"].decode()).get(PROFILE_QUERY)
+        if values:
+            return "html" if values[0] == "html" else "store"
+    return None
+
+
+def _requesting_email(scope) -> Optional[str]:
+    """
+    Read the email from the request's access token without touching the database.
+    """
+    token = None
+    for name, value in scope["headers"]:
+        if name == b"authorization" and value.lower().startswith(b"bearer "):
+            token = value[7:].decode()
+            break
+    return auth_service.token_email(token) if token is not None else None
+
+
+class ProfilerMiddleware:
+    """
+    ASGI middleware that profiles a single request with a sampling profiler on demand.
+
+    A request is profiled only when it carries the ``X-Profile`` header (or ``?profile=``
+    query flag) and an access token whose email is on ``PROFILING_ALLOWLIST``. With
+    ``X-Profile: html`` the rendered profile replaces the response; otherwise the response is
+    returned unchanged, the profile is written to ``PROFILING_OUTPUT_DIR`` and its id is sent in
+    the ``X-Profile-Id`` header so admins can fetch it from ``/api/admin/profiles/{id}``. Ids are
+    generated (a millisecond timestamp and a random suffix, so they sort by time) rather than
+    derived from the path, and the profile is rendered and written in the thread pool.
+
+    The middleware is only installed when ``PROFILING_ENABLED`` is set, so it costs nothing
+    when unused.
+    """
+
+    def __init__(self, app, allowlist: list[str], output_dir: str, interval: float):
+        self.app = app
+        self.allowlist = set(allowlist)
+        self.output_dir = output_dir
+        self.interval = interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        mode = _profile_mode(scope)
+        if mode is None or _requesting_email(scope) not in self.allowlist:
+            await self.app(scope, receive, send)
+            return
+
+        from pyinstrument import Profiler
+
+        profile_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:12]}"
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        async def discard(message):
+            pass
+
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard if mode == "html" else send_with_profile_id)
+        finally:
+            profiler.stop()
+            html = await run_in_threadpool(self._save, profiler, profile_id)
+
+        if mode == "html":
+            body = html.encode()
+            await send({"type": "http.response.start",
+                        "status": 200,
+                        "headers": [(b"content-type", b"text/html; charset=utf-8"),
+                                    (b"content-length", str(len(body)).encode()),
+                                    (b"x-profile-id", profile_id.encode())]})
+            await send({"type": "http.response.body", "body": body})
+
+    def _save(self, profiler, profile_id: str) -> str:
+        """
+        Render a finished profile and write it to the output directory.
+        """
+        html = profiler.output_html()
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(os.path.join(self.output_dir, f"{profile_id}.html"), "w", encoding="utf-8") as f:
+            f.write(html)
+        return html
+
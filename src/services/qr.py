@@ -1,13 +1,27 @@
-import cloudinary.uploader
 import qrcode
 import io
-from src.conf.cloudinary import configure_cloudinary, generate_random_string
+from starlette.concurrency import run_in_threadpool
+from src.conf.cloudinary import generate_random_string
+from src.services.storage import StorageBackend
 from fastapi import HTTPException, status
 
-async def generate_qr_and_upload_to_cloudinary(url: str, picture: dict = None, version: str = None) -> str:
-    
-    configure_cloudinary()
-    random_string = generate_random_string()
+def qr_public_id(picture: dict) -> str:
+    """
+    Return the public id of the QR code stored for a picture by ``generate_qr_and_upload``.
+    """
+    folder = picture.get('folder') or picture['public_id'].rpartition('/')[0]
+    return 'qr_code/' + picture['public_id'].replace(folder + "/", "")
+
+
+async def generate_qr_and_upload(url: str, storage: StorageBackend, picture: dict = None, version: str = None) -> str:
+    """
+    Render the QR code of a URL and store it; the rendering and upload run in a worker thread, so
+    the QR codes of concurrent uploads are made in parallel without blocking the event loop.
+    """
+    return await run_in_threadpool(_generate_qr_and_upload, url, storage, picture, version)
+
+
+def _generate_qr_and_upload(url: str, storage: StorageBackend, picture: dict = None, version: str = None) -> str:
 
     try:
         qr = qrcode.QRCode(version=1, box_size=10, border=5)
@@ -24,17 +38,14 @@ async def generate_qr_and_upload_to_cloudinary(url: str, picture: dict = None, v
             picture_name = picture_public_id.replace(picture_folder + "/", "")
             version = version or picture['version']
 
-            qr_upload = cloudinary.uploader.upload(qr_bytes, folder='qr_code', public_id=picture_name, version=version, overwrite=True)
-            qr_public_id = qr_upload['public_id']
-
-            qr_url = cloudinary.CloudinaryImage(qr_public_id).build_url(version=version)
+            qr_upload = storage.put(qr_bytes, folder='qr_code', name=picture_name, version=version)
+            qr_url = storage.url(qr_upload['public_id'], version=version)
         else:
             picture_name = generate_random_string()
-            qr_upload = cloudinary.uploader.upload(qr_bytes, folder='profile_qr_code', public_id=picture_name, overwrite=True)
-            qr_public_id = qr_upload['public_id']
-            qr_url = cloudinary.CloudinaryImage(qr_public_id).build_url(version=qr_upload['version'])
+            qr_upload = storage.put(qr_bytes, folder='profile_qr_code', name=picture_name)
+            qr_url = storage.url(qr_upload['public_id'], version=qr_upload['version'])
             
         return qr_url
 
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
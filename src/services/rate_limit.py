@@ -0,0 +1,141 @@
+import fnmatch
+import json
+import logging
+import math
+import time
+from http.cookies import SimpleCookie
+
+from starlette.concurrency import run_in_threadpool
+
+from src.services.auth import auth_service
+from src.services.cache import CacheBackend, MemoryCache
+from src.services.metrics import metrics
+
+
+def parse_costs(costs: str) -> list[tuple[str, float]]:
+    """
+    Parse ``RATE_LIMIT_COSTS``: comma-separated ``METHOD /path/pattern=tokens`` entries, where the
+    pattern may use ``*`` wildcards.
+    """
+    parsed = []
+    for entry in costs.split(","):
+        if entry.strip():
+            route, _, cost = entry.rpartition("=")
+            parsed.append((route.strip(), float(cost)))
+    return parsed
+
+
+class TokenBucketLimiter:
+    """
+    Per-client token buckets, refilled at ``rate`` tokens per second up to ``burst``.
+
+    The buckets are kept in a cache backend, atomically (a Lua script on Redis), so every worker
+    and node shares them. With a shared backend the last known level of each bucket is also kept in
+    the process: it can only be higher than the real one, since other workers only take tokens, so
+    a request it cannot pay for is rejected without asking the backend. An abusive client is
+    therefore turned away locally until its bucket could have refilled. Calls to a shared backend
+    run in a worker thread, so a slow Redis does not hold up the event loop.
+    """
+
+    def __init__(self, backend: CacheBackend, rate: float, burst: float, max_entries: int = 10000):
+        self.backend = backend
+        self.rate = rate
+        self.burst = burst
+        self.local = None if isinstance(backend, MemoryCache) else MemoryCache(max_entries, name="rate_limit")
+
+    async def hit(self, key: str, cost: float) -> float:
+        """
+        Take ``cost`` tokens from the bucket of ``key``.
+
+        Args:
+            key (str): The client.
+            cost (float): Tokens the request costs; at most ``burst`` are taken.
+
+        Returns:
+            float: 0 if the request is allowed, otherwise the seconds to wait before retrying.
+        """
+        cost = min(cost, self.burst)
+        bucket = f"rate_limit:{key}"
+        if self.local is not None:
+            known = self.local.get(bucket)
+            if known is not None:
+                tokens = min(self.burst, known[0] + (time.monotonic() - known[1]) * self.rate)
+                if tokens < cost:
+                    metrics.inc("rate_limit.local_rejections")
+                    return (cost - tokens) / self.rate
+        if self.local is None:
+            return self.backend.take(bucket, self.rate, self.burst, cost)[2]
+        _, tokens, retry_after = await run_in_threadpool(self.backend.take, bucket, self.rate, self.burst, cost)
+        self.local.set(bucket, (tokens, time.monotonic()), ex=self.burst / self.rate)
+        return retry_after
+
+
+def client_key(scope) -> str:
+    """
+    Identify the client of a request: the user of its access token (or of the ``refresh_token``
+    cookie of the HTML pages), otherwise its IP address.
+    """
+    for name, value in scope["headers"]:
+        if name == b"authorization" and value.lower().startswith(b"bearer "):
+            email = auth_service.token_email(value[7:].decode())
+            if email:
+                return f"user:{email}"
+        elif name == b"cookie":
+            cookie = SimpleCookie()
+            cookie.load(value.decode("latin-1"))
+            if "refresh_token" in cookie:
+                email = auth_service.token_email(cookie["refresh_token"].value, scope="refresh_token")
+                if email:
+                    return f"user:{email}"
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware that rate-limits every HTTP request with a ``TokenBucketLimiter``.
+
+    A request costs the tokens of the first ``costs`` pattern matching ``"METHOD /path"``, 1 if
+    none does (0 lets it through without counting). A request the client cannot pay for is answered
+    with 429 and a ``Retry-After`` header before it reaches the app. If the backend fails, requests
+    are let through rather than refused. Allowed and rejected requests are counted in
+    ``rate_limit.*`` metrics.
+    """
+
+    def __init__(self, app, limiter: TokenBucketLimiter, costs: list[tuple[str, float]]):
+        self.app = app
+        self.limiter = limiter
+        self.costs = costs
+
+    def cost(self, method: str, path: str) -> float:
+        route = f"{method} {path}"
+        for pattern, cost in self.costs:
+            if fnmatch.fnmatchcase(route, pattern):
+                return cost
+        return 1
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        cost = self.cost(scope["method"], scope["path"])
+        retry_after = 0.0
+        if cost > 0:
+            try:
+                retry_after = await self.limiter.hit(client_key(scope), cost)
+            except Exception as e:
+                logging.error(f"Rate limiter unavailable: {e}")
+                metrics.inc("rate_limit.errors")
+        if not retry_after:
+            metrics.inc("rate_limit.allowed")
+            await self.app(scope, receive, send)
+            return
+
+        metrics.inc("rate_limit.rejected")
+        body = json.dumps({"detail": "Too many requests"}).encode()
+        await send({"type": "http.response.start",
+                    "status": 429,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode()),
+                                (b"retry-after", str(math.ceil(retry_after)).encode())]})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Awaitable, Callable, Optional
+
+from PIL import Image, ImageOps
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.config import settings
+from src.services.metrics import metrics
+
+FORMATS = {"jpeg": "JPEG", "png": "PNG", "webp": "WEBP"}
+FITS = ("limit", "fill")
+SAVE_OPTIONS = {"JPEG": {"quality": 85, "progressive": True}, "WEBP": {"quality": 80}, "PNG": {}}
+ORIENTATION = 0x0112
+
+
+def parse_sizes(sizes: str) -> frozenset[int]:
+    """
+    Parse ``IMAGE_SIZES``: the comma-separated widths and heights ``/img`` renders.
+    """
+    return frozenset(int(size) for size in sizes.split(",") if size.strip())
+
+
+def resize(data: bytes, width: Optional[int], height: Optional[int], fit: str = "limit",
+           image_format: str = "jpeg") -> bytes:
+    """
+    Resize an encoded image, like Cloudinary's ``c_limit`` and ``c_fill`` crops.
+
+    ``limit`` fits the image within ``width`` x ``height`` keeping its aspect ratio; ``fill`` crops
+    it around the centre to exactly that size (when both are given). Images are never enlarged.
+    JPEG sources are decoded at a reduced scale when the target is small enough, and the EXIF
+    orientation is applied. Transparency is flattened on white for JPEG output.
+
+    Args:
+        data (bytes): The encoded source image.
+        width (int | None): The target width, or None to follow the height.
+        height (int | None): The target height, or None to follow the width.
+        fit (str): ``limit`` or ``fill``.
+        image_format (str): ``jpeg``, ``png`` or ``webp``.
+
+    Returns:
+        bytes: The encoded resized image.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        # orientations 5-8 swap the sides: the target applies to the image as displayed
+        rotated = source.getexif().get(ORIENTATION, 1) in (5, 6, 7, 8)
+        source_width, source_height = (source.height, source.width) if rotated else source.size
+        scale = min((width or source_width) / source_width, (height or source_height) / source_height)
+        if fit == "fill" and width and height:
+            scale = max(width / source_width, height / source_height)
+        draft = (max(1, round(source_width * scale)), max(1, round(source_height * scale)))
+        source.draft("RGB", draft[::-1] if rotated else draft)
+        image = ImageOps.exif_transpose(source)
+
+    if fit == "fill" and width and height:
+        size = (min(width, image.width), min(height, image.height))
+        image = ImageOps.fit(image, size, Image.LANCZOS)
+    else:
+        image.thumbnail((width or image.width, height or image.height), Image.LANCZOS, reducing_gap=2.0)
+
+    pil_format = FORMATS[image_format]
+    if pil_format == "JPEG" and image.mode != "RGB":
+        rgba = image.convert("RGBA")
+        image = Image.new("RGB", rgba.size, (255, 255, 255))
+        image.paste(rgba, mask=rgba.getchannel("A"))
+    elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA")
+    output = io.BytesIO()
+    image.save(output, format=pil_format, **SAVE_OPTIONS[pil_format])
+    return output.getvalue()
+
+
+def cache_key(public_id: str, version, width: Optional[int], height: Optional[int], fit: str,
+              image_format: str) -> str:
+    """
+    Return the key of a resized image: the hex SHA-256 of its source file and parameters.
+    """
+    return hashlib.sha256(f"{public_id}\0{version}\0{width}\0{height}\0{fit}\0{image_format}".encode()).hexdigest()
+
+
+class DiskLRUCache:
+    """
+    Resized images on disk, bounded to ``max_bytes`` by evicting the least recently used.
+
+    Files are named after their key under ``root`` and written with a rename, so a reader never sees
+    a partial file. Recency is kept in memory and in the files' modification time, which hits
+    refresh, so the order survives a restart. Each worker process keeps its own index of the shared
+    directory; a file evicted by another process is just a miss.
+
+    ``get_or_create`` coalesces concurrent misses for the same key: the first request renders and
+    the others wait for its result. Hits, misses, coalesced requests and evictions are counted in
+    ``image_cache.*`` metrics.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._entries: Optional[OrderedDict[str, int]] = None
+        self._size = 0
+        self._lock = threading.Lock()
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def _load(self) -> OrderedDict:
+        if self._entries is None:
+            found = []
+            for directory, _, names in os.walk(self.root):
+                for name in names:
+                    if not name.startswith(".tmp-"):
+                        stat = os.stat(os.path.join(directory, name))
+                        found.append((stat.st_mtime_ns, name, stat.st_size))
+            self._entries = OrderedDict((name, size) for _, name, size in sorted(found))
+            self._size = sum(self._entries.values())
+        return self._entries
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entries = self._load()
+            if key not in entries:
+                return None
+            entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            self._forget(key)
+            return None
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            entries = self._load()
+            self._size += len(data) - entries.pop(key, 0)
+            entries[key] = len(data)
+            evicted = []
+            while self._size > self.max_bytes and len(entries) > 1:
+                old_key, old_size = entries.popitem(last=False)
+                self._size -= old_size
+                evicted.append(old_key)
+            metrics.set("image_cache.bytes", self._size)
+        for old_key in evicted:
+            metrics.inc("image_cache.evictions")
+            try:
+                os.remove(self._path(old_key))
+            except FileNotFoundError:
+                pass
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            self._size -= self._load().pop(key, 0)
+
+    async def get_or_create(self, key: str, create: Callable[[], Awaitable[bytes]]) -> bytes:
+        """
+        Return the cached bytes of ``key``, calling ``create`` once on a miss however many
+        requests are waiting for it.
+        """
+        data = await run_in_threadpool(self.get, key)
+        if data is not None:
+            metrics.inc("image_cache.hits")
+            return data
+        pending = self._inflight.get(key)
+        if pending is not None:
+            metrics.inc("image_cache.coalesced")
+            return await asyncio.shield(pending)
+
+        metrics.inc("image_cache.misses")
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            data = await create()
+            try:
+                await run_in_threadpool(self.put, key, data)
+            except OSError as e:
+                logging.error(f"Could not cache resized image {key}: {e}")
+            future.set_result(data)
+            return data
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+
+@lru_cache
+def get_image_cache() -> DiskLRUCache:
+    """
+    Return the cache of resized images configured by ``IMAGE_CACHE_*``; used as a FastAPI dependency.
+    """
+    return DiskLRUCache(settings.image_cache_dir, settings.image_cache_max_bytes)
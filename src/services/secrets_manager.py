@@ -34,6 +34,9 @@ class SecretsManager:
         """
         Retrieve a secret value by key from AWS Secrets Manager.
 
+        An environment variable with the same name takes precedence, which lets local runs
+        (benchmarks, SQLite installs) work without AWS credentials.
+
         Parameters:
             key (str): The key for the secret value to retrieve.
 
@@ -43,6 +46,10 @@ class SecretsManager:
         Raises:
             ClientError: An error occurred while trying to retrieve the secret from AWS Secrets Manager.
         """
+        value = os.getenv(key)
+        if value is not None:
+            return value
+
         secret_name = os.getenv("SECRET_NAME")
         client = SecretsManager.create_client()
 
@@ -0,0 +1,231 @@
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.conf.config import settings
+
+current_request: ContextVar[Optional[dict]] = ContextVar("current_request", default=None)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_BIND_PARAMETER = re.compile(r"%\(\w+\)s|(?<!:):(?!:)\w+|\$\d+|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+_EXPLAINABLE = ("select", "insert", "update", "delete", "with")
+_FOR_UPDATE = re.compile(r"\bfor\s+(?:no\s+key\s+)?(?:update|share)\b", re.IGNORECASE)
+
+
+def normalize_sql(statement: str) -> str:
+    """
+    Reduce a SQL statement to its shape so that identical queries group together.
+
+    Literals and bind parameters are replaced with ``?`` and expanded ``IN`` lists collapse
+    to ``(...)``, so ``IN (1, 2, 3)`` and ``IN (4, 5)`` produce the same text.
+
+    Args:
+        statement (str): The SQL text sent to the driver.
+
+    Returns:
+        str: The normalized statement.
+    """
+    normalized = _STRING_LITERAL.sub("?", statement)
+    normalized = _BIND_PARAMETER.sub("?", normalized)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _IN_LIST.sub("(...)", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+
+def parameter_shape(parameters, executemany: bool = False):
+    """
+    Describe bind parameters by type only, so no user data ends up in the log.
+
+    Args:
+        parameters: The parameters passed to the DBAPI cursor.
+        executemany (bool): Whether the statement was executed with a list of parameter sets.
+
+    Returns:
+        The parameter names (or positions) mapped to their type names.
+    """
+    if executemany and parameters:
+        return {"rows": len(parameters), "row": parameter_shape(parameters[0])}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return None
+
+
+def _caller() -> Optional[str]:
+    """
+    Find the innermost repository or route function on the current stack.
+    """
+    frame = sys._getframe(1)
+    route = None
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("src.repository."):
+            return f"{module}.{frame.f_code.co_name}"
+        if route is None and module.startswith("src.routes."):
+            route = f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return route
+
+
+def _route() -> Optional[str]:
+    """
+    Describe the request being served, using the matched route template when routing has happened.
+    """
+    scope = current_request.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    path = getattr(route, "path", None) or scope.get("path")
+    return f"{scope.get('method')} {path}"
+
+
+class SlowQueryLog:
+    """
+    Ring buffer of statements that took longer than a threshold.
+
+    Attributes:
+        threshold_ms (float): Minimum duration for a statement to be recorded.
+        explain_sample_rate (float): Fraction of slow statements explained on Postgres: plain
+            SELECTs are re-run with ``EXPLAIN (ANALYZE, BUFFERS)``, other statements are only
+            planned with ``EXPLAIN`` so they are not executed twice.
+    """
+
+    def __init__(self, threshold_ms: float, size: int, explain_sample_rate: float = 0.0):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self._records = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def install(self, engine: Engine) -> None:
+        """
+        Attach the cursor timing listeners to an engine.
+
+        Args:
+            engine (Engine): The engine to instrument.
+        """
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+
+    def entries(self, limit: Optional[int] = None) -> list[dict]:
+        """
+        Return the recorded statements, slowest first.
+
+        Args:
+            limit (Optional[int]): Maximum number of records to return; all of them if None.
+
+        Returns:
+            list[dict]: The slow-query records.
+        """
+        with self._lock:
+            records = list(self._records)
+        records.sort(key=lambda record: record["duration_ms"], reverse=True)
+        return records[:max(limit, 0)] if limit is not None else records
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    def _handle_error(self, exception_context):
+        # A failed statement never reaches after_cursor_execute: drop its start time so the next
+        # statement is not timed from it.
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_time"):
+            conn.info["query_start_time"].pop()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - conn.info["query_start_time"].pop()) * 1000
+        if duration_ms < self.threshold_ms:
+            return
+
+        record = {
+            "timestamp": datetime.now().isoformat(),
+            "duration_ms": round(duration_ms, 3),
+            "statement": normalize_sql(statement),
+            "parameters": parameter_shape(parameters, executemany),
+            "route": _route(),
+            "caller": _caller(),
+            "explain": None,
+        }
+        if self._should_explain(conn, statement, executemany):
+            record["explain"] = self._explain(conn, statement, parameters)
+
+        with self._lock:
+            self._records.append(record)
+
+    def _should_explain(self, conn, statement: str, executemany: bool) -> bool:
+        return (self.explain_sample_rate > 0
+                and conn.dialect.name == "postgresql"
+                and not executemany
+                and statement.lstrip().lower().startswith(_EXPLAINABLE)
+                and random.random() < self.explain_sample_rate)
+
+    def _explain(self, conn, statement: str, parameters):
+        """
+        Explain a statement inside a savepoint.
+
+        Only plain SELECTs are re-run with ``EXPLAIN (ANALYZE, BUFFERS)``: ANALYZE executes the
+        statement, so writes, data-modifying CTEs and ``SELECT ... FOR UPDATE`` are only planned.
+        A separate cursor is used so the caller's pending result set stays intact, and the
+        savepoint keeps a failing EXPLAIN from aborting the surrounding transaction.
+        """
+        analyze = statement.lstrip().lower().startswith("select") and not _FOR_UPDATE.search(statement)
+        options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute("SAVEPOINT slow_query_explain")
+            try:
+                cursor.execute(f"EXPLAIN ({options}) {statement}", parameters)
+                plan = cursor.fetchone()[0]
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+                return plan
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                return {"error": str(e)}
+        except Exception as e:
+            return {"error": str(e)}
+        finally:
+            cursor.close()
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware that exposes the current request scope to the slow-query log.
+
+    Starlette fills in the matched route on the same scope dict during routing, so
+    statements can be attributed to the route template rather than the raw path.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_request.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request.reset(token)
+
+
+slow_query_log = SlowQueryLog(threshold_ms=settings.slow_query_threshold_ms,
+                              size=settings.slow_query_log_size,
+                              explain_sample_rate=settings.slow_query_explain_sample_rate)
@@ -0,0 +1,327 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+import urllib.request
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import BinaryIO, Iterator, Optional, Union
+
+import cloudinary
+import cloudinary.uploader
+import cloudinary.utils
+
+from src.conf.config import settings
+
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "jpg", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png", "image/png"),
+    (b"GIF87a", "gif", "image/gif"),
+    (b"GIF89a", "gif", "image/gif"),
+    (b"BM", "bmp", "image/bmp"),
+    (b"II*\x00", "tiff", "image/tiff"),
+    (b"MM\x00*", "tiff", "image/tiff"),
+]
+
+
+def sniff_image_type(head: bytes) -> Optional[tuple[str, str]]:
+    """
+    Detect the image format from the first bytes of a file.
+
+    Args:
+        head (bytes): At least the first 12 bytes of the file.
+
+    Returns:
+        tuple[str, str] | None: The format and MIME type, or None if the bytes are not a known image.
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp", "image/webp"
+    for signature, image_format, mime_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return image_format, mime_type
+    return None
+
+
+class StorageWriter:
+    """
+    Receives a file chunk by chunk; ``commit`` stores it, ``abort`` discards it.
+
+    This default writer spools the chunks to a temporary file (in memory up to 1 MB) and hands it to
+    the backend's ``put`` on commit, for backends that can only take a whole file.
+    """
+
+    def __init__(self, storage: "StorageBackend", folder: str, name: str, **options):
+        self.storage = storage
+        self.folder = folder
+        self.name = name
+        self.options = options
+        self.file = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        self.copy_path: Optional[str] = None
+
+    def write(self, chunk: bytes) -> None:
+        self.file.write(chunk)
+
+    def local_path(self) -> str:
+        """
+        Return the path of a file holding the content written so far, so another process can read
+        it without the content being sent to it. Valid until ``commit`` or ``abort``.
+
+        The spooled content is copied to a temporary file the first time.
+        """
+        if self.copy_path is None:
+            fd, self.copy_path = tempfile.mkstemp(prefix="upload-")
+            with os.fdopen(fd, "wb") as copy, self.reader() as f:
+                shutil.copyfileobj(f, copy)
+        return self.copy_path
+
+    def _remove_copy(self) -> None:
+        if self.copy_path is not None:
+            try:
+                os.unlink(self.copy_path)
+            except FileNotFoundError:
+                pass
+            self.copy_path = None
+
+    @contextmanager
+    def reader(self) -> Iterator[BinaryIO]:
+        """
+        Read back the content written so far, before it is committed.
+        """
+        self.file.seek(0)
+        try:
+            yield self.file
+        finally:
+            self.file.seek(0, os.SEEK_END)
+
+    def commit(self, name: Optional[str] = None) -> dict:
+        """
+        Store the file, under ``name`` instead of the name given when opening the writer if set.
+        """
+        self.file.seek(0)
+        try:
+            return self.storage.put(self.file, self.folder, name or self.name, **self.options)
+        finally:
+            self.file.close()
+            self._remove_copy()
+
+    def abort(self) -> None:
+        self.file.close()
+        self._remove_copy()
+
+
+class StorageBackend:
+    """
+    Interface of the stores that hold picture, avatar and QR code files.
+
+    ``put`` returns a dict shaped like a Cloudinary upload response (``public_id``, ``version``,
+    ``folder``, ...) because that is what ``Picture.picture_json`` keeps.
+    """
+    name = ""
+
+    def put(self, data: Union[bytes, BinaryIO], folder: str, name: str, **options) -> dict:
+        raise NotImplementedError
+
+    def writer(self, folder: str, name: str, **options) -> StorageWriter:
+        """
+        Open a writer for a file that arrives in chunks.
+        """
+        return StorageWriter(self, folder, name, **options)
+
+    def get(self, public_id: str) -> bytes:
+        raise NotImplementedError
+
+    def open(self, public_id: str) -> BinaryIO:
+        """
+        Open a stored file for reading; local backends read only the bytes that are asked for.
+        """
+        return io.BytesIO(self.get(public_id))
+
+    def delete(self, public_id: str) -> None:
+        raise NotImplementedError
+
+    def version(self, public_id: str) -> Optional[int]:
+        """
+        Return the current version of a stored file, or None when the backend cannot tell cheaply.
+        """
+        return None
+
+    def url(self, public_id: str, version: Union[int, str, None] = None, **transformation) -> str:
+        raise NotImplementedError
+
+    def transform(self, public_id: str, transformation: list[dict], target_public_id: str, **options) -> dict:
+        """
+        Store a transformed copy of an asset under ``target_public_id``.
+        """
+        raise NotImplementedError(f"The {self.name} storage cannot transform images")
+
+
+class CloudinaryStorage(StorageBackend):
+    """
+    Storage backed by Cloudinary; transformations are done by Cloudinary itself.
+    """
+    name = "cloudinary"
+
+    def __init__(self):
+        # imported here: src.conf.cloudinary reads the Cloudinary secrets at import time
+        from src.conf.cloudinary import configure_cloudinary
+        configure_cloudinary()
+
+    def put(self, data, folder, name, **options):
+        return cloudinary.uploader.upload(data, folder=folder, public_id=name, overwrite=True, **options)
+
+    def get(self, public_id):
+        with urllib.request.urlopen(self.url(public_id)) as response:
+            return response.read()
+
+    def delete(self, public_id):
+        cloudinary.uploader.destroy(public_id, invalidate=True)
+
+    def url(self, public_id, version=None, **transformation):
+        return cloudinary.CloudinaryImage(public_id).build_url(version=version, **transformation)
+
+    def transform(self, public_id, transformation, target_public_id, **options):
+        source_url = cloudinary.utils.cloudinary_url(public_id, transformation=transformation)[0]
+        return cloudinary.uploader.upload(source_url, public_id=target_public_id, overwrite=True, **options)
+
+
+class LocalStorage(StorageBackend):
+    """
+    Storage on the local filesystem under ``root``, served by the ``/media`` route.
+
+    Files are written to a temporary file in the target directory and moved into place with
+    ``os.replace``, so readers never see a partially written file. Each write gets a new
+    millisecond version, kept as the file's modification time, that is part of the URL, so
+    overwritten files are not served from stale caches. ``url`` with a ``width`` or ``height`` returns a URL of the ``/img/files`` resize route
+    (Cloudinary's ``fill`` crop maps to its ``fit=fill``); other transformation options are ignored.
+    """
+    name = "local"
+
+    def __init__(self, root: str, base_url: str, resize_url: str = "/img/files"):
+        self.root = os.path.realpath(root)
+        self.base_url = base_url.rstrip("/")
+        self.resize_url = resize_url.rstrip("/")
+
+    def path(self, public_id: str) -> str:
+        """
+        Return the file path of an asset, refusing ids that would escape ``root``.
+        """
+        path = os.path.realpath(os.path.join(self.root, public_id))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid public id: {public_id}")
+        return path
+
+    def put(self, data, folder, name, **options):
+        writer = self.writer(folder, name)
+        try:
+            if isinstance(data, bytes):
+                writer.write(data)
+            else:
+                while chunk := data.read(1024 * 1024):
+                    writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def writer(self, folder, name, **options):
+        return LocalStorageWriter(self, folder, name)
+
+    def get(self, public_id):
+        with open(self.path(public_id), "rb") as f:
+            return f.read()
+
+    def open(self, public_id):
+        return open(self.path(public_id), "rb")
+
+    def delete(self, public_id):
+        try:
+            os.remove(self.path(public_id))
+        except FileNotFoundError:
+            pass
+
+    def version(self, public_id):
+        return os.stat(self.path(public_id)).st_mtime_ns // 1_000_000
+
+    def url(self, public_id, version=None, **transformation):
+        width, height = transformation.get("width"), transformation.get("height")
+        if width or height:
+            params = {"w": width, "h": height, "fit": "fill" if transformation.get("crop") == "fill" else None,
+                      "v": version}
+            return f"{self.resize_url}/{public_id}?" + "&".join(f"{k}={v}" for k, v in params.items() if v)
+        url = f"{self.base_url}/{public_id}"
+        return f"{url}?v={version}" if version else url
+
+
+class LocalStorageWriter(StorageWriter):
+    """
+    Writes chunks straight to a temporary file next to the target and renames it into place on commit.
+    """
+
+    def __init__(self, storage: LocalStorage, folder: str, name: str):
+        self.storage = storage
+        self.folder = folder
+        self.public_id = f"{folder}/{name}" if folder else name
+        self.path = storage.path(self.public_id)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix=".tmp-")
+        self.file = os.fdopen(fd, "wb")
+        self.head = b""
+
+    def write(self, chunk):
+        if len(self.head) < 16:
+            self.head += chunk[:16]
+        self.file.write(chunk)
+
+    @contextmanager
+    def reader(self):
+        self.file.flush()
+        with open(self.tmp_path, "rb") as f:
+            yield f
+
+    def local_path(self):
+        self.file.flush()
+        return self.tmp_path
+
+    def commit(self, name=None):
+        if name:
+            self.public_id = f"{self.folder}/{name}" if self.folder else name
+            self.path = self.storage.path(self.public_id)
+        try:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            os.chmod(self.tmp_path, 0o644)
+            # the modification time is the version, so it can be checked against a URL's
+            version = time.time_ns() // 1_000_000
+            os.utime(self.tmp_path, ns=(version * 1_000_000,) * 2)
+            os.replace(self.tmp_path, self.path)
+        except BaseException:
+            self.abort()
+            raise
+        sniffed = sniff_image_type(self.head)
+        return {"public_id": self.public_id,
+                "version": version,
+                "folder": self.folder,
+                "format": sniffed[0] if sniffed else None,
+                "bytes": os.path.getsize(self.path),
+                "storage": self.storage.name}
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.unlink(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+@lru_cache
+def get_storage() -> StorageBackend:
+    """
+    Return the storage backend selected by ``STORAGE_BACKEND``; used as a FastAPI dependency.
+    """
+    if settings.storage_backend == "local":
+        return LocalStorage(settings.storage_local_root, settings.storage_local_url)
+    if settings.storage_backend == "cloudinary":
+        return CloudinaryStorage()
+    raise ValueError(f"Unknown storage backend: {settings.storage_backend}")
@@ -0,0 +1,361 @@
+import hashlib
+from dataclasses import dataclass, field
+from typing import AsyncIterator, BinaryIO, Callable, ContextManager, Optional, Union
+
+from fastapi import HTTPException, Request, status
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+
+from src.conf.config import settings
+from src.services.storage import StorageBackend, StorageWriter, sniff_image_type
+
+SNIFF_BYTES = 16
+MAX_FIELDS_BYTES = 64 * 1024
+
+
+class UploadPipeline:
+    """
+    Passes an uploaded file to a storage writer chunk by chunk.
+
+    On the way it rejects the upload as soon as it grows past ``max_bytes`` (413), checks the image
+    type from the first bytes (415) and updates a SHA-256 of the content, so no step needs the
+    whole file in memory or a second copy on disk.
+    """
+
+    def __init__(self, writer: StorageWriter, max_bytes: int, allowed_formats: set[str]):
+        self.writer = writer
+        self.max_bytes = max_bytes
+        self.allowed_formats = allowed_formats
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.image_format: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self._head = b""
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                detail=f"File is larger than {self.max_bytes} bytes")
+        self.sha256.update(chunk)
+        if self.image_format is None:
+            self._head += chunk
+            if len(self._head) < SNIFF_BYTES:
+                return
+            self._sniff()
+            chunk, self._head = self._head, b""
+        self.writer.write(chunk)
+
+    def close(self) -> None:
+        if self.image_format is None:
+            self._sniff()
+            self.writer.write(self._head)
+            self._head = b""
+
+    def _sniff(self) -> None:
+        sniffed = sniff_image_type(self._head)
+        if sniffed is None or sniffed[0] not in self.allowed_formats:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                                detail=f"Unsupported image type, allowed: {', '.join(sorted(self.allowed_formats))}")
+        self.image_format, self.content_type = sniffed
+
+
+@dataclass
+class ReceivedUpload:
+    """
+    Result of ``receive_upload``: the stored file and the other (text) form fields.
+
+    When the upload was received with ``commit=False``, ``stored`` is None until ``commit`` is called
+    and ``writer`` holds the file that is not yet in place.
+    """
+    stored: Optional[dict]
+    sha256: str
+    size: int
+    image_format: str
+    filename: Optional[str] = None
+    fields: dict[str, str] = field(default_factory=dict)
+    writer: Optional[StorageWriter] = None
+
+    def reader(self) -> ContextManager[BinaryIO]:
+        """
+        Read back a file received with ``commit=False`` before it is stored.
+        """
+        return self.writer.reader()
+
+    def local_path(self) -> str:
+        """
+        Path of a file received with ``commit=False``, valid until it is committed or aborted.
+        """
+        return self.writer.local_path()
+
+    def commit(self, name: Optional[str] = None) -> dict:
+        """
+        Store a file received with ``commit=False``, optionally under another name in the same folder.
+        """
+        if self.stored is None:
+            self.stored = self.writer.commit(name)
+            self.writer = None
+        return self.stored
+
+    def abort(self) -> None:
+        """
+        Discard a file received with ``commit=False``.
+        """
+        if self.writer is not None:
+            self.writer.abort()
+            self.writer = None
+
+
+def allowed_formats() -> set[str]:
+    return {image_format.strip() for image_format in settings.upload_allowed_formats.split(",") if image_format.strip()}
+
+
+def multipart_openapi(file_field: str, *text_fields: str) -> dict:
+    """
+    OpenAPI request body for endpoints that parse their multipart body with ``receive_upload``.
+    """
+    properties = {file_field: {"type": "string", "format": "binary"}}
+    properties.update({name: {"type": "string"} for name in text_fields})
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {
+        "schema": {"type": "object", "properties": properties, "required": [file_field]}}}}}
+
+
+def _check_multipart(request: Request, max_length: int, detail: str) -> bytes:
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a multipart/form-data body")
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_length:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+    return options[b"boundary"]
+
+
+def _multipart_parser(boundary: bytes, on_part: Callable[[str, Optional[str]], None],
+                      on_data: Callable[[bytes], None], on_end: Callable[[], None]) -> MultipartParser:
+    """
+    Build an incremental multipart parser that reports the name and filename of each part once its
+    headers are parsed (``on_part``), then its data (``on_data``) and its end (``on_end``).
+    """
+    headers: dict[bytes, bytes] = {}
+    header = {"field": b"", "value": b""}
+
+    def on_part_begin():
+        headers.clear()
+
+    def on_header_field(data, start, end):
+        header["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        headers[header["field"].lower()] = header["value"]
+        header.update(field=b"", value=b"")
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(headers.get(b"content-disposition", b""))
+        filename = disposition.get(b"filename")
+        on_part(disposition.get(b"name", b"").decode(), None if filename is None else filename.decode(errors="replace"))
+
+    def on_part_data(data, start, end):
+        on_data(bytes(data[start:end]))
+
+    return MultipartParser(boundary, callbacks={
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_part_end": on_end,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+    })
+
+
+async def receive_upload(request: Request, file_field: str, storage: StorageBackend, folder: str, name: str,
+                         max_bytes: Optional[int] = None, commit: bool = True) -> ReceivedUpload:
+    """
+    Stream a multipart request body into storage without spooling it first.
+
+    The body is parsed incrementally as it arrives; the part named ``file_field`` goes through an
+    ``UploadPipeline`` into ``storage.writer(folder, name)``, other file parts are dropped and text
+    fields are collected (up to 64 KB). Requests whose ``Content-Length`` already exceeds the limit
+    are rejected before any of the body is read.
+
+    Args:
+        request (Request): The incoming request; its body must not have been read yet.
+        file_field (str): Name of the form field holding the image.
+        storage (StorageBackend): Where the file is written.
+        folder (str): Storage folder of the file.
+        name (str): Storage name of the file.
+        max_bytes (int, optional): Size limit of the file, ``UPLOAD_MAX_BYTES`` by default.
+        commit (bool): Store the file before returning; with False the caller decides, from the
+            hash, whether to ``commit`` (possibly under another name) or ``abort`` it.
+
+    Returns:
+        ReceivedUpload: The storage response, SHA-256, size, format, filename and text fields.
+
+    Raises:
+        HTTPException: 400 for a malformed body or missing file, 413 if too large, 415 if not an allowed image.
+    """
+    max_bytes = max_bytes or settings.upload_max_bytes
+    boundary = _check_multipart(request, max_bytes + MAX_FIELDS_BYTES, f"File is larger than {max_bytes} bytes")
+
+    writer = storage.writer(folder, name)
+    pipeline = UploadPipeline(writer, max_bytes, allowed_formats())
+    fields: dict[str, str] = {}
+    fields_size = 0
+    part = {"target": None, "name": None, "data": []}
+    found = {"file": False, "filename": None}
+
+    def on_part(part_name, filename):
+        part.update(name=part_name, data=[])
+        if filename is not None:
+            if part_name == file_field and not found["file"]:
+                found.update(file=True, filename=filename)
+                part["target"] = "file"
+            else:
+                part["target"] = "skip"
+        else:
+            part["target"] = "field"
+
+    def on_data(data):
+        nonlocal fields_size
+        if part["target"] == "file":
+            pipeline.write(data)
+        elif part["target"] == "field":
+            fields_size += len(data)
+            if fields_size > MAX_FIELDS_BYTES:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Form fields too large")
+            part["data"].append(data)
+
+    def on_end():
+        if part["target"] == "file":
+            pipeline.close()
+        elif part["target"] == "field":
+            fields[part["name"]] = b"".join(part["data"]).decode(errors="replace")
+
+    parser = _multipart_parser(boundary, on_part, on_data, on_end)
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                parser.write(chunk)
+        parser.finalize()
+        if not found["file"] or pipeline.image_format is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"No file in field '{file_field}'")
+    except MultipartParseError:
+        writer.abort()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Malformed multipart body")
+    except BaseException:
+        writer.abort()
+        raise
+    upload = ReceivedUpload(stored=None, sha256=pipeline.sha256.hexdigest(), size=pipeline.size,
+                            image_format=pipeline.image_format, filename=found["filename"], fields=fields,
+                            writer=writer)
+    if commit:
+        upload.commit()
+    return upload
+
+
+@dataclass
+class RejectedUpload:
+    """
+    A file of a batch upload that was not received, with the status and reason of the rejection.
+    """
+    filename: Optional[str]
+    status_code: int
+    detail: str
+
+
+async def receive_uploads(request: Request, file_field: str, storage: StorageBackend, folder: str,
+                          name: Callable[[], str], max_files: int,
+                          max_bytes: Optional[int] = None) -> AsyncIterator[Union[ReceivedUpload, RejectedUpload]]:
+    """
+    Stream the files of a multipart request body into storage, yielding each one as soon as its part ends.
+
+    Every part named ``file_field`` goes through its own ``UploadPipeline`` into a writer that is
+    not committed (as ``receive_upload`` with ``commit=False``), so the caller can start processing
+    a file while the next ones are still arriving. A file that is too large or not an allowed image
+    is yielded as a ``RejectedUpload`` without failing the others, as are files beyond ``max_files``.
+    Other parts are ignored.
+
+    Args:
+        request (Request): The incoming request; its body must not have been read yet.
+        file_field (str): Name of the form field holding the images.
+        storage (StorageBackend): Where the files are written.
+        folder (str): Storage folder of the files.
+        name (Callable[[], str]): Returns the storage name of each file.
+        max_files (int): Number of files accepted.
+        max_bytes (int, optional): Size limit of each file, ``UPLOAD_MAX_BYTES`` by default.
+
+    Yields:
+        ReceivedUpload | RejectedUpload: The files in the order of the body.
+
+    Raises:
+        HTTPException: 400 for a malformed body or one without files.
+    """
+    max_bytes = max_bytes or settings.upload_max_bytes
+    boundary = _check_multipart(request, max_files * (max_bytes + MAX_FIELDS_BYTES),
+                                f"Body is larger than {max_files} files of {max_bytes} bytes")
+    formats = allowed_formats()
+    completed: list[Union[ReceivedUpload, RejectedUpload]] = []
+    current = {"pipeline": None, "filename": None}
+    count = 0
+
+    def reject(e: HTTPException):
+        current["pipeline"].writer.abort()
+        completed.append(RejectedUpload(current["filename"], e.status_code, e.detail))
+        current["pipeline"] = None
+
+    def on_part(part_name, filename):
+        nonlocal count
+        current.update(pipeline=None, filename=filename)
+        if part_name != file_field or filename is None:
+            return
+        count += 1
+        if count > max_files:
+            completed.append(RejectedUpload(filename, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                            f"More than {max_files} files"))
+            return
+        current["pipeline"] = UploadPipeline(storage.writer(folder, name()), max_bytes, formats)
+
+    def on_data(data):
+        if current["pipeline"] is not None:
+            try:
+                current["pipeline"].write(data)
+            except HTTPException as e:
+                reject(e)
+
+    def on_end():
+        pipeline = current["pipeline"]
+        if pipeline is None:
+            return
+        try:
+            pipeline.close()
+        except HTTPException as e:
+            reject(e)
+            return
+        completed.append(ReceivedUpload(stored=None, sha256=pipeline.sha256.hexdigest(), size=pipeline.size,
+                                        image_format=pipeline.image_format, filename=current["filename"],
+                                        writer=pipeline.writer))
+        current["pipeline"] = None
+
+    parser = _multipart_parser(boundary, on_part, on_data, on_end)
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                parser.write(chunk)
+            while completed:
+                yield completed.pop(0)
+        parser.finalize()
+        while completed:
+            yield completed.pop(0)
+    except MultipartParseError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Malformed multipart body")
+    finally:
+        if current["pipeline"] is not None:
+            current["pipeline"].writer.abort()
+        for upload in completed:
+            if isinstance(upload, ReceivedUpload):
+                upload.abort()
+    if count == 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"No file in field '{file_field}'")
@@ -1,3 +1,5 @@
+import os
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -7,9 +9,15 @@ from datetime import datetime
 from PIL import Image
 from io import BytesIO
 
+os.environ.setdefault("CACHE_BACKEND", "memory")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
 from main import app
 from src.database.models import Base, User, Comment, Reaction
-from src.database.db import get_db
+from src.database.db import get_db, get_read_db
+from src.database.sqlite import install_sqlite_mode
+from src.services.storage import LocalStorage, get_storage
+from src.services.resize import DiskLRUCache, get_image_cache
 from src.services.auth import auth_service
 from faker import Faker
 
@@ -20,6 +28,7 @@ SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
+install_sqlite_mode(engine)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 templates = Jinja2Templates(directory="templates")
@@ -38,7 +47,17 @@ def session():
 
 
 @pytest.fixture(scope="function")
-def client(session):
+def storage(tmp_path):
+    return LocalStorage(root=str(tmp_path / "media"), base_url="/media")
+
+
+@pytest.fixture
+def image_cache(tmp_path):
+    return DiskLRUCache(str(tmp_path / "cache"), 1024 * 1024)
+
+
+@pytest.fixture(scope="function")
+def client(session, storage, image_cache):
     def override_get_db():
         try:
             yield session
@@ -46,6 +65,9 @@ def client(session):
             session.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    app.dependency_overrides[get_storage] = lambda: storage
+    app.dependency_overrides[get_image_cache] = lambda: image_cache
 
     yield TestClient(app)
 
@@ -0,0 +1,36 @@
+import pytest
+from sqlalchemy.orm import Session
+
+from src.database.models import Asset
+from src.repository import assets as repository_assets
+
+PICTURE_JSON = {"public_id": "picture/abc", "folder": "picture", "version": 1}
+
+
+@pytest.mark.asyncio
+async def test_asset_reference_counting(session: Session):
+    asset, replaced = await repository_assets.create_asset("abc", PICTURE_JSON, "/media/picture/abc",
+                                                           "/media/qr_code/abc", 10, session)
+    assert replaced is None
+    assert await repository_assets.acquire_asset("abc", session) is asset
+    assert await repository_assets.acquire_asset("other", session) is None
+    assert asset.ref_count == 2
+
+    assert await repository_assets.release_asset(asset.id, session) is None
+    assert await repository_assets.delete_unreferenced_asset(asset.id, session) is None
+    assert await repository_assets.release_asset(asset.id, session) is asset
+    assert await repository_assets.acquire_asset("abc", session) is None
+
+
+@pytest.mark.asyncio
+async def test_create_asset_reuses_unreferenced_row(session: Session):
+    stale = {"public_id": "picture/abc_old", "folder": "picture", "version": 1}
+    session.add(Asset(sha256="abc", picture_json=stale, picture_url="stale", size=0, ref_count=0))
+    session.commit()
+
+    asset, replaced = await repository_assets.create_asset("abc", PICTURE_JSON, "/media/picture/abc", None, 10, session)
+    session.commit()
+
+    assert replaced == {"picture_json": stale, "derivatives": None}
+    assert session.query(Asset).count() == 1
+    assert (asset.ref_count, asset.picture_url, asset.size) == (1, "/media/picture/abc", 10)
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.database.models import Base, Picture, Rating, User
+from src.repository import rating as repository_rating
+from src.tests.conftest import TestingSessionLocal
+
+
+def _seed(session: Session, users: int) -> list[User]:
+    session.add_all([User(id=i, username=f"rater{i}", email=f"rater{i}@example.com", password="secret")
+                     for i in range(1, users + 1)])
+    session.add(Picture(id=1, picture_url="https://example.com/1.jpg", user_id=1))
+    session.commit()
+    return session.query(User).order_by(User.id).all()
+
+
+@pytest.mark.asyncio
+async def test_add_rating_updates_existing_rating_and_counters(session: Session):
+    user, other = _seed(session, 2)
+
+    await repository_rating.add_rating_to_picture(1, 3, user, session)
+    await repository_rating.add_rating_to_picture(1, 5, user, session)
+    await repository_rating.add_rating_to_picture(1, 2, other, session)
+
+    assert session.query(Rating).count() == 2
+    picture = session.get(Picture, 1)
+    session.refresh(picture)
+    assert (picture.rating_count, picture.rating_sum) == (2, 7)
+    assert picture.average_rating == 3.5
+    assert await repository_rating.get_average_of_rating(1, session) == {"average_rating": 3.5}
+
+    await repository_rating.remove_rating_from_picture(1, user, session)
+
+    session.refresh(picture)
+    assert (picture.rating_count, picture.rating_sum) == (1, 2)
+
+
+@pytest.mark.asyncio
+async def test_add_rating_to_missing_picture(session: Session):
+    user, = _seed(session, 1)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await repository_rating.add_rating_to_picture(99, 4, user, session)
+
+    assert exc_info.value.status_code == 404
+
+
+def _rate_concurrently(session: Session, session_factory):
+    users = _seed(session, 5)
+    user_ids = [user.id for user in users]
+
+    def rate(seed: int):
+        rng = random.Random(seed)
+        db = session_factory()
+        try:
+            for _ in range(20):
+                user = db.get(User, rng.choice(user_ids))
+                asyncio.run(repository_rating.add_rating_to_picture(1, rng.randint(1, 5), user, db))
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(rate, range(8)))
+
+    session.expire_all()
+    duplicates = (session.query(Rating.picture_id, Rating.user_id)
+                  .group_by(Rating.picture_id, Rating.user_id)
+                  .having(func.count() > 1).count())
+    assert duplicates == 0
+    count, total = session.query(func.count(Rating.id), func.sum(Rating.rat)).one()
+    picture = session.get(Picture, 1)
+    assert (picture.rating_count, picture.rating_sum) == (count, total)
+
+
+def test_concurrent_ratings_do_not_create_duplicates(session: Session):
+    _rate_concurrently(session, TestingSessionLocal)
+
+
+@pytest.mark.skipif(not os.environ.get("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL is not set")
+def test_concurrent_ratings_on_postgres():
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, autoflush=False)
+    try:
+        with session_factory() as session:
+            _rate_concurrently(session, session_factory)
+    finally:
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
@@ -0,0 +1,47 @@
+def test_media_full_and_conditional(client, storage):
+    stored = storage.put(b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4, folder="picture", name="media")
+
+    response = client.get(f"/media/{stored['public_id']}")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["accept-ranges"] == "bytes"
+    assert len(response.content) == stored["bytes"]
+
+    etag = response.headers["etag"]
+    response = client.get(f"/media/{stored['public_id']}", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_media_ranges(client, storage):
+    data = bytes(range(256)) * 4
+    stored = storage.put(data, folder="picture", name="ranged")
+    url = f"/media/{stored['public_id']}"
+
+    response = client.get(url, headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 10-19/{len(data)}"
+    assert response.content == data[10:20]
+
+    response = client.get(url, headers={"Range": "bytes=-5"})
+    assert response.status_code == 206
+    assert response.content == data[-5:]
+
+    response = client.get(url, headers={"Range": "bytes=1000-"})
+    assert response.status_code == 206
+    assert response.content == data[1000:]
+
+    response = client.get(url, headers={"Range": f"bytes={len(data)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(data)}"
+
+    response = client.get(url, headers={"Range": "bytes=0-1", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == data
+
+
+def test_media_not_found(client):
+    assert client.get("/media/picture/missing").status_code == 404
+    assert client.get("/media/../main.py").status_code == 404
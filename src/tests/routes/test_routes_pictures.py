@@ -1,10 +1,15 @@
+import json
 import pytest
 
+from io import BytesIO
 from unittest.mock import patch, MagicMock
 from datetime import datetime
+from pathlib import Path
+from PIL import Image
 
-from src.database.models import Picture
+from src.database.models import Asset, Picture
 from src.services.auth import auth_service
+from src.services.phash import SimilarityIndex
 from src.tests.conftest import login_user_token_created, login_user_token_created_unconfirmed
 from src.routes import pictures
 
@@ -47,6 +52,103 @@ def test_upload_picture(user, session, client, mock_picture):
         assert "created_at" in data
 
 
+def test_upload_picture_not_an_image(user, session, client, storage):
+    new_user = login_user_token_created(user, session)
+
+    with patch.object(auth_service, 'r') as r_mock:
+        r_mock.get.return_value = None
+        response = client.post(
+            "/api/pictures/upload",
+            headers={"Authorization": f"Bearer {new_user['access_token']}"},
+            files={"picture": ("test_image.png", b"<svg onload='alert(1)'></svg>", "image/png")},
+        )
+
+        assert response.status_code == 415, response.text
+        assert session.query(Picture).count() == 0
+
+
+def test_upload_duplicate_picture_reuses_asset(user, session, client, storage, mock_picture):
+    new_user = login_user_token_created(user, session)
+    headers = {"Authorization": f"Bearer {new_user['access_token']}"}
+    content = mock_picture.getvalue()
+
+    def stored_files():
+        return sorted(str(path.relative_to(storage.root)) for path in Path(storage.root).rglob("*") if path.is_file())
+
+    with patch.object(auth_service, 'r') as r_mock:
+        r_mock.get.return_value = None
+        first = client.post("/api/pictures/upload", headers=headers,
+                            files={"picture": ("first.png", content, "image/png")}).json()
+        files = stored_files()
+        with patch("src.services.assets.generate_qr_and_upload") as qr_mock:
+            second = client.post("/api/pictures/upload", headers=headers,
+                                 files={"picture": ("second.png", content, "image/png")}).json()
+
+        assert qr_mock.call_count == 0
+        assert stored_files() == files and len(files) == 4  # picture, QR code, WebP and JPEG derivatives
+        assert first["id"] != second["id"]
+        assert (first["picture_url"], first["qr_code_picture"]) == (second["picture_url"], second["qr_code_picture"])
+        asset = session.query(Asset).one()
+        assert asset.ref_count == 2
+        assert asset.phash is not None
+        assert {picture.phash for picture in session.query(Picture)} == {asset.phash}
+
+        assert client.delete(f"/api/pictures/{first['id']}", headers=headers).status_code == 200
+        assert stored_files() == files
+        assert session.query(Asset.ref_count).scalar() == 1
+
+        assert client.delete(f"/api/pictures/{second['id']}", headers=headers).status_code == 200
+        assert stored_files() == []
+        assert session.query(Asset).count() == 0
+
+
+def test_upload_batch_streams_per_file_results(user, session, client, storage, mock_picture):
+    new_user = login_user_token_created(user, session)
+    headers = {"Authorization": f"Bearer {new_user['access_token']}"}
+    content = mock_picture.getvalue()
+    other = BytesIO()
+    Image.new("RGB", (40, 30), (0, 0, 255)).save(other, format="JPEG")
+
+    with patch.object(auth_service, 'r') as r_mock:
+        r_mock.get.return_value = None
+        stored = client.post("/api/pictures/upload", headers=headers,
+                             files={"picture": ("stored.png", content, "image/png")}).json()
+        response = client.post("/api/pictures/upload/batch", headers=headers, files=[
+            ("pictures", ("again.png", content, "image/png")),
+            ("pictures", ("fake.png", b"<svg onload='alert(1)'></svg>", "image/png")),
+            ("pictures", ("new.jpg", other.getvalue(), "image/jpeg")),
+            ("pictures", ("copy.jpg", other.getvalue(), "image/jpeg")),
+            ("pictures", ("again-copy.png", content, "image/png")),
+        ])
+
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/x-ndjson"
+    results = {line["index"]: line for line in map(json.loads, response.text.splitlines())}
+    assert {index: line["status_code"] for index, line in results.items()} == {0: 201, 1: 415, 2: 201, 3: 201, 4: 201}
+    assert results[1]["filename"] == "fake.png"
+    assert results[0]["picture"]["picture_url"] == results[4]["picture"]["picture_url"] == stored["picture_url"]
+    assert results[2]["picture"]["picture_url"] == results[3]["picture"]["picture_url"]
+
+    session.expire_all()
+    assert session.query(Picture).count() == 5
+    assert sorted(asset.ref_count for asset in session.query(Asset)) == [2, 3]
+    assert session.get(Picture, results[2]["picture"]["id"]).width == 40
+    assert len([path for path in Path(storage.root).rglob("*") if path.is_file()]) == 8
+
+
+def test_upload_batch_rejects_extra_files(user, session, client, mock_picture):
+    new_user = login_user_token_created(user, session)
+    with patch.object(auth_service, 'r') as r_mock, \
+            patch.object(pictures.settings, "upload_batch_max_files", 1):
+        r_mock.get.return_value = None
+        response = client.post("/api/pictures/upload/batch",
+                               headers={"Authorization": f"Bearer {new_user['access_token']}"},
+                               files=[("pictures", ("a.png", mock_picture.getvalue(), "image/png"))] * 2)
+
+    assert [line["status_code"] for line in map(json.loads, response.text.splitlines())] == [413, 201]
+    assert session.query(Picture).count() == 1
+
+
 def test_upload_picture_unauthorized(user, session, client, mock_picture):
     new_user = login_user_token_created_unconfirmed(user, session)
 
@@ -283,7 +385,7 @@ def test_delete_picture_not_found(admin, session, client):
         assert response.status_code == 404, response.text
 
 @pytest.mark.asyncio
-async def test_edit_picture(admin, session, client):
+async def test_edit_picture(admin, session, client, mock_picture):
     new_user = login_user_token_created(admin, session)
 
     picture_id = 1
@@ -302,9 +404,7 @@ async def test_edit_picture(admin, session, client):
 
     with patch.object(auth_service, 'r') as r_mock, \
         patch("src.routes.pictures.repository_pictures.get_one_picture", return_value=picture_mock) as mock_get_one_picture, \
-        patch("src.routes.pictures.cloudinary.uploader.upload") as mock_cloudinary_upload, \
-        patch("src.routes.pictures.generate_qr_and_upload_to_cloudinary") as mock_generate_qr_and_upload, \
-        patch("src.routes.pictures.cloudinary.CloudinaryImage") as mock_cloudinary_image:
+        patch("src.services.edits.generate_qr_and_upload") as mock_generate_qr_and_upload:
 
         r_mock.get.return_value = None
         response = client.post(
@@ -323,18 +423,60 @@ async def test_edit_picture(admin, session, client):
         expected_edited_url = "https://res.cloudinary.com/dummy/image/upload/vedited_version/edited_public_id"
         expected_qr_url = "https://res.cloudinary.com/dummy/image/upload/qrcode/edited_qr"
 
-        mock_picture_upload = MagicMock(return_value=expected_edited_data)
-        mock_build_url = MagicMock(return_value=expected_edited_url)
+        mock_storage = MagicMock()
+        mock_storage.get.return_value = mock_picture.getvalue()
+        mock_storage.put.return_value = expected_edited_data
+        mock_storage.url.return_value = expected_edited_url
         mock_qr_upload = MagicMock(return_value=expected_qr_url)
 
-        mock_cloudinary_upload.side_effect = mock_picture_upload
         mock_generate_qr_and_upload.side_effect = mock_qr_upload
-        mock_cloudinary_image.return_value.build_url = mock_build_url
 
-        edited_picture = await pictures.edit_picture(picture_id, picture_edit, admin, db=session)
+        edited_picture = await pictures.edit_picture(picture_id, picture_edit, admin, db=session, storage=mock_storage)
 
     assert edited_picture == {
         "picture_edited_url": expected_edited_url,
         "qr_code_picture_edited": expected_qr_url
     }
+    assert mock_storage.transform.call_count == 0
+    folder, name = mock_storage.put.call_args.args[1:]
+    assert folder == "" and name.startswith("public_id_") and name.endswith("_edited")
     assert response.status_code == 422, response.text
+
+
+def test_get_similar_pictures(user, session, client, monkeypatch):
+    new_user = login_user_token_created(user, session)
+    monkeypatch.setattr("src.repository.pictures.similarity_index", SimilarityIndex())
+    hashes = {1: 0b1011, 2: 0b1010, 3: 0b0100, 4: -1, 5: None}
+    for picture_id, value in hashes.items():
+        session.add(Picture(id=picture_id, picture_url=f"test_url{picture_id}", phash=value))
+    session.commit()
+
+    with patch.object(auth_service, 'r') as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {new_user['access_token']}"}
+        response = client.get("/api/pictures/1/similar", params={"distance": 2}, headers=headers)
+        not_hashed = client.get("/api/pictures/5/similar", headers=headers)
+
+    assert response.status_code == 200, response.text
+    assert [(picture["id"], picture["distance"]) for picture in response.json()] == [(2, 1)]
+    assert not_hashed.status_code == 409
+
+
+def test_get_similar_pictures_rechecks_stale_index(user, session, client, monkeypatch):
+    new_user = login_user_token_created(user, session)
+    monkeypatch.setattr("src.repository.pictures.similarity_index", SimilarityIndex())
+    for picture_id, value in {1: 0b1011, 2: 0b1010, 3: 0b1001, 4: 0b1111}.items():
+        session.add(Picture(id=picture_id, picture_url=f"test_url{picture_id}", phash=value))
+    session.commit()
+
+    with patch.object(auth_service, 'r') as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {new_user['access_token']}"}
+        indexed = client.get("/api/pictures/1/similar", params={"distance": 1}, headers=headers)
+        session.get(Picture, 2).phash = -1  # the file was replaced
+        session.delete(session.get(Picture, 3))
+        session.commit()
+        stale = client.get("/api/pictures/1/similar", params={"distance": 1, "limit": 1}, headers=headers)
+
+    assert [picture["id"] for picture in indexed.json()] == [2, 3, 4]
+    assert [(picture["id"], picture["distance"]) for picture in stale.json()] == [(4, 1)]
@@ -1,11 +1,19 @@
+from src.database.models import Picture
 from src.tests.conftest import login_user_token_created
 
 
+def store_picture(picture, session):
+    session.add(Picture(id=picture.id, picture_url="https://example.com/picture.jpg",
+                        description=picture.description, user_id=picture.user_id))
+    session.commit()
+
+
 def test_routes_rating(user, admin, picture_s, session, client):
     user_1 = login_user_token_created(user, session)
     user_2 = login_user_token_created(admin, session)
 
     picture = picture_s
+    store_picture(picture, session)
 
     response = client.post(
         "/api/rating/",
@@ -97,6 +105,7 @@ def test_routes_rating_admin(user, admin, picture_s, session, client):
     user_1 = login_user_token_created(user, session)
     user_2 = login_user_token_created(admin, session)
     picture = picture_s
+    store_picture(picture, session)
 
     client.post(
         "/api/rating/",
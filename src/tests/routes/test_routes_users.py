@@ -1,3 +1,10 @@
+import csv
+import io
+import json
+import tarfile
+from datetime import datetime
+
+from src.database.models import Comment, Message, Picture, Rating, Reaction, Tag, User
 from src.tests.conftest import login_user_confirmed_true_and_hash_password, login_user_token_created
 
 
@@ -80,3 +87,90 @@ def test_read_nonexistent_user_by_username(client):
     response = client.get(f"/api/users/name/{user_name}")
 
     assert response.status_code == 404
+
+
+def test_export_users_me_streams_own_data(user, admin, session, client):
+    token_user = login_user_token_created(user, session)
+    token_admin = login_user_token_created(admin, session)
+    owner = session.query(User).filter(User.email == user.email).one()
+    other = session.query(User).filter(User.email == admin.email).one()
+    picture = Picture(picture_url="url", user_id=owner.id, tags=[Tag(name="sea")])
+    session.add_all([picture, Picture(picture_url="other", user_id=other.id)])
+    session.flush()
+    comment = Comment(user_id=owner.id, picture_id=picture.id, content="nice", created_at=datetime(2024, 1, 2))
+    session.add_all([comment, Rating(user_id=owner.id, picture_id=picture.id, rat=5),
+                     Message(sender_id=other.id, receiver_id=owner.id, content="hi")])
+    session.flush()
+    session.add(Reaction(comment_id=comment.id, data={"like": [other.id]}))
+    session.commit()
+    comment_id, other_id = comment.id, other.id
+
+    response = client.get("/api/users/me/export", headers={"Authorization": f"Bearer {token_user['access_token']}"})
+
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/x-ndjson"
+    records = [json.loads(line) for line in response.text.splitlines()]
+    by_type = {}
+    for record in records:
+        by_type.setdefault(record.pop("type"), []).append(record)
+    assert list(by_type) == ["users", "pictures", "comments", "ratings", "reactions", "messages"]
+    assert "password" not in by_type["users"][0] and [u["email"] for u in by_type["users"]] == [user.email]
+    assert [(p["picture_url"], p["tags"]) for p in by_type["pictures"]] == [("url", ["sea"])]
+    assert {c["content"]: c["created_at"] for c in by_type["comments"]}["nice"] == "2024-01-02T00:00:00"
+    assert {r["comment_id"]: r["data"] for r in by_type["reactions"]}[comment_id] == {"like": [other_id]}
+    assert [m["content"] for m in by_type["messages"]] == ["hi"]
+
+    backup = client.get("/api/admin/export", headers={"Authorization": f"Bearer {token_admin['access_token']}"})
+    with tarfile.open(fileobj=io.BytesIO(backup.content)) as tar:
+        pictures = tar.extractfile("photoshare-backup/pictures.ndjson").read().decode().splitlines()
+        assert len(tar.getnames()) == 6
+    assert [json.loads(line)["picture_url"] for line in pictures][-2:] == ["url", "other"]
+    assert client.get("/api/admin/export",
+                      headers={"Authorization": f"Bearer {token_user['access_token']}"}).status_code == 403
+
+
+def test_list_all_users_paginates_with_filters_and_counts(client, admin, session):
+    token_details = login_user_token_created(admin, session)
+    headers = {"Authorization": f"Bearer {token_details['access_token']}"}
+    session.add_all([User(username=f"user{i}", email=f"user{i}@example.com", password="x", confirmed=i % 2 == 0,
+                          ban_status=i == 3, moderator=i == 4) for i in range(6)])
+    session.commit()
+    owner = session.query(User).filter(User.email == "user2@example.com").one()
+    session.add_all([Picture(picture_url="a", user_id=owner.id), Picture(picture_url="b", user_id=owner.id)])
+    session.commit()
+
+    first = client.get("/api/users/all", params={"limit": 4}, headers=headers)
+    second = client.get("/api/users/all", params={"limit": 4, "after": first.headers["x-next-cursor"]},
+                        headers=headers)
+
+    assert first.status_code == 200, first.text
+    emails = [u["email"] for u in first.json() + second.json()]
+    assert emails == [admin.email] + [f"user{i}@example.com" for i in range(6)]
+    assert "x-next-cursor" not in second.headers
+    counts = {u["email"]: (u["picture_count"], u["role"]) for u in first.json() + second.json()}
+    assert counts["user2@example.com"] == (2, "user") and counts[admin.email] == (0, "admin")
+
+    def emails_of(**params):
+        return [u["email"] for u in client.get("/api/users/all", params=params, headers=headers).json()]
+
+    assert emails_of(banned=True) == ["user3@example.com"]
+    assert emails_of(role="moderator", confirmed=True) == ["user4@example.com"]
+    assert emails_of(confirmed=False, banned=False) == ["user1@example.com", "user5@example.com"]
+
+    export = client.get("/api/users/all/export", params={"role": "user", "confirmed": True}, headers=headers)
+    rows = list(csv.DictReader(io.StringIO(export.text)))
+    assert export.headers["content-type"].startswith("text/csv")
+    assert [(row["email"], row["picture_count"], row["role"]) for row in rows] == [
+        ("user0@example.com", "0", "user"), ("user2@example.com", "2", "user")]
+
+    page = client.get("/users", params={"role": "moderator"},
+                      cookies={"refresh_token": token_details["refresh_token"]})
+    assert page.status_code == 200, page.text
+    assert "user4@example.com" in page.text and "user2@example.com" not in page.text
+    assert 'href="/users/export?role=moderator"' in page.text
+    download = client.get("/users/export", params={"role": "moderator"},
+                          cookies={"refresh_token": token_details["refresh_token"]})
+    assert download.status_code == 200, download.text
+    assert [row["email"] for row in csv.DictReader(io.StringIO(download.text))] == ["user4@example.com"]
+    client.cookies.clear()
+    assert client.get("/users/export").status_code == 401
@@ -0,0 +1,42 @@
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import Session
+
+from benchmarks.dataset import SCALES, DatasetGenerator
+from benchmarks.micro import compare_to_baseline
+from benchmarks.report import percentile, summarize
+from src.database.models import Picture, Rating, Reaction, User
+
+
+def test_dataset_generator_tiny_scale():
+    engine = create_engine("sqlite://")
+    counts = SCALES["tiny"]
+
+    DatasetGenerator(engine, seed=1, batch_size=100, **counts).run()
+
+    with Session(engine) as db:
+        assert db.query(User).count() == counts["users"]
+        assert db.query(Picture).count() == counts["pictures"]
+        assert db.query(Rating).count() <= counts["ratings"]
+        duplicates = (db.query(Rating.picture_id, Rating.user_id)
+                      .group_by(Rating.picture_id, Rating.user_id)
+                      .having(func.count() > 1).count())
+        assert duplicates == 0
+        hottest = db.query(Reaction).filter(Reaction.comment_id == 1).one()
+        assert sum(len(users) for users in hottest.data.values()) == counts["hot_comment_reactions"]
+
+
+def test_report_percentiles():
+    values = [float(value) for value in range(1, 101)]
+
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert summarize(values, errors=2, elapsed_s=10)["throughput_rps"] == 10.0
+
+
+def test_micro_compare_to_baseline():
+    baseline = {"cases": {"get_comments": {"p50_ms": 1.0, "peak_bytes_per_call": 1000, "queries_per_call": 1.0}}}
+    same = {"cases": {"get_comments": {"p50_ms": 1.1, "peak_bytes_per_call": 1100, "queries_per_call": 1.2}}}
+    worse = {"cases": {"get_comments": {"p50_ms": 1.5, "peak_bytes_per_call": 1000, "queries_per_call": 3.0}}}
+
+    assert compare_to_baseline(same, baseline, threshold=0.2) == []
+    assert len(compare_to_baseline(worse, baseline, threshold=0.2)) == 2
@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+from src.conf.config import settings
+from src.database.pool import InstrumentedQueuePool, engine_options, install_pool_metrics
+from src.services.metrics import metrics
+
+
+@pytest.fixture
+def pool_settings(monkeypatch):
+    for name, value in (("db_pool_size", 1), ("db_max_overflow", 1), ("db_pool_timeout", 0.2),
+                        ("db_pool_recycle", 600), ("db_statement_timeout_ms", 5000)):
+        monkeypatch.setattr(settings, name, value)
+
+
+def test_engine_options_come_from_settings(pool_settings):
+    options = engine_options("postgresql://user:secret@db/photoshare")
+    assert options["poolclass"] is InstrumentedQueuePool
+    assert (options["pool_size"], options["max_overflow"], options["pool_timeout"], options["pool_recycle"]) \
+        == (1, 1, 0.2, 600)
+    assert options["connect_args"] == {"options": "-c statement_timeout=5000"}
+    assert "poolclass" not in engine_options("sqlite://")
+
+
+def test_pool_exports_checkouts_waits_and_timeouts(pool_settings, tmp_path):
+    url = f"sqlite:///{tmp_path / 'pool.db'}"
+    engine = create_engine(url, **engine_options(url, "test"))
+    install_pool_metrics(engine, "test")
+    metrics.reset()
+
+    first, second = engine.connect(), engine.connect()
+    assert (metrics.get("db.pool.test.checked_out"), metrics.get("db.pool.test.overflow")) == (2, 1)
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    assert metrics.get("db.pool.test.timeouts") == 1
+
+    threading.Timer(0.05, first.close).start()
+    with engine.connect() as third:
+        third.execute(text("SELECT 1"))
+    second.close()
+
+    assert metrics.get("db.pool.test.waits") == 2
+    assert metrics.get("db.pool.test.wait_seconds") >= 0.2 + 0.05
+    assert metrics.get("db.pool.test.checked_out") == 0
+    assert metrics.get("db.pool.test.checkouts") == 3
+    engine.dispose()
@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, Tag
+from src.database.replica import ReplicaMonitor, RoutingSession
+from src.services.metrics import metrics
+
+
+@pytest.fixture
+def databases(tmp_path):
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    for engine, name in ((primary, "on-primary"), (replica, "on-replica")):
+        Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(Tag.__table__.insert(), [{"name": name}])
+    yield primary, replica
+    primary.dispose()
+    replica.dispose()
+
+
+def tag_names(db) -> list[str]:
+    return db.scalars(select(Tag.name).order_by(Tag.name)).all()
+
+
+def test_reads_go_to_replica_until_the_session_writes(databases):
+    primary, replica = databases
+    ReadSession = sessionmaker(class_=RoutingSession, bind=primary, replica=replica,
+                               monitor=ReplicaMonitor(replica, max_lag=5, check_interval=0, lag=lambda c: 0.5))
+
+    with ReadSession() as db:
+        assert tag_names(db) == ["on-replica"]
+        db.add(Tag(name="written"))
+        db.commit()
+        assert tag_names(db) == ["on-primary", "written"]
+
+    with ReadSession() as db:
+        assert tag_names(db) == ["on-replica"]
+        db.execute(select(Tag).with_for_update()).all()
+        assert tag_names(db) == ["on-primary", "written"]
+
+
+def test_lagging_or_unreachable_replica_falls_back_to_primary(databases):
+    primary, replica = databases
+    lag = {"seconds": 30.0}
+
+    def measure(connection):
+        if lag["seconds"] is None:
+            raise ConnectionError("replica down")
+        return lag["seconds"]
+
+    monitor = ReplicaMonitor(replica, max_lag=5, check_interval=0, lag=measure)
+    ReadSession = sessionmaker(class_=RoutingSession, bind=primary, replica=replica, monitor=monitor)
+    metrics.reset()
+
+    with ReadSession() as db:
+        assert tag_names(db) == ["on-primary"]
+    lag["seconds"] = 1.0
+    with ReadSession() as db:
+        assert tag_names(db) == ["on-replica"]
+        lag["seconds"] = 30.0
+        assert tag_names(db) == ["on-replica"]
+    lag["seconds"] = None
+    with ReadSession() as db:
+        assert tag_names(db) == ["on-primary"]
+
+    assert (metrics.get("db.replica.sessions"), metrics.get("db.replica.fallbacks")) == (1, 2)
+    assert metrics.get("db.replica.lag_seconds") == 1.0
+
+
+def test_lag_is_measured_once_per_interval(databases):
+    primary, replica = databases
+    calls = []
+    monitor = ReplicaMonitor(replica, max_lag=5, check_interval=60, lag=lambda c: calls.append(c) or 0.0)
+
+    assert monitor.usable() and monitor.usable()
+    assert len(calls) == 1
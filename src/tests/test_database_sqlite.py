@@ -0,0 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, Tag
+from src.database.sqlite import install_sqlite_mode
+
+
+def test_sqlite_mode_sets_pragmas_and_serializes_concurrent_writes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}", connect_args={"check_same_thread": False},
+                           pool_size=8)
+    install_sqlite_mode(engine)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+
+    def tag(worker: int):
+        for i in range(20):
+            with Session() as db:
+                count = db.scalar(select(func.count(Tag.id)))
+                db.add(Tag(name=f"{worker}-{i}-{count}"))
+                db.commit()
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(tag, range(8)))
+
+    with Session() as db:
+        assert db.scalar(select(func.count(Tag.id))) == 160
+        db.execute(text("SELECT 1"))
+        assert not db.connection().connection.dbapi_connection.in_transaction
+    engine.dispose()
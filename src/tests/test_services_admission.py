@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from src.services.admission import AdmissionGate, AdmissionMiddleware, parse_limits
+from src.services.metrics import metrics
+
+
+def test_parse_limits():
+    assert parse_limits("upload=8, edit=4,") == {"upload": 8, "edit": 4}
+
+
+@pytest.mark.asyncio
+async def test_gate_queues_then_rejects_and_hands_slots_over_in_order():
+    gate = AdmissionGate("test", limit=1, queue_size=2, timeout=1)
+    metrics.reset()
+    order = []
+
+    async def request(name: str):
+        if not await gate.acquire():
+            order.append(f"{name} rejected")
+            return
+        order.append(name)
+        await asyncio.sleep(0.01)
+        gate.release(0.01)
+
+    await asyncio.gather(*(request(name) for name in "abcd"))
+
+    assert order == ["a", "d rejected", "b", "c"]
+    assert metrics.get("admission.test.admitted") == 3
+    assert metrics.get("admission.test.rejected") == 1
+    assert (metrics.get("admission.test.active"), metrics.get("admission.test.queued")) == (0, 0)
+    assert gate.retry_after() == 1
+
+
+@pytest.mark.asyncio
+async def test_gate_times_out_waiting_requests():
+    gate = AdmissionGate("slow", limit=1, queue_size=1, timeout=0.01)
+    metrics.reset()
+    assert await gate.acquire()
+    assert not await gate.acquire()
+    gate.release()
+    assert await gate.acquire()
+    assert metrics.get("admission.slow.timeouts") == 1
+
+
+@pytest.mark.asyncio
+async def test_middleware_answers_503_with_retry_after_when_the_class_is_full():
+    release = asyncio.Event()
+
+    async def app(scope, receive, send):
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    middleware = AdmissionMiddleware(app, limits={"edit": 1}, queue_size=0, timeout=1)
+
+    async def call(method: str, path: str) -> list[dict]:
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        await middleware({"type": "http", "method": method, "path": path, "headers": []}, None, send)
+        return messages
+
+    running = asyncio.create_task(call("POST", "/api/pictures/edit/1"))
+    await asyncio.sleep(0)
+    refused = await call("POST", "/api/pictures/edit/2")
+    assert refused[0]["status"] == 503
+    assert (b"retry-after", b"1") in refused[0]["headers"]
+
+    release.set()
+    assert (await running)[0]["status"] == 200
+    assert (await call("GET", "/api/pictures/"))[0]["status"] == 200
+    assert middleware.gate("POST", "/api/search/pictures") is None
+    assert middleware.gate("POST", "/picture/edit/2") is None
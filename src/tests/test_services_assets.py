@@ -0,0 +1,55 @@
+import hashlib
+import os
+
+import pytest
+from sqlalchemy.orm import Session
+
+from src.database.models import Asset
+from src.services.assets import prepare_picture_asset, purge_asset, record_picture_asset, store_picture_asset
+from src.services.uploads import ReceivedUpload, UploadPipeline, allowed_formats
+
+
+def _received(storage, content: bytes) -> ReceivedUpload:
+    pipeline = UploadPipeline(storage.writer("picture", "upload"), len(content) + 1, allowed_formats())
+    pipeline.write(content)
+    pipeline.close()
+    return ReceivedUpload(stored=None, sha256=hashlib.sha256(content).hexdigest(), size=pipeline.size,
+                          image_format=pipeline.image_format, writer=pipeline.writer)
+
+
+def _exists(storage, asset_json: dict) -> bool:
+    return os.path.isfile(storage.path(asset_json["public_id"]))
+
+
+@pytest.mark.asyncio
+async def test_purge_does_not_delete_files_of_a_concurrent_upload(session: Session, storage, mock_picture):
+    content = mock_picture.getvalue()
+    old = await store_picture_asset(_received(storage, content), storage, session)
+    old.ref_count = 0  # its last picture was deleted, the purge is pending
+    session.commit()
+    old_json = old.picture_json
+
+    prepared = await prepare_picture_asset(_received(storage, content), storage)
+    assert await purge_asset(old.id, storage, session)
+    asset = await record_picture_asset(prepared, storage, session)
+    session.commit()
+
+    assert not _exists(storage, old_json)
+    assert _exists(storage, asset.picture_json)
+    assert session.query(Asset).count() == 1
+
+
+@pytest.mark.asyncio
+async def test_reused_asset_row_files_are_deleted(session: Session, storage, mock_picture):
+    content = mock_picture.getvalue()
+    old = await store_picture_asset(_received(storage, content), storage, session)
+    old.ref_count = 0  # a purge failed and left the row behind
+    session.commit()
+    old_json = old.picture_json
+
+    asset = await store_picture_asset(_received(storage, content), storage, session)
+    session.commit()
+
+    assert asset.id == old.id and asset.ref_count == 1
+    assert not _exists(storage, old_json)
+    assert _exists(storage, asset.picture_json)
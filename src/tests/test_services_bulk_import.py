@@ -0,0 +1,47 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+from src.database.models import Asset, Picture, User
+from src.services.bulk_import import import_directory
+from src.tests.conftest import login_user_confirmed_true_and_hash_password
+
+
+def write_image(path, color, size=(40, 30)):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = io.BytesIO()
+    Image.new("RGB", size, color).save(data, format="JPEG")
+    with open(path, "wb") as f:
+        f.write(data.getvalue())
+
+
+@pytest.mark.asyncio
+async def test_import_skips_known_content_and_resumes(user, session, storage, tmp_path):
+    login_user_confirmed_true_and_hash_password(user, session)
+    owner = session.query(User).filter(User.email == user.email).one()
+    root = tmp_path / "library"
+    write_image(str(root / "beach" / "a.jpg"), (255, 0, 0))
+    write_image(str(root / "beach" / "copy.jpg"), (255, 0, 0))
+    write_image(str(root / "city" / "b.jpg"), (0, 0, 255), (60, 20))
+    (root / "notes.txt").write_text("not an image")
+    checkpoint = str(tmp_path / "import.checkpoint")
+
+    with ThreadPoolExecutor(2) as executor:
+        report = await import_directory(str(root), owner, storage, session, ["trip"], directory_tags=True,
+                                        batch_size=2, workers=2, checkpoint=checkpoint, executor=executor)
+        write_image(str(root / "city" / "c.jpg"), (0, 255, 0))
+        resumed = await import_directory(str(root), owner, storage, session, batch_size=2, checkpoint=checkpoint,
+                                         executor=executor)
+
+    assert (report.imported, report.skipped, report.failed) == (2, 2, 0)
+    assert report.rate > 0
+    assert (resumed.imported, resumed.skipped) == (1, 0)
+    pictures = session.query(Picture).order_by(Picture.id).all()
+    assert [sorted(tag.name for tag in picture.tags) for picture in pictures] == [["beach", "trip"], ["city", "trip"], []]
+    assert (pictures[1].width, pictures[1].height, pictures[1].user_id) == (60, 20, owner.id)
+    assert all(picture.qr_code_picture and picture.phash is not None for picture in pictures)
+    assert session.query(Asset).count() == 3
+    assert len(open(checkpoint).read().splitlines()) == 5
@@ -0,0 +1,57 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.conf.config import settings
+from src.services.auth import auth_service
+from src.services.cache import MemoryCache, TwoTierCache, get_cache
+
+
+def test_memory_cache_expires_and_evicts_least_recently_used():
+    cache = MemoryCache(max_entries=2)
+    cache.set("a", b"1")
+    cache.set("b", b"2", ex=0.05)
+    assert cache.get("a") == b"1"
+    cache.set("c", b"3")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (b"1", b"3")
+
+    assert cache.expire("a", 0.05) and not cache.expire("missing", 1)
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.delete("a", "c") == 1
+
+
+def test_memory_cache_counts_concurrently():
+    cache = MemoryCache()
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda _: cache.incr("hits"), range(800)))
+    assert cache.get("hits") == 800
+
+
+def test_two_tier_cache_serves_reads_locally_for_local_ttl():
+    remote = MemoryCache(name="remote")
+    cache = TwoTierCache(MemoryCache(name="local"), remote, local_ttl=0.05)
+    cache.set("user:a", b"cached", ex=900)
+
+    remote.set("user:a", b"changed elsewhere")
+    assert cache.get("user:a") == b"cached"
+    time.sleep(0.06)
+    assert cache.get("user:a") == b"changed elsewhere"
+
+    assert [cache.incr("requests"), cache.incr("requests")] == [1, 2]
+    assert remote.get("requests") == 2
+    cache.delete("user:a")
+    assert cache.get("user:a") is None and remote.get("user:a") is None
+
+
+def test_backend_is_selected_by_settings(monkeypatch):
+    assert isinstance(auth_service.r, MemoryCache)
+    monkeypatch.setattr(settings, "cache_backend", "unknown")
+    get_cache.cache_clear()
+    try:
+        with pytest.raises(ValueError):
+            get_cache()
+    finally:
+        get_cache.cache_clear()
@@ -0,0 +1,88 @@
+import io
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from src.conf.config import settings
+from src.database.models import Asset, Picture
+from src.services import derivatives
+from src.services.auth import auth_service
+from src.tests.conftest import login_user_token_created
+
+
+def encode(image: Image.Image, image_format="JPEG") -> bytes:
+    data = io.BytesIO()
+    image.save(data, format=image_format)
+    return data.getvalue()
+
+
+def test_render_derivatives_downscales_without_upscaling():
+    rendered = derivatives.render_derivatives(encode(Image.new("RGB", (2000, 1000), (200, 30, 30))))
+
+    assert set(rendered) == {"webp", "jpeg"}
+    for image_format, sizes in rendered.items():
+        assert sorted(sizes) == [160, 480, 1080]
+        for width, data in sizes.items():
+            with Image.open(io.BytesIO(data)) as image:
+                assert image.format == image_format.upper()
+                assert image.size == (width, width // 2)
+
+    small = derivatives.render_derivatives(encode(Image.new("RGBA", (300, 200)), "PNG"))
+    assert sorted(small["webp"]) == sorted(small["jpeg"]) == [160]
+
+
+def test_render_derivatives_applies_exif_orientation(tmp_path):
+    exif = Image.Exif()
+    exif[derivatives.ORIENTATION] = 6
+    path = tmp_path / "portrait.jpg"
+    Image.new("RGB", (2000, 1000), (200, 30, 30)).save(path, format="JPEG", exif=exif)
+
+    rendered = derivatives.render_derivatives(str(path))
+
+    assert sorted(rendered["jpeg"]) == [160, 480]
+    with Image.open(io.BytesIO(rendered["jpeg"][480])) as image:
+        assert image.size == (480, 960)
+
+
+@pytest.fixture
+def uploaded(user, session, client, storage, mock_picture, monkeypatch):
+    monkeypatch.setattr(settings, "derivatives_workers", 0)
+    token = login_user_token_created(user, session)
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    with patch.object(auth_service, 'r') as r_mock:
+        r_mock.get.return_value = None
+        response = client.post("/api/pictures/upload", headers=headers,
+                               files={"picture": ("a.png", mock_picture.getvalue(), "image/png")})
+        yield response
+
+
+def test_upload_stores_derivatives_and_exposes_srcset(uploaded, session, storage):
+    picture = uploaded.json()
+
+    assert uploaded.status_code == 201, uploaded.text
+    assert sorted(picture["derivatives"]["jpeg"]) == ["160"]
+    assert picture["srcset"] == f"{picture['derivatives']['jpeg']['160']} 160w"
+    assert picture["srcset_webp"].endswith(" 160w")
+    assert session.query(Asset.derivatives).scalar() == picture["derivatives"]
+    assert storage.get(picture["derivatives"]["webp"]["160"].split("/media/", 1)[1].split("?")[0])[8:12] == b"WEBP"
+
+
+def test_derivatives_of_existing_pictures_are_generated_on_first_request(uploaded, client, session):
+    picture_id = uploaded.json()["id"]
+    session.query(Picture).update({Picture.derivatives: None})
+    session.query(Asset).update({Asset.derivatives: None})
+    session.commit()
+    assert session.get(Picture, picture_id).srcset.startswith(f"/derivatives/{picture_id}/160.jpeg 160w")
+
+    with patch.object(derivatives, "create_derivatives", wraps=derivatives.create_derivatives) as create_mock:
+        first = client.get(f"/derivatives/{picture_id}/480.webp", follow_redirects=False)
+        second = client.get(f"/derivatives/{picture_id}/160.jpeg", follow_redirects=False)
+
+    stored = session.query(Asset.derivatives).scalar()
+    assert first.status_code == second.status_code == 307
+    assert first.headers["location"] == stored["webp"]["160"]
+    assert second.headers["location"] == stored["jpeg"]["160"]
+    assert create_mock.call_count == 1
+    assert session.get(Picture, picture_id).derivatives == stored
+    assert client.get(f"/derivatives/{picture_id}/100.jpeg", follow_redirects=False).status_code == 404
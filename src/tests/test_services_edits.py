@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from src.database.models import CachedEdit, Picture
+from src.repository.edits import canonical_transformation, pop_least_recently_used
+from src.services import edits
+from src.services.auth import auth_service
+from src.services.metrics import metrics
+from src.tests.conftest import login_user_token_created
+
+
+def test_canonical_transformation_normalizes_numbers_but_keeps_order():
+    canonical, key = canonical_transformation([{"effect": "contrast:010"}, {"effect": "improve:outdoor:50"}])
+    _, same_key = canonical_transformation([{"effect": "contrast:10"}, {"effect": "improve:outdoor:50"}])
+    _, reordered_key = canonical_transformation([{"effect": "improve:outdoor:50"}, {"effect": "contrast:10"}])
+
+    assert canonical == [{"effect": "contrast:10"}, {"effect": "improve:outdoor:50"}]
+    assert key == same_key != reordered_key
+
+
+@pytest.fixture
+def uploaded(user, session, client, storage, mock_picture):
+    token = login_user_token_created(user, session)
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    with patch.object(auth_service, 'r') as r_mock:
+        r_mock.get.return_value = None
+        picture = client.post("/api/pictures/upload", headers=headers,
+                              files={"picture": ("a.png", mock_picture.getvalue(), "image/png")}).json()
+        yield picture["id"], headers
+
+
+def test_repeated_edit_is_served_from_cache(uploaded, client, session, admin):
+    picture_id, headers = uploaded
+    metrics.reset()
+
+    with patch.object(edits, "transform_picture", wraps=edits.transform_picture) as transform_mock:
+        first = client.post("/api/pictures/edit/_", params={"picture_id": picture_id}, headers=headers,
+                            json={"contrast": "10", "brightness": "5"})
+        second = client.post("/api/pictures/edit/_", params={"picture_id": picture_id}, headers=headers,
+                             json={"contrast": "010", "brightness": "5"})
+
+    assert first.status_code == second.status_code == 201, second.text
+    assert first.json() == second.json()
+    assert transform_mock.call_count == 1
+    assert (metrics.get("edit_cache.hits"), metrics.get("edit_cache.misses")) == (1, 1)
+    assert metrics.get("edit_cache.saved_seconds") > 0
+    assert session.query(CachedEdit.hits).scalar() == 1
+
+
+def test_cached_edits_are_evicted_in_batches(uploaded, client, session):
+    picture_id, headers = uploaded
+
+    with patch.object(edits.settings, "edit_cache_max_entries", 20), \
+            patch.object(edits, "_stored_since_eviction", 0), \
+            patch.object(edits.repository_edits, "pop_least_recently_used",
+                         wraps=edits.repository_edits.pop_least_recently_used) as evict_mock:
+        for gamma in range(1, 6):
+            client.post("/api/pictures/edit/_", params={"picture_id": picture_id}, headers=headers,
+                        json={"gamma": str(gamma)})
+
+    assert session.query(CachedEdit).count() == 5
+    assert evict_mock.call_count == 2
+
+
+def test_new_source_evicts_cached_edits(uploaded, client, session, storage):
+    picture_id, headers = uploaded
+    client.post("/api/pictures/edit/_", params={"picture_id": picture_id}, headers=headers, json={"gamma": "20"})
+    edited = Path(storage.path(session.query(CachedEdit).one().picture_edited_json["public_id"]))
+    assert edited.is_file()
+
+    replacement = storage.get(session.get(Picture, picture_id).picture_json["public_id"])[:-16] + b"\x00" * 16
+    response = client.put(f"/api/pictures/{picture_id}", headers=headers,
+                          files={"picture": ("b.png", replacement, "image/png")})
+
+    assert response.status_code == 200, response.text
+    assert session.query(CachedEdit).count() == 0
+    assert not edited.exists()
+    assert session.get(Picture, picture_id).picture_edited_url is None
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_edits_are_evicted_unless_in_use(session):
+    now = datetime.now()
+    for i in range(4):
+        session.add(CachedEdit(source_public_id="picture/a", source_version="1", transformation_key=str(i),
+                               transformation=[], picture_edited_json={"public_id": f"picture/a_{i}_edited"},
+                               picture_edited_url=f"/media/picture/a_{i}_edited", render_ms=10,
+                               last_used_at=now + timedelta(seconds=i)))
+    session.add(Picture(picture_url="/media/picture/a", picture_edited_url="/media/picture/a_0_edited"))
+    session.commit()
+
+    evicted = await pop_least_recently_used(2, session)
+
+    assert [cached.transformation_key for cached in evicted] == ["1", "2"]
+    assert sorted(key for key, in session.query(CachedEdit.transformation_key)) == ["0", "3"]
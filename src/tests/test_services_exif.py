@@ -0,0 +1,67 @@
+import io
+from datetime import datetime
+from unittest.mock import patch
+
+from PIL import ExifTags, Image, ImageFile
+
+from src.database.models import Picture
+from src.services.auth import auth_service
+from src.services.exif import read_metadata
+from src.tests.conftest import login_user_token_created
+
+
+def photo(width=400, height=300, **tags) -> bytes:
+    exif = Image.Exif()
+    exif[ExifTags.Base.Make] = "Canon"
+    exif[ExifTags.Base.Model] = "Canon EOS R5\x00"
+    exif[ExifTags.Base.Orientation] = 6
+    exif[ExifTags.IFD.Exif] = {ExifTags.Base.DateTimeOriginal: "2024:05:01 10:20:30",
+                               ExifTags.Base.LensModel: "RF24-70mm F2.8"}
+    exif[ExifTags.IFD.GPSInfo] = {1: "N", 2: (50.0, 27.0, 0.0), 3: "W", 4: (30.0, 31.0, 12.0)}
+    for tag, value in tags.items():
+        exif[getattr(ExifTags.Base, tag)] = value
+    data = io.BytesIO()
+    Image.new("RGB", (width, height)).save(data, format="JPEG", exif=exif)
+    return data.getvalue()
+
+
+def test_read_metadata_parses_headers_without_decoding_pixels():
+    with patch.object(ImageFile.ImageFile, "load", side_effect=AssertionError("decoded")):
+        metadata = read_metadata(io.BytesIO(photo()))
+
+    assert metadata == {
+        "width": 300, "height": 400, "taken_at": datetime(2024, 5, 1, 10, 20, 30), "camera_make": "Canon",
+        "camera_model": "Canon EOS R5", "lens_model": "RF24-70mm F2.8", "orientation": 6,
+        "gps_latitude": 50.45, "gps_longitude": -30.52,
+    }
+
+    plain = io.BytesIO()
+    Image.new("RGB", (20, 10)).save(plain, format="PNG")
+    assert read_metadata(plain) == {"width": 20, "height": 10, "taken_at": None, "camera_make": None,
+                                    "camera_model": None, "lens_model": None, "orientation": None,
+                                    "gps_latitude": None, "gps_longitude": None}
+
+
+def test_uploaded_metadata_is_searchable(user, session, client):
+    token = login_user_token_created(user, session)
+    with patch.object(auth_service, 'r') as r_mock:
+        r_mock.get.return_value = None
+        picture = client.post("/api/pictures/upload", headers={"Authorization": f"Bearer {token['access_token']}"},
+                              files={"picture": ("a.jpg", photo(), "image/jpeg")}).json()
+
+    stored = session.get(Picture, picture["id"])
+    assert (stored.width, stored.height, stored.camera_model) == (300, 400, "Canon EOS R5")
+
+    def search(**params):
+        return client.post("/api/search/pictures", params=params)
+
+    found = search(camera="canon eos", taken_after="2024-01-01T00:00:00", min_height=400, bbox="50,-31,51,-30")
+    assert found.status_code == 200, found.text
+    assert [(p["id"], p["lens_model"]) for p in found.json()] == [(picture["id"], "RF24-70mm F2.8")]
+    assert search(camera="Nikon").status_code == 404
+    assert search(camera="canon_eos").status_code == 404
+    assert [p["id"] for p in search(lens="rf24", limit=1).json()] == [picture["id"]]
+    assert search(lens="rf24", skip=1).status_code == 404
+    assert search(limit=101).status_code == 422
+    assert search(has_gps=False).status_code == 404
+    assert search(bbox="1,2,3").status_code == 422
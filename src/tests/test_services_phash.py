@@ -0,0 +1,76 @@
+import io
+import random
+
+import numpy as np
+from PIL import Image
+from sqlalchemy.orm import Session
+
+from src.database.models import Picture
+from src.services.phash import BKTree, SimilarityIndex, backfill, hamming, image_hash, to_signed, to_unsigned
+from src.tests.conftest import TestingSessionLocal
+
+
+def smooth_image(seed: int, size=(640, 480)) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    small = Image.fromarray(rng.integers(0, 256, (6, 8, 3), dtype=np.uint8))
+    return small.resize(size, Image.BICUBIC)
+
+
+def encode(image: Image.Image, image_format="JPEG", **options) -> bytes:
+    data = io.BytesIO()
+    image.save(data, format=image_format, **options)
+    return data.getvalue()
+
+
+def test_dhash_is_stable_under_resizing_and_recompression():
+    image = smooth_image(1)
+    original = image_hash(encode(image, quality=95))
+
+    assert hamming(original, image_hash(encode(image.resize((320, 240)), quality=60))) <= 4
+    assert hamming(original, image_hash(encode(image, "PNG"))) <= 4
+    assert hamming(original, image_hash(encode(smooth_image(2), quality=95))) > 12
+    assert image_hash(b"not an image") is None
+    assert to_unsigned(to_signed(2 ** 64 - 1)) == 2 ** 64 - 1
+
+
+def test_bk_tree_search_matches_linear_scan():
+    rng = random.Random(7)
+    hashes = [rng.getrandbits(64) for _ in range(2000)]
+    hashes += [value ^ (1 << rng.randrange(64)) for value in hashes[:200]]
+    tree = BKTree()
+    for item, value in enumerate(hashes):
+        tree.add(value, item)
+
+    for query in hashes[:20] + [rng.getrandbits(64)]:
+        expected = sorted((hamming(query, value), item) for item, value in enumerate(hashes)
+                          if hamming(query, value) <= 6)
+        assert sorted(tree.search(query, 6)) == expected
+
+
+def test_backfill_hashes_pictures(session: Session):
+    files = {1: encode(smooth_image(1)), 2: b"broken"}
+    session.add_all([Picture(id=picture_id, picture_url=f"/media/{picture_id}") for picture_id in files])
+    session.commit()
+
+    assert backfill(session, lambda picture: files[picture.id], batch_size=1, workers=2) == 1
+
+    assert to_unsigned(session.get(Picture, 1).phash) == image_hash(files[1])
+    assert session.get(Picture, 2).phash is None
+
+
+
+def test_similarity_index_builds_in_background(session: Session):
+    session.add_all([Picture(id=1, picture_url="/media/1", phash=0b1011),
+                     Picture(id=2, picture_url="/media/2", phash=0b1010)])
+    session.commit()
+    index = SimilarityIndex()
+    index.start(TestingSessionLocal)
+    try:
+        assert index.ready.wait(5)
+        assert (index.tree.size, index.last_id) == (2, 2)
+
+        session.add(Picture(id=3, picture_url="/media/3", phash=0b1000))
+        session.commit()
+        assert index.search(0b1010, 1, session) == [(0, 2), (1, 1), (1, 3)]
+    finally:
+        index.stop()
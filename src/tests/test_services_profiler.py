@@ -0,0 +1,77 @@
+import re
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.services.auth import auth_service
+from src.services.profiler import ProfilerMiddleware
+
+
+def create_profiled_app(tmp_path):
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"message": "pong"}
+
+    @app.get("/tags/{name}")
+    async def tag(name: str):
+        return {"name": name}
+
+    app.add_middleware(ProfilerMiddleware, allowlist=["admin@example.com"], output_dir=str(tmp_path), interval=0.001)
+    return TestClient(app)
+
+
+def test_profiler_skips_requests_without_flag(tmp_path):
+    client = create_profiled_app(tmp_path)
+    token = auth_service.create_access_token(data={"sub": "admin@example.com"})
+
+    response = client.get("/ping", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_profiler_skips_users_outside_allowlist(tmp_path):
+    client = create_profiled_app(tmp_path)
+    token = auth_service.create_access_token(data={"sub": "user@example.com"})
+
+    response = client.get("/ping", headers={"Authorization": f"Bearer {token}", "X-Profile": "1"})
+
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+
+
+def test_profiler_stores_profile(tmp_path):
+    client = create_profiled_app(tmp_path)
+    token = auth_service.create_access_token(data={"sub": "admin@example.com"})
+
+    response = client.get("/ping?profile=1", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+    assert response.json() == {"message": "pong"}
+    profile_id = response.headers["x-profile-id"]
+    assert (tmp_path / f"{profile_id}.html").exists()
+
+
+def test_profiler_ids_do_not_depend_on_path(tmp_path):
+    client = create_profiled_app(tmp_path)
+    token = auth_service.create_access_token(data={"sub": "admin@example.com"})
+
+    response = client.get("/tags/caf%C3%A9 bar", headers={"Authorization": f"Bearer {token}", "X-Profile": "1"})
+
+    assert response.status_code == 200
+    profile_id = response.headers["x-profile-id"]
+    assert re.fullmatch(r"[\w.-]+", profile_id)
+    assert (tmp_path / f"{profile_id}.html").exists()
+
+
+def test_profiler_returns_html(tmp_path):
+    client = create_profiled_app(tmp_path)
+    token = auth_service.create_access_token(data={"sub": "admin@example.com"})
+
+    response = client.get("/ping", headers={"Authorization": f"Bearer {token}", "X-Profile": "html"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/html")
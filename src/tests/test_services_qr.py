@@ -1,9 +1,9 @@
 import pytest
-from unittest.mock import patch
-from src.services.qr import generate_qr_and_upload_to_cloudinary
+from unittest.mock import MagicMock, patch
+from src.services.qr import generate_qr_and_upload
 
 @pytest.mark.asyncio
-async def test_generate_qr_and_upload_to_cloudinary_picture():
+async def test_generate_qr_and_upload_picture():
     url = "https://example.com"
     picture = {
         "folder": "test_folder",
@@ -17,18 +17,20 @@ async def test_generate_qr_and_upload_to_cloudinary_picture():
         "version": "test_version"
     }
 
-    with patch("src.services.qr.generate_random_string", return_value="test_qr"), \
-         patch("src.services.qr.cloudinary.uploader.upload", veturn_value=expected_upload_response) as mock_cloudinary_upload, \
-         patch("src.services.qr.cloudinary.CloudinaryImage.build_url", return_value=expected_qr_url) as mock_build_url:
+    storage = MagicMock()
+    storage.put.return_value = expected_upload_response
+    storage.url.return_value = expected_qr_url
 
-        qr_url = await generate_qr_and_upload_to_cloudinary(url, picture)
+    with patch("src.services.qr.generate_random_string", return_value="test_qr"):
+
+        qr_url = await generate_qr_and_upload(url, storage, picture)
 
         assert qr_url == expected_qr_url
-        mock_cloudinary_upload.assert_called_once()
-        mock_build_url.assert_called_once_with(version='test_version')
+        storage.put.assert_called_once()
+        storage.url.assert_called_once_with("test_public_id", version='test_version')
 
 @pytest.mark.asyncio
-async def test_generate_qr_and_upload_to_cloudinary_any_url():
+async def test_generate_qr_and_upload_any_url():
     url = "https://example.com"
 
     expected_qr_url = "https://cloudinary.com/qrcode/test_qr"
@@ -37,13 +39,15 @@ async def test_generate_qr_and_upload_to_cloudinary_any_url():
         "version": "test_version"
     }
 
-    with patch("src.services.qr.generate_random_string", return_value="test_qr"), \
-         patch("src.services.qr.cloudinary.uploader.upload", return_value=expected_upload_response) as mock_cloudinary_upload, \
-         patch("src.services.qr.cloudinary.CloudinaryImage.build_url", return_value=expected_qr_url) as mock_build_url:
+    storage = MagicMock()
+    storage.put.return_value = expected_upload_response
+    storage.url.return_value = expected_qr_url
+
+    with patch("src.services.qr.generate_random_string", return_value="test_qr"):
 
-        qr_url = await generate_qr_and_upload_to_cloudinary(url)
+        qr_url = await generate_qr_and_upload(url, storage)
 
         assert qr_url == expected_qr_url
-        mock_cloudinary_upload.assert_called_once()
-        mock_build_url.assert_called_once_with(version='test_version')
+        storage.put.assert_called_once()
+        storage.url.assert_called_once_with("test_public_id", version='test_version')
 
@@ -0,0 +1,79 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.conf.config import settings
+from src.services.auth import auth_service
+from src.services.cache import MemoryCache, TwoTierCache
+from src.services.metrics import metrics
+from src.services.rate_limit import RateLimitMiddleware, TokenBucketLimiter, parse_costs
+
+
+def create_limited_app(limiter):
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"message": "pong"}
+
+    @app.post("/upload")
+    async def upload():
+        return {"message": "uploaded"}
+
+    app.add_middleware(RateLimitMiddleware, limiter=limiter, costs=parse_costs("POST /upload=6, GET /static/*=0"))
+    return TestClient(app)
+
+
+def bearer(email: str) -> dict:
+    return {"Authorization": f"Bearer {auth_service.create_access_token(data={'sub': email})}"}
+
+
+def test_parse_costs():
+    assert parse_costs("POST /api/pictures/edit/*=20,GET /static/*=0,") == [("POST /api/pictures/edit/*", 20.0),
+                                                                            ("GET /static/*", 0.0)]
+
+
+def test_default_costs_charge_transformations_but_not_description_edits():
+    middleware = RateLimitMiddleware(None, limiter=None, costs=parse_costs(settings.rate_limit_costs))
+
+    assert middleware.cost("POST", "/api/pictures/edit/2") == 20
+    assert middleware.cost("POST", "/picture/edit/2") == 1
+
+
+def test_requests_pay_their_route_cost_per_user():
+    client = create_limited_app(TokenBucketLimiter(MemoryCache(), rate=1, burst=10))
+
+    assert client.post("/upload", headers=bearer("a@example.com")).status_code == 200
+    response = client.post("/upload", headers=bearer("a@example.com"))
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "2"
+    assert response.json() == {"detail": "Too many requests"}
+
+    assert client.get("/ping", headers=bearer("a@example.com")).status_code == 200
+    assert client.post("/upload", headers=bearer("b@example.com")).status_code == 200
+    assert client.post("/upload").status_code == 200
+    assert client.get("/static/style.css").status_code == 404
+
+
+def test_exhausted_clients_are_rejected_without_asking_the_backend():
+    calls = []
+
+    class CountingCache(MemoryCache):
+        def take(self, *args):
+            try:
+                asyncio.get_running_loop()
+                calls.append("on the event loop")
+            except RuntimeError:
+                calls.append("in a worker thread")
+            return super().take(*args)
+
+    client = create_limited_app(TokenBucketLimiter(TwoTierCache(MemoryCache(), CountingCache()), rate=0.1, burst=6))
+    metrics.reset()
+
+    statuses = [client.post("/upload", headers=bearer("a@example.com")).status_code for _ in range(4)]
+
+    assert statuses == [200, 429, 429, 429]
+    assert calls == ["in a worker thread"]
+    assert metrics.get("rate_limit.local_rejections") == 3
+    assert metrics.get("rate_limit.rejected") == 3
@@ -0,0 +1,119 @@
+import asyncio
+import io
+import os
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from src.database.models import Picture
+from src.services.auth import auth_service
+from src.services.metrics import metrics
+from src.services.resize import DiskLRUCache, resize
+from src.tests.conftest import login_user_token_created
+
+
+def encode(image: Image.Image, image_format="JPEG") -> bytes:
+    data = io.BytesIO()
+    image.save(data, format=image_format)
+    return data.getvalue()
+
+
+def size_of(data: bytes) -> tuple[int, int]:
+    with Image.open(io.BytesIO(data)) as image:
+        return image.size
+
+
+def test_resize_limits_or_fills_without_enlarging():
+    source = encode(Image.new("RGB", (1200, 800)))
+
+    assert size_of(resize(source, 300, None)) == (300, 200)
+    assert size_of(resize(source, 300, 300)) == (300, 200)
+    assert size_of(resize(source, 250, 250, "fill", "webp")) == (250, 250)
+    assert size_of(resize(source, 2000, None, "limit", "png")) == (1200, 800)
+
+
+def test_resize_targets_the_oriented_image():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotated 90 degrees clockwise
+    data = io.BytesIO()
+    Image.new("RGB", (4000, 3000)).save(data, format="JPEG", exif=exif)
+
+    assert size_of(resize(data.getvalue(), 1000, None)) == (1000, 1333)
+    assert size_of(resize(data.getvalue(), 250, 250, "fill")) == (250, 250)
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=250)
+    cache.put("a" * 64, b"1" * 100)
+    cache.put("b" * 64, b"2" * 100)
+    assert cache.get("a" * 64) == b"1" * 100
+
+    cache.put("c" * 64, b"3" * 100)
+
+    assert cache.get("b" * 64) is None
+    assert not os.path.exists(cache._path("b" * 64))
+    assert DiskLRUCache(str(tmp_path), max_bytes=250).get("a" * 64) == b"1" * 100
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_render_once(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=1024)
+    renders = 0
+    metrics.reset()
+
+    async def render():
+        nonlocal renders
+        renders += 1
+        await asyncio.sleep(0.05)
+        return b"resized"
+
+    results = await asyncio.gather(*(cache.get_or_create("k" * 64, render) for _ in range(5)))
+
+    assert results == [b"resized"] * 5
+    assert renders == 1
+    assert (metrics.get("image_cache.misses"), metrics.get("image_cache.coalesced")) == (1, 4)
+    assert await cache.get_or_create("k" * 64, render) == b"resized" and renders == 1
+
+
+def test_avatar_is_filled_by_the_resize_route(user, session, client, mock_picture):
+    token = login_user_token_created(user, session)
+    response = client.patch("/api/users/avatar", headers={"Authorization": f"Bearer {token['access_token']}"},
+                            files={"file": ("avatar.png", encode(Image.new("RGB", (600, 400)), "PNG"), "image/png")})
+    avatar = response.json()["avatar"]
+    assert avatar.startswith("/img/files/avatars/") and "w=250&h=250&fit=fill&v=" in avatar
+
+    first = client.get(avatar)
+    second = client.get(avatar, headers={"If-None-Match": first.headers["etag"]})
+
+    assert first.status_code == 200
+    assert size_of(first.content) == (250, 250)
+    assert first.headers["content-type"] == "image/jpeg"
+    assert first.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert second.status_code == 304
+    stale = client.get(avatar.replace("&v=", "&v=1"))
+    assert stale.headers["cache-control"] == "public, max-age=86400"
+    assert stale.headers["etag"] == first.headers["etag"]
+    assert client.get("/img/files/avatars/missing?w=100").status_code == 404
+    assert client.get(avatar.replace("w=250", "w=251")).status_code == 422
+
+
+def test_picture_is_resized_from_its_original(user, session, client, mock_picture):
+    token = login_user_token_created(user, session)
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    with patch.object(auth_service, 'r') as r_mock:
+        r_mock.get.return_value = None
+        picture = client.post("/api/pictures/upload", headers=headers,
+                              files={"picture": ("a.png", mock_picture.getvalue(), "image/png")}).json()
+    version = session.get(Picture, picture["id"]).picture_json["version"]
+
+    current = client.get(f"/img/{picture['id']}", params={"w": 100, "fmt": "webp", "v": version})
+    unversioned = client.get(f"/img/{picture['id']}", params={"w": 100, "fmt": "webp"})
+
+    assert current.status_code == 200
+    assert size_of(current.content) == (100, 100)
+    assert current.headers["content-type"] == "image/webp"
+    assert current.headers["cache-control"].endswith("immutable")
+    assert unversioned.headers["cache-control"] == "public, max-age=86400"
+    assert unversioned.headers["etag"] == current.headers["etag"]
+    assert client.get(f"/img/{picture['id']}").status_code == 422
@@ -0,0 +1,82 @@
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, text
+
+from src.services.auth import auth_service
+from src.services.slow_query import SlowQueryLog, normalize_sql, parameter_shape, slow_query_log
+from src.tests.conftest import login_user_token_created
+
+
+def test_normalize_sql_collapses_literals_and_in_lists():
+    first = normalize_sql("SELECT * FROM picture WHERE id IN (%(id_1_1)s, %(id_1_2)s) AND description LIKE '%cat%'")
+    second = normalize_sql("SELECT *  FROM picture\n WHERE id IN (%(id_1_1)s) AND description LIKE '%dog%'")
+
+    assert first == "SELECT * FROM picture WHERE id IN (...) AND description LIKE ?"
+    assert second == "SELECT * FROM picture WHERE id IN (?) AND description LIKE ?"
+
+
+def test_parameter_shape_hides_values():
+    assert parameter_shape({"email": "a@b.pl", "id": 1}) == {"email": "str", "id": "int"}
+    assert parameter_shape((1, "x")) == ["int", "str"]
+    assert parameter_shape([{"id": 1}, {"id": 2}], executemany=True) == {"rows": 2, "row": {"id": "int"}}
+
+
+def test_slow_query_log_records_statements_over_threshold():
+    engine = create_engine("sqlite://")
+    log = SlowQueryLog(threshold_ms=0, size=2)
+    log.install(engine)
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT :value"), {"value": 1})
+        conn.execute(text("SELECT 2"))
+        conn.execute(text("SELECT 3"))
+
+    entries = log.entries()
+    assert len(entries) == 2
+    assert all(entry["statement"] == "SELECT ?" for entry in entries)
+    assert entries[0]["explain"] is None
+    assert log.entries(limit=1) == entries[:1]
+    assert log.entries(limit=0) == []
+
+
+def test_slow_query_log_drops_start_time_of_failed_statement():
+    engine = create_engine("sqlite://")
+    log = SlowQueryLog(threshold_ms=0, size=10)
+    log.install(engine)
+
+    with engine.connect() as conn:
+        try:
+            conn.execute(text("SELECT * FROM missing_table"))
+        except Exception:
+            pass
+        assert conn.info["query_start_time"] == []
+        conn.execute(text("SELECT 1"))
+
+    assert [entry["statement"] for entry in log.entries()] == ["SELECT ?"]
+
+
+def test_slow_query_log_ignores_fast_statements():
+    engine = create_engine("sqlite://")
+    log = SlowQueryLog(threshold_ms=10_000, size=10)
+    log.install(engine)
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    assert log.entries() == []
+
+
+def test_read_slow_queries_requires_admin(user, admin, session, client):
+    user_token = login_user_token_created(user, session)
+    admin_token = login_user_token_created(admin, session)
+
+    with patch.object(auth_service, 'r') as r_mock:
+        r_mock.get.return_value = None
+        response = client.get("/api/admin/slow-queries",
+                              headers={"Authorization": f"Bearer {user_token['access_token']}"})
+        assert response.status_code == 403, response.text
+
+        response = client.get("/api/admin/slow-queries",
+                              headers={"Authorization": f"Bearer {admin_token['access_token']}"})
+        assert response.status_code == 200, response.text
+        assert response.json()["threshold_ms"] == slow_query_log.threshold_ms
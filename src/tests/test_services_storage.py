@@ -0,0 +1,54 @@
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.services.storage import LocalStorage, StorageWriter, sniff_image_type
+
+
+def test_sniff_image_type(mock_picture):
+    assert sniff_image_type(mock_picture.getvalue()[:16]) == ("png", "image/png")
+    assert sniff_image_type(b"\xff\xd8\xff\xe0" + b"\x00" * 12) == ("jpg", "image/jpeg")
+    assert sniff_image_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == ("webp", "image/webp")
+    assert sniff_image_type(b"<html></html>") is None
+
+
+def test_local_storage_put_get_delete(tmp_path, mock_picture):
+    storage = LocalStorage(root=str(tmp_path), base_url="/media/")
+
+    stored = storage.put(mock_picture, folder="picture", name="abc")
+
+    assert stored["public_id"] == "picture/abc"
+    assert stored["format"] == "png"
+    assert storage.get("picture/abc") == mock_picture.getvalue()
+    assert storage.url("picture/abc", version=stored["version"]) == f"/media/picture/abc?v={stored['version']}"
+    assert [name for name in os.listdir(tmp_path / "picture")] == ["abc"]
+
+    storage.delete("picture/abc")
+    storage.delete("picture/abc")
+
+    assert not os.path.exists(tmp_path / "picture" / "abc")
+
+
+def test_local_storage_rejects_paths_outside_root(tmp_path):
+    storage = LocalStorage(root=str(tmp_path), base_url="/media")
+
+    with pytest.raises(ValueError):
+        storage.put(b"data", folder="..", name="escape")
+    with pytest.raises(ValueError):
+        storage.get("../../etc/passwd")
+
+
+def test_storage_writer_local_path_is_removed_on_commit():
+    storage = MagicMock()
+    writer = StorageWriter(storage, "picture", "abc")
+    writer.write(b"content")
+
+    path = writer.local_path()
+
+    assert writer.local_path() == path
+    with open(path, "rb") as f:
+        assert f.read() == b"content"
+    writer.commit()
+    assert not os.path.exists(path)
+    assert storage.put.call_args.args[1:] == ("picture", "abc")
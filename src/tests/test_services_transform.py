@@ -0,0 +1,66 @@
+import io
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.services.transform import brightness_lut, contrast_lut, gamma_lut, is_local, render, transform_picture
+
+
+def encode(image: Image.Image, image_format="PNG") -> bytes:
+    data = io.BytesIO()
+    image.save(data, format=image_format)
+    return data.getvalue()
+
+
+def decode(data: bytes) -> np.ndarray:
+    return np.asarray(Image.open(io.BytesIO(data)))
+
+
+def test_tone_effects_are_folded_into_one_lookup_table():
+    pixels = np.random.default_rng(0).integers(0, 256, (40, 60, 3), dtype=np.uint8)
+    transformation = [{"effect": "contrast:20"}, {"effect": "brightness:10"}, {"effect": "gamma:30"}]
+
+    result = decode(render(encode(Image.fromarray(pixels)), transformation))
+
+    expected = gamma_lut(30)[brightness_lut(10)[contrast_lut(20)[pixels]]]
+    assert np.array_equal(result, expected)
+    assert np.array_equal(brightness_lut(0), np.arange(256))
+
+
+def test_render_keeps_format_and_alpha():
+    image = Image.new("RGBA", (16, 16), (200, 40, 40, 128))
+
+    result = Image.open(io.BytesIO(render(encode(image), [{"effect": "grayscale"}, {"effect": "improve:outdoor:50"}])))
+
+    assert (result.format, result.mode) == ("PNG", "LA")
+    assert result.getpixel((0, 0))[1] == 128
+    jpeg = Image.open(io.BytesIO(render(encode(image.convert("RGB"), "JPEG"), [{"effect": "unsharp_mask:100"}])))
+    assert jpeg.format == "JPEG"
+
+
+def test_render_applies_exif_orientation():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotated 90 degrees clockwise
+    data = io.BytesIO()
+    Image.new("RGB", (40, 20), (200, 40, 40)).save(data, format="JPEG", exif=exif)
+
+    result = Image.open(io.BytesIO(render(data.getvalue(), [{"effect": "contrast:10"}])))
+
+    assert result.size == (20, 40)
+    assert result.getexif().get(0x0112) is None
+
+
+@pytest.mark.asyncio
+async def test_generative_effects_are_left_to_the_storage():
+    storage = MagicMock()
+    storage.get.return_value = encode(Image.new("RGB", (8, 8), (10, 20, 30)))
+    transformation = [{"effect": "gen_remove:cat"}, {"effect": "contrast:10"}]
+
+    assert not is_local(transformation)
+    await transform_picture(storage, "picture/a", transformation, "picture/a_edited")
+    await transform_picture(storage, "picture/a", transformation[1:], "picture/a_edited")
+
+    storage.transform.assert_called_once_with("picture/a", transformation, "picture/a_edited")
+    assert storage.put.call_args.args[1:] == ("picture", "a_edited")
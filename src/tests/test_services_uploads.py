@@ -0,0 +1,87 @@
+import hashlib
+import os
+import tracemalloc
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from src.services.storage import LocalStorage
+from src.services.uploads import receive_upload
+
+BOUNDARY = b"testboundary"
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+
+def multipart_request(parts: list[tuple[str, bytes, bool]], chunk_size: int = 64 * 1024) -> Request:
+    """
+    Build a request whose multipart body is delivered in ``chunk_size`` pieces, like a real server does.
+    """
+    def body():
+        for name, content, is_file in parts:
+            filename = f'; filename="{name}.png"' if is_file else ""
+            yield b"--" + BOUNDARY + b"\r\n"
+            yield f'Content-Disposition: form-data; name="{name}"{filename}\r\n\r\n'.encode()
+            for start in range(0, len(content), chunk_size):
+                yield content[start:start + chunk_size]
+            yield b"\r\n"
+        yield b"--" + BOUNDARY + b"--\r\n"
+
+    chunks = body()
+
+    async def receive():
+        chunk = next(chunks, None)
+        return {"type": "http.request", "body": chunk or b"", "more_body": chunk is not None}
+
+    scope = {"type": "http", "method": "POST", "path": "/", "query_string": b"",
+             "headers": [(b"content-type", b"multipart/form-data; boundary=" + BOUNDARY)]}
+    return Request(scope, receive)
+
+
+@pytest.mark.asyncio
+async def test_receive_upload_stores_file_and_fields(tmp_path):
+    storage = LocalStorage(str(tmp_path), "/media")
+    content = PNG_HEADER + os.urandom(300_000)
+
+    upload = await receive_upload(multipart_request([("description", b"a cat", False),
+                                                     ("picture", content, True)]),
+                                  "picture", storage, folder="picture", name="abc")
+
+    assert upload.sha256 == hashlib.sha256(content).hexdigest()
+    assert upload.size == len(content)
+    assert upload.image_format == "png"
+    assert upload.fields == {"description": "a cat"}
+    assert storage.get("picture/abc") == content
+
+
+@pytest.mark.asyncio
+async def test_receive_upload_rejects_non_images_and_large_files(tmp_path):
+    storage = LocalStorage(str(tmp_path), "/media")
+
+    with pytest.raises(HTTPException) as exc_info:
+        await receive_upload(multipart_request([("picture", b"#!/bin/sh\necho nope\n", True)]),
+                             "picture", storage, folder="picture", name="script")
+    assert exc_info.value.status_code == 415
+
+    with pytest.raises(HTTPException) as exc_info:
+        await receive_upload(multipart_request([("picture", PNG_HEADER + bytes(2_000_000), True)]),
+                             "picture", storage, folder="picture", name="big", max_bytes=1_000_000)
+    assert exc_info.value.status_code == 413
+
+    assert os.listdir(tmp_path / "picture") == []
+
+
+@pytest.mark.asyncio
+async def test_receive_upload_memory_does_not_grow_with_file_size(tmp_path):
+    storage = LocalStorage(str(tmp_path), "/media")
+    content = PNG_HEADER + bytes(4 * 1024 * 1024)
+    request = multipart_request([("picture", content, True)])
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    await receive_upload(request, "picture", storage, folder="picture", name="large")
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    assert peak < 1024 * 1024